@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import random
+import logging
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional
+from catalog import get_catalog
+from simulator import MODES, RandomPolicy, play_game
+
+CHUNK_SIZE = 500
+
+def chunk_seed(master_seed: int, mode: str, index: int) -> str:
+    # 每个分块的种子只由主种子和分块序号决定，与进程数、调度顺序无关
+    return f"{master_seed}:{mode}:{index}"
+
+def _init_worker():
+    # 每个工作进程加载一次角色/技能数据，之后所有对局共享
+    logging.getLogger().setLevel(logging.WARNING)
+    get_catalog()
+
+def run_chunk(mode: str, player_count: int, games: int, seed: str, max_rounds: int, skill_chance: float) -> Dict[str, Any]:
+    policy = RandomPolicy(random.Random(seed), skill_chance)
+    stats = {key: Counter() for key in ("character_games", "character_wins", "style_games", "style_wins",
+                                         "skill_games", "skill_wins")}
+    summary = Counter()
+    for _ in range(games):
+        result = play_game(mode, player_count, policy, max_rounds)
+        summary["games"] += 1
+        summary["rounds"] += result["rounds"]
+        if not result["game_over"]:
+            summary["unfinished"] += 1
+        for player in result["players"]:
+            won = int(player["won"])
+            stats["character_games"][player["character"]] += 1
+            stats["character_wins"][player["character"]] += won
+            stats["style_games"][player["style"]] += 1
+            stats["style_wins"][player["style"]] += won
+            for skill in set(player["skills"]):
+                stats["skill_games"][skill] += 1
+                stats["skill_wins"][skill] += won
+    stats["summary"] = summary
+    return stats
+
+def merge(totals: Dict[str, Counter], stats: Dict[str, Counter]):
+    for key, counter in stats.items():
+        totals.setdefault(key, Counter()).update(counter)
+
+def win_rates(games: Counter, wins: Counter) -> List[Dict[str, Any]]:
+    rows = [{"name": name, "games": count, "wins": wins[name], "win_rate": wins[name] / count}
+            for name, count in games.items() if count]
+    return sorted(rows, key=lambda r: r["win_rate"], reverse=True)
+
+def run_balance(games: int, mode: str = "standard", player_count: int = 4, seed: int = 0,
+                workers: Optional[int] = None, max_rounds: int = 200, skill_chance: float = 0.5,
+                chunk_size: int = CHUNK_SIZE) -> Dict[str, Any]:
+    chunks = [min(chunk_size, games - start) for start in range(0, games, chunk_size)]
+    totals: Dict[str, Counter] = {}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = [executor.submit(run_chunk, mode, player_count, size, chunk_seed(seed, mode, i), max_rounds, skill_chance)
+                   for i, size in enumerate(chunks)]
+        # 按提交顺序合并，结果与完成顺序无关
+        for future in futures:
+            merge(totals, future.result())
+    elapsed = time.perf_counter() - start
+
+    summary = totals.get("summary", Counter())
+    return {
+        "mode": mode,
+        "players": player_count,
+        "seed": seed,
+        "games": summary["games"],
+        "rounds": summary["rounds"],
+        "unfinished": summary["unfinished"],
+        "elapsed": elapsed,
+        "games_per_sec": summary["games"] / elapsed if elapsed else 0.0,
+        "characters": win_rates(totals.get("character_games", Counter()), totals.get("character_wins", Counter())),
+        "styles": win_rates(totals.get("style_games", Counter()), totals.get("style_wins", Counter())),
+        "skills": win_rates(totals.get("skill_games", Counter()), totals.get("skill_wins", Counter())),
+    }
+
+def print_report(report: Dict[str, Any]):
+    print(f"[{report['mode']}] {report['games']} 局, {report['players']} 人, 种子 {report['seed']}, "
+          f"耗时 {report['elapsed']:.1f}s ({report['games_per_sec']:,.0f} 局/秒), 未结束 {report['unfinished']} 局")
+    for title, key in (("角色", "characters"), ("流派", "styles"), ("技能(使用过该技能的玩家)", "skills")):
+        print(f"  {title}:")
+        for row in report[key]:
+            print(f"    {row['name']:<12} 胜率 {row['win_rate']:6.1%}  ({row['wins']}/{row['games']})")
+
+def main():
+    parser = argparse.ArgumentParser(description="十步拳平衡性蒙特卡洛模拟")
+    parser.add_argument("--games", type=int, default=100000, help="每种模式的对局数")
+    parser.add_argument("--mode", choices=MODES + ("all",), default="standard")
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0, help="主种子，相同种子得到相同报告")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--max-rounds", type=int, default=200)
+    parser.add_argument("--skill-chance", type=float, default=0.5)
+    parser.add_argument("--json", help="同时把报告写入该文件")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    modes = MODES if args.mode == "all" else (args.mode,)
+    reports = []
+    for mode in modes:
+        report = run_balance(args.games, mode, args.players, args.seed, args.workers, args.max_rounds, args.skill_chance)
+        print_report(report)
+        reports.append(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,116 @@
+# 独立的离线工具：只模拟纯猜拳（不含角色、技能、血量和随机事件），用来估算胜局分布和结算吞吐。
+# simulator.py 和服务器不调用这里，完整规则的批量模拟用 simulator.py
+import time
+import argparse
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from player_state import Move
+
+NO_MOVE = -1
+MOVE_COUNT = len(Move)
+# BEATS[m]：m 能赢的出拳；LOSES_TO[m]：能赢 m 的出拳（石头>剪刀>布>石头）
+BEATS = np.array([(m + 1) % MOVE_COUNT for m in range(MOVE_COUNT)])
+LOSES_TO = np.array([(m + 2) % MOVE_COUNT for m in range(MOVE_COUNT)])
+
+def fill_missing_moves(moves: np.ndarray, need_move: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    # 与 process_round 一致：存活且未出拳的玩家随机出拳
+    missing = need_move & (moves == NO_MOVE)
+    if missing.any():
+        moves = moves.copy()
+        moves[missing] = rng.integers(0, MOVE_COUNT, size=int(missing.sum()), dtype=moves.dtype)
+    return moves
+
+def judge_batch(moves: np.ndarray, alive: np.ndarray, eligible: Optional[np.ndarray] = None) -> np.ndarray:
+    # moves: (游戏数, 玩家数) int 数组，NO_MOVE 表示无出拳；返回每名玩家本回合是否猜拳获胜
+    # 规则同 GameEngine.judge_moves：出现了 m 克制的拳且没有克制 m 的拳时，出 m 的玩家获胜
+    valid = (moves != NO_MOVE) & alive
+    counts = np.stack([((moves == m) & valid).sum(axis=1) for m in range(MOVE_COUNT)], axis=1)
+    winning = (counts[:, BEATS] > 0) & (counts[:, LOSES_TO] == 0)
+    clipped = np.where(valid, moves, 0)
+    wins = np.take_along_axis(winning, clipped, axis=1) & valid
+    if eligible is not None:
+        wins &= eligible
+    return wins
+
+def resolve_batch(moves: np.ndarray, wins: np.ndarray, alive: np.ndarray, eligible: Optional[np.ndarray] = None,
+                  max_wins: int = 3) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # 一次结算所有游戏的一个回合，返回 (本回合获胜, 新胜局数, 是否结束, 胜者下标，无胜者为 -1)
+    round_wins = judge_batch(moves, alive, eligible)
+    new_wins = wins + round_wins
+    reached = (new_wins >= max_wins) & alive
+    alive_count = alive.sum(axis=1)
+    game_over = (alive_count <= 1) | reached.any(axis=1)
+    # 与 check_game_over 一致：只剩一人时该玩家获胜，否则取第一个达到胜局数的玩家
+    winner = np.where(alive_count == 1, alive.argmax(axis=1), np.where(reached.any(axis=1), reached.argmax(axis=1), -1))
+    winner = np.where(game_over, winner, -1)
+    return round_wins, new_wins, game_over, winner
+
+def encode_engines(engines: List) -> Tuple[List[List[str]], np.ndarray, np.ndarray, np.ndarray]:
+    # 把多个 GameEngine 当前的出拳编码为补齐到相同人数的数组
+    width = max((len(e.players) for e in engines), default=0)
+    moves = np.full((len(engines), width), NO_MOVE, dtype=np.int8)
+    alive = np.zeros((len(engines), width), dtype=bool)
+    eligible = np.zeros((len(engines), width), dtype=bool)
+    player_ids = []
+    for g, engine in enumerate(engines):
+        ids = list(engine.players)
+        player_ids.append(ids)
+        for p, pid in enumerate(ids):
+            alive[g, p] = engine.players[pid].is_alive
+            eligible[g, p] = not (engine.mode == "boss" and pid == engine.boss_id)
+            move = engine.moves.get(pid)
+            if move is not None:
+                moves[g, p] = move
+    return player_ids, moves, alive, eligible
+
+def judge_engines(engines: List) -> List[Dict[str, bool]]:
+    # 批量版 GameEngine.judge_moves：返回与之相同格式的 {player_id: 是否获胜}
+    player_ids, moves, alive, eligible = encode_engines(engines)
+    wins = judge_batch(moves, alive, eligible)
+    return [{pid: bool(wins[g, p]) for p, pid in enumerate(ids)} for g, ids in enumerate(player_ids)]
+
+def simulate_batch(games: int, players: int, seed: Optional[int] = None, max_wins: int = 3,
+                   max_rounds: int = 1000) -> Dict[str, float]:
+    # 纯猜拳对局的向量化模拟：所有未结束的游戏每次调用一起推进一回合
+    rng = np.random.default_rng(seed)
+    wins = np.zeros((games, players), dtype=np.int16)
+    alive = np.ones((games, players), dtype=bool)
+    active = np.ones(games, dtype=bool)
+    winners = np.full(games, -1, dtype=np.int64)
+    rounds = 0
+    resolved = 0
+    start = time.perf_counter()
+    while active.any() and rounds < max_rounds:
+        idx = np.flatnonzero(active)
+        moves = fill_missing_moves(np.full((len(idx), players), NO_MOVE, dtype=np.int8), alive[idx], rng)
+        _, new_wins, game_over, winner = resolve_batch(moves, wins[idx], alive[idx], max_wins=max_wins)
+        wins[idx] = new_wins
+        winners[idx[game_over]] = winner[game_over]
+        active[idx[game_over]] = False
+        resolved += len(idx)
+        rounds += 1
+    elapsed = time.perf_counter() - start
+    return {
+        "games": games,
+        "unfinished": int(active.sum()),
+        "rounds": resolved,
+        "batches": rounds,
+        "elapsed": elapsed,
+        "rounds_per_sec": resolved / elapsed if elapsed else 0.0,
+        "winners": np.bincount(winners[winners >= 0], minlength=players).tolist(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="批量猜拳回合结算（NumPy，仅猜拳规则的独立工具）")
+    parser.add_argument("--games", type=int, default=100000)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    report = simulate_batch(args.games, args.players, args.seed)
+    print(f"{report['games']} 局 / {report['rounds']} 回合 ({report['batches']} 批), 耗时 {report['elapsed']:.2f}s, "
+          f"未结束 {report['unfinished']} 局")
+    print(f"  {report['rounds_per_sec']:,.0f} 回合/秒  各座位胜场 {report['winners']}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
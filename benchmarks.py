@@ -0,0 +1,289 @@
+import sys
+import json
+import time
+import random
+import logging
+import platform
+import argparse
+from datetime import datetime
+from typing import Dict, List, Callable, Optional
+from skills import SkillSystem
+from characters import CharacterSystem
+from catalog import get_catalog
+from game_logic import GameEngine
+from player_state import PlayerState, BuffList, Style, MOVE_LABELS
+
+BASELINE_FILE = "benchmark_baseline.json"
+DEFAULT_PLAYER_COUNTS = (2, 4, 64)
+DEFAULT_THRESHOLD = 0.15
+FIXTURE_SEED = 20240501
+BUFF_STACKS = (1, 16, 256)
+TARGET_TYPES = ("self", "single_enemy", "single_any", "two_enemies", "two_any", "all_others")
+
+def make_player(pid: str, style: Style = Style.DAMAGE) -> PlayerState:
+    return PlayerState(
+        player_id=pid,
+        username=f"Player {pid}",
+        hp=15,
+        max_hp=15,
+        wins=3,
+        style=style,
+        buffs=[{"name": style.value, "duration": -1, "effect_data": {"damage_bonus": 1}}],
+    )
+
+def make_skill_state(player_count: int) -> Dict:
+    return {"round": 1, "players": [make_player(f"p{i}") for i in range(player_count)]}
+
+def reset_skill_state(game_state: Dict):
+    for p in game_state["players"]:
+        p.hp = p.max_hp = 15
+        p.wins = 3
+        p.is_alive = True
+        p.evasion = 0
+        p.skill_cooldowns.clear()
+        del p.buffs[1:]
+        p.debuffs.clear()
+        p.charge_skills.clear()
+    game_state.pop("special_state", None)
+
+def skill_targets(skill_data: Dict, game_state: Dict) -> List[str]:
+    ids = [p.player_id for p in game_state["players"]]
+    target_type = skill_data.get("target_type")
+    if target_type == "self":
+        return ids[:1]
+    if target_type in ("two_enemies", "two_any"):
+        return ids[1:3]
+    if target_type in ("all_others", "all_players_except_self"):
+        return ids[1:]
+    return ids[1:2]
+
+def make_engine(player_count: int, mode: str = "standard") -> GameEngine:
+    # 固定种子、固定角色/流派分配，每次运行得到同样的对局
+    catalog = get_catalog()
+    styles = [s.value for s in Style]
+    engine = GameEngine([f"p{i}" for i in range(player_count)], mode=mode, seed=FIXTURE_SEED)
+    for i, pid in enumerate(engine.players):
+        character = catalog.character_names[i % len(catalog.character_names)]
+        engine.select_character(pid, character, styles[i % len(styles)], f"Player {pid}", [])
+    engine.inputs.clear()
+    return engine
+
+def move_patterns(engine: GameEngine, count: int = 64) -> List[Dict]:
+    rng = random.Random(FIXTURE_SEED)
+    return [{pid: rng.randrange(len(MOVE_LABELS)) for pid in engine.players} for _ in range(count)]
+
+def reset_engine(engine: GameEngine):
+    # 每回合前清空胜局、回满血，对局永远不会结束；输入记录也不让它无限增长
+    for p in engine.players.values():
+        p.hp = p.max_hp
+        p.wins = 0
+        p.is_alive = True
+        p.pending_skills.clear()
+    engine.game_over = False
+    engine.winner = None
+    engine.inputs.clear()
+
+def measure(fn: Callable[[], None], duration: float, repeat: int = 1) -> float:
+    # 返回每秒执行次数；重复多次取最好的一次，减小调度抖动的影响
+    best = 0.0
+    for _ in range(repeat):
+        count = 0
+        start = time.perf_counter()
+        deadline = start + duration
+        while True:
+            for _ in range(100):
+                fn()
+            count += 100
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+        best = max(best, count / (now - start))
+    return best
+
+def bench_process_round(duration: float, player_count: int, repeat: int = 1) -> Dict[str, float]:
+    engine = make_engine(player_count)
+    patterns = move_patterns(engine)
+    index = [0]
+
+    def run():
+        reset_engine(engine)
+        engine.moves = dict(patterns[index[0] % len(patterns)])
+        index[0] += 1
+        engine.process_round()
+    return {f"process_round@{player_count}": measure(run, duration, repeat)}
+
+def bench_judge_moves(duration: float, player_count: int, repeat: int = 1) -> Dict[str, float]:
+    engine = make_engine(player_count)
+    # 取第一个不是全员同拳的出拳组合，避免走平局的快速返回
+    engine.moves = next(p for p in move_patterns(engine) if len(set(p.values())) > 1)
+    return {f"judge_moves@{player_count}": measure(engine.judge_moves, duration, repeat)}
+
+def bench_validate_targets(duration: float, player_count: int, repeat: int = 1) -> Dict[str, float]:
+    engine = make_engine(player_count)
+    ids = list(engine.players)
+    user = ids[0]
+    cases = []
+    for target_type in TARGET_TYPES:
+        if target_type == "self":
+            targets = [user]
+        elif target_type in ("two_enemies", "two_any"):
+            targets = ids[1:3]
+        elif target_type == "all_others":
+            targets = ids[1:]
+        else:
+            targets = ids[1:2]
+        cases.append(({"target_type": target_type}, targets))
+
+    def run():
+        for skill_data, targets in cases:
+            engine.validate_targets(skill_data, targets, user)
+    return {f"validate_targets@{player_count}": measure(run, duration, repeat)}
+
+def bench_public_state(duration: float, player_count: int, repeat: int = 1) -> Dict[str, float]:
+    engine = make_engine(player_count)
+
+    def dirty():
+        engine.mark_dirty()
+        engine.get_public_state()
+    return {
+        f"get_public_state[cached]@{player_count}": measure(engine.get_public_state, duration, repeat),
+        f"get_public_state[dirty]@{player_count}": measure(dirty, duration, repeat),
+    }
+
+def bench_execute_skill(duration: float, player_count: int, repeat: int = 1) -> Dict[str, float]:
+    # 每种效果类型取目录中的第一个技能
+    system = SkillSystem()
+    catalog = system.catalog
+    game_state = make_skill_state(player_count)
+    user_id = game_state["players"][0].player_id
+    results = {}
+    for effect_type, skill_names in catalog.skills_by_effect_type.items():
+        skill_name = skill_names[0]
+        targets = skill_targets(catalog.get_skill(skill_name), game_state)
+
+        def run():
+            reset_skill_state(game_state)
+            system.execute_skill(skill_name, user_id, targets, game_state, {})
+        results[f"execute_skill[{effect_type}]@{player_count}"] = measure(run, duration, repeat)
+    results[f"execute_skill[reset only]@{player_count}"] = measure(lambda: reset_skill_state(game_state), duration, repeat)
+    return results
+
+def bench_update_buffs(duration: float, player_count: int, repeat: int = 1) -> Dict[str, float]:
+    system = SkillSystem()
+    game_state = make_skill_state(player_count)
+
+    def run():
+        for p in game_state["players"]:
+            p.hp = p.max_hp
+            p.buffs = BuffList([
+                {"name": "伤害流", "duration": -1, "effect_data": {"damage_bonus": 1}},
+                {"name": "再生", "duration": 3, "effect_data": {"heal": 1}},
+                {"name": "延迟伤害", "duration": 1, "effect_data": {"delayed_damage": 1}},
+            ])
+        system.update_buffs(game_state)
+    return {f"update_buffs@{player_count}": measure(run, duration, repeat)}
+
+def bench_passives(duration: float, repeat: int = 1) -> Dict[str, float]:
+    system = CharacterSystem()
+    names = system.catalog.character_names
+    player = make_player("p0")
+
+    def run():
+        for name in names:
+            player.wins = 0
+            player.buffs.clear()
+            player.states.clear()
+            system.apply_passive_effects(name, player)
+    return {"apply_passive_effects[all]": measure(run, duration, repeat)}
+
+def bench_stacked_buffs(duration: float, repeat: int = 1) -> Dict[str, float]:
+    # 无限乱斗长局里 buff 会越叠越多：伤害、回复结算读取属性总和的开销
+    engine = make_engine(2)
+    pid = next(iter(engine.players))
+    player = engine.players[pid]
+    results = {}
+    for stacks in BUFF_STACKS:
+        player.buffs = BuffList({"name": f"叠加{i}", "duration": -1, "effect_data": {"damage_bonus": 1, "damage_reduction": 1}}
+                                for i in range(stacks))
+
+        def run():
+            engine.get_player_buff(pid, "damage_reduction")
+            engine.get_player_buff(pid, "heal_bonus")
+        results[f"get_player_buff[{stacks} buffs]"] = measure(run, duration, repeat)
+    return results
+
+PER_COUNT_BENCHMARKS = (bench_process_round, bench_judge_moves, bench_validate_targets, bench_public_state,
+                        bench_execute_skill, bench_update_buffs)
+
+def run_suite(duration: float, player_counts=DEFAULT_PLAYER_COUNTS, repeat: int = 3,
+              only: Optional[str] = None) -> Dict[str, float]:
+    results = {}
+    for player_count in player_counts:
+        for bench in PER_COUNT_BENCHMARKS:
+            if only and only not in bench.__name__:
+                continue
+            results.update(bench(duration, player_count, repeat))
+    if not only or only in bench_passives.__name__:
+        results.update(bench_passives(duration, repeat))
+    if not only or only in bench_stacked_buffs.__name__:
+        results.update(bench_stacked_buffs(duration, repeat))
+    return results
+
+def save_baseline(path: str, results: Dict[str, float], duration: float):
+    baseline = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "duration": duration,
+        "results": results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+def compare(baseline: Dict[str, float], results: Dict[str, float], threshold: float) -> List[Dict]:
+    # 吞吐低于基线 (1 - threshold) 倍的项记为回归
+    rows = []
+    for name, rate in results.items():
+        base = baseline.get(name)
+        change = rate / base - 1 if base else None
+        rows.append({"name": name, "baseline": base, "current": rate, "change": change,
+                     "regression": change is not None and change < -threshold})
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="十步拳引擎微基准")
+    parser.add_argument("--duration", type=float, default=0.2, help="每项测量秒数")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复测量次数，取最好的一次")
+    parser.add_argument("--players", type=int, nargs="+", default=list(DEFAULT_PLAYER_COUNTS), help="玩家人数，可给多个")
+    parser.add_argument("--only", help="只运行名称包含该字符串的基准，如 process_round")
+    parser.add_argument("--save", nargs="?", const=BASELINE_FILE, help=f"把结果保存为基线（默认 {BASELINE_FILE}）")
+    parser.add_argument("--compare", nargs="?", const=BASELINE_FILE, help="与基线比较，有回归时退出码为 1")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="吞吐下降超过该比例视为回归")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    results = run_suite(args.duration, args.players, args.repeat, args.only)
+    if args.save:
+        save_baseline(args.save, results, args.duration)
+        print(f"基线已保存: {args.save}")
+    if not args.compare:
+        for name, rate in results.items():
+            print(f"{name:<52} {rate:>14,.0f} 次/秒")
+        return
+
+    with open(args.compare, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)["results"]
+    rows = compare(baseline, results, args.threshold)
+    for row in rows:
+        if row["change"] is None:
+            print(f"{row['name']:<52} {row['current']:>14,.0f} 次/秒  (基线中没有)")
+            continue
+        flag = "  <-- 回归" if row["regression"] else ""
+        print(f"{row['name']:<52} {row['baseline']:>14,.0f} -> {row['current']:>14,.0f} 次/秒  {row['change']:+7.1%}{flag}")
+    regressions = [row for row in rows if row["regression"]]
+    print(f"{len(rows)} 项, 回归 {len(regressions)} 项 (阈值 {args.threshold:.0%})")
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
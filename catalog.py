@@ -0,0 +1,109 @@
+import json
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Any, Optional, Tuple, FrozenSet, Mapping
+from skill_effects import CompiledSkill, compile_skill
+
+CHARACTER_SKILL_KEYS = ("skill", "skill1", "skill2", "skill_normal", "skill_breakthrough")
+
+# 角色默认附带的通用技能
+DEFAULT_CHARACTER_SKILLS = {
+    "幽灵": ("不屈不挠",),
+    "医师": ("青囊秘要", "吃个桃桃"),
+    "圣骑士": ("九锡黄龙",),
+    "记录员": ("将军饮马",),
+}
+
+def _skill_effect_types(skill_data: Dict[str, Any]) -> List[str]:
+    # 新格式为 effects 列表，旧格式（角色技能、BOSS技能）为 effect_type
+    types = [e["type"] for e in skill_data.get("effects", []) if "type" in e]
+    legacy = skill_data.get("effect_type")
+    if isinstance(legacy, str):
+        types.append(legacy)
+    elif isinstance(legacy, (list, tuple)):
+        types.extend(legacy)
+    return types
+
+def _freeze(value: Any) -> Any:
+    # 逐层换成只读视图：dict -> MappingProxyType，list -> tuple
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _freeze_index(index: Dict[str, List[str]]) -> Mapping[str, Tuple[str, ...]]:
+    return MappingProxyType({key: tuple(names) for key, names in index.items()})
+
+class GameCatalog:
+    # 进程内共享的只读角色/技能数据及索引，所有 GameEngine 共用同一份；嵌套的技能、角色数据也逐层冻结
+    def __init__(self, characters_data: Dict[str, Any], skills_data: Dict[str, Any]):
+        characters_data = _freeze(characters_data)
+        skills_data = _freeze(skills_data)
+        self.characters: Mapping[str, Any] = characters_data
+        self.skills: Mapping[str, Any] = skills_data
+        self.skill_names: Tuple[str, ...] = tuple(skills_data.keys())
+        self.character_names: Tuple[str, ...] = tuple(characters_data.keys())
+
+        by_effect: Dict[str, List[str]] = {}
+        by_target: Dict[str, List[str]] = {}
+        control = set()
+        for name, skill in skills_data.items():
+            effect_types = _skill_effect_types(skill)
+            for effect_type in dict.fromkeys(effect_types):
+                by_effect.setdefault(effect_type, []).append(name)
+            target_type = skill.get("target_type")
+            if isinstance(target_type, str):
+                by_target.setdefault(target_type, []).append(name)
+            if skill.get("type") == "控制" or "control" in effect_types:
+                control.add(name)
+
+        character_skills: Dict[str, Tuple[str, ...]] = {}
+        skill_data_by_name: Dict[str, Any] = {}
+        for character_name, character in characters_data.items():
+            skills = []
+            for key in CHARACTER_SKILL_KEYS:
+                if key in character and character[key].get("name"):
+                    skill = character[key]
+                    skills.append(skill["name"])
+                    skill_data_by_name[skill["name"]] = skill
+                    if "control" in _skill_effect_types(skill):
+                        control.add(skill["name"])
+            skills.extend(DEFAULT_CHARACTER_SKILLS.get(character_name, ()))
+            character_skills[character_name] = tuple(skills)
+
+        self.skills_by_effect_type = _freeze_index(by_effect)
+        self.skills_by_target_type = _freeze_index(by_target)
+        self.character_skills: Mapping[str, Tuple[str, ...]] = MappingProxyType(character_skills)
+        self.character_skill_data: Mapping[str, Any] = MappingProxyType(skill_data_by_name)
+        self.control_skills: FrozenSet[str] = frozenset(control)
+        # 加载时将每个技能编译为可直接执行的效果链
+        self.compiled_skills: Mapping[str, CompiledSkill] = MappingProxyType(
+            {name: compile_skill(skill) for name, skill in skills_data.items()})
+
+    def get_skill(self, skill_name: str) -> Optional[Dict[str, Any]]:
+        return self.skills.get(skill_name)
+
+    def get_character(self, character_name: str) -> Optional[Dict[str, Any]]:
+        return self.characters.get(character_name)
+
+    def get_character_skills(self, character_name: str) -> List[str]:
+        # 返回新列表，调用方会在其上追加技能
+        return list(self.character_skills.get(character_name, ()))
+
+    def skills_with_effect(self, effect_type: str) -> Tuple[str, ...]:
+        return self.skills_by_effect_type.get(effect_type, ())
+
+    def skills_with_target(self, target_type: str) -> Tuple[str, ...]:
+        return self.skills_by_target_type.get(target_type, ())
+
+    def is_control_skill(self, skill_name: str) -> bool:
+        return skill_name in self.control_skills
+
+def _load_json(path: str) -> Dict[str, Any]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+@lru_cache(maxsize=None)
+def get_catalog(characters_file: str = "characters.json", skills_file: str = "skills.json") -> GameCatalog:
+    return GameCatalog(_load_json(characters_file), _load_json(skills_file))
\ No newline at end of file
@@ -0,0 +1,128 @@
+import time
+import queue
+import threading
+from collections import deque
+from typing import Dict, List, Iterable, Tuple, Optional
+from eventlog import get_logger
+
+log = get_logger("chat")
+
+LOBBY_CHANNEL = "lobby"
+HISTORY_LIMIT = 50
+WRITE_QUEUE_SIZE = 10000
+WRITE_BATCH_SIZE = 500
+
+class ChatHistory:
+    # 每个频道最近 limit 条消息的环形缓冲，登录时直接从内存下发，不再查询数据库
+    def __init__(self, limit: int = HISTORY_LIMIT):
+        self.limit = limit
+        self.channels: Dict[str, deque] = {}
+
+    def _channel(self, channel: str) -> deque:
+        buffer = self.channels.get(channel)
+        if buffer is None:
+            buffer = self.channels[channel] = deque(maxlen=self.limit)
+        return buffer
+
+    def warm(self, rows: Iterable[Tuple[str, str, str]], channel: str = LOBBY_CHANNEL):
+        # rows 按时间正序
+        buffer = self._channel(channel)
+        buffer.clear()
+        for username, message, timestamp in rows:
+            buffer.append({"username": username, "message": message, "timestamp": timestamp})
+
+    def append(self, entry: Dict, channel: str = LOBBY_CHANNEL):
+        self._channel(channel).append(entry)
+
+    def recent(self, channel: str = LOBBY_CHANNEL) -> List[Dict]:
+        return list(self.channels.get(channel, ()))
+
+class ChatWriter:
+    # 聊天消息异步落库：单个写线程从有界队列取出消息，多条合并为一个事务写入
+    _STOP = object()
+
+    def __init__(self, db, maxsize: int = WRITE_QUEUE_SIZE, batch_size: int = WRITE_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.queue: "queue.Queue" = queue.Queue(maxsize=maxsize)
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="chat-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, username: str, message: str) -> bool:
+        # 队列已满时返回 False，由调用方告知发送者
+        self.start()
+        try:
+            self.queue.put_nowait((username, message))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def backlog(self) -> int:
+        return self.queue.qsize()
+
+    def stats(self) -> Dict[str, int]:
+        return {"backlog": self.backlog(), "written": self.written, "dropped": self.dropped, "failed": self.failed}
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            batch = []
+            stop = item is self._STOP
+            if not stop:
+                batch.append(item)
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+            if batch:
+                self._write(batch)
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self.queue.task_done()
+            if stop:
+                return
+
+    def _write(self, batch: List[Tuple[str, str]]):
+        try:
+            self.db.save_chats(batch)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            log.error("保存聊天消息失败", count=len(batch), error=e)
+
+    def flush(self):
+        # 阻塞直到已提交的消息全部写入
+        if self._thread is not None and self._thread.is_alive():
+            self.queue.join()
+
+    def close(self, timeout: float = 5.0):
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None or not thread.is_alive():
+            return
+        # 停止标记排在已提交消息之后，保证先写完再退出。写线程卡住（如数据库被锁）时
+        # 队列可能一直是满的，放入和等待合计最多 timeout 秒，超时后未写入的消息随进程退出丢弃
+        deadline = time.monotonic() + timeout
+        try:
+            self.queue.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            log.warning("聊天写入队列已满，放弃等待写线程", backlog=self.backlog())
+            return
+        thread.join(max(0.0, deadline - time.monotonic()))
+        if thread.is_alive():
+            log.warning("聊天写线程未在时限内退出", backlog=self.backlog())
\ No newline at end of file
@@ -1,12 +1,13 @@
 import sys
 import logging
-import json
 import socketio
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QLabel, QLineEdit, QPushButton, QComboBox, QMessageBox, QTextEdit,
                              QGridLayout, QStackedWidget, QListWidget)
 from PyQt6.QtCore import Qt, pyqtSignal
 from PyQt6.QtGui import QFont
+from catalog import get_catalog
+from state_sync import apply_delta
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -133,15 +134,14 @@ class TenStepsClient(QMainWindow):
         self.mode_combo = QComboBox()
         self.mode_combo.addItems(["普通模式", "Boss战", "无限乱斗"])
         self.mode_combo.setStyleSheet("padding: 8px; border-radius: 5px;")
-        self.vote_button = QPushButton("投票")
+        self.vote_button = QPushButton("切换模式")
         self.vote_button.setStyleSheet("padding: 10px; border-radius: 5px; background-color: #007AFF; color: white;")
         self.vote_button.clicked.connect(self.handle_vote_mode)
-        self.vote_tally_label = QLabel("投票: 普通: 0, Boss: 0, 无限: 0")
+        self.vote_tally_label = QLabel("排队: 普通: 0, Boss: 0, 无限: 0")
         self.vote_tally_label.setStyleSheet("font-size: 14px;")
-        self.force_start_button = QPushButton("强制开始")
+        self.force_start_button = QPushButton("开始匹配")
         self.force_start_button.setStyleSheet("padding: 10px; border-radius: 5px; background-color: #007AFF; color: white;")
         self.force_start_button.clicked.connect(self.handle_force_start)
-        self.force_start_button.setEnabled(False)
         self.lobby_chat_display = QTextEdit()
         self.lobby_chat_display.setReadOnly(True)
         self.lobby_chat_display.setStyleSheet("padding: 8px; border-radius: 5px; border: 1px solid #ccc;")
@@ -177,9 +177,7 @@ class TenStepsClient(QMainWindow):
         self.style_combo.setStyleSheet("padding: 8px; border-radius: 5px;")
         self.skill_combos = [QComboBox() for _ in range(5)]
         for combo in self.skill_combos:
-            with open("skills.json", encoding="utf-8") as f:
-                skills = json.load(f)
-                combo.addItems(list(skills.keys()))
+            combo.addItems(get_catalog().skill_names)
             combo.setStyleSheet("padding: 8px; border-radius: 5px;")
             self.selection_layout.addWidget(combo)
             combo.setVisible(False)
@@ -296,14 +294,17 @@ class TenStepsClient(QMainWindow):
         self.sio.on("connect", self.on_connect, namespace="/game")
         self.sio.on("login_success", self.on_login_success, namespace="/game")
         self.sio.on("login_failed", self.on_login_failed, namespace="/game")
+        self.sio.on("login_redirect", self.on_login_redirect, namespace="/game")
         self.sio.on("register_success", self.on_register_success, namespace="/game")
         self.sio.on("register_failed", self.on_register_failed, namespace="/game")
         self.sio.on("game_start", self.on_game_start, namespace="/game")
         self.sio.on("character_selected", self.on_character_selected, namespace="/game")
         self.sio.on("select_character_failed", self.on_select_character_failed, namespace="/game")
         self.sio.on("game_state", self.on_game_state, namespace="/game")
+        self.sio.on("game_state_delta", self.on_game_state_delta, namespace="/game")
         self.sio.on("game_over", self.on_game_over, namespace="/game")
         self.sio.on("receive_chat", self.on_receive_chat, namespace="/game")
+        self.sio.on("chat_history", self.on_chat_history, namespace="/game")
         self.sio.on("chat_error", self.on_chat_error, namespace="/game")
         self.sio.on("update_player_list", self.on_update_player_list, namespace="/game")
         self.sio.on("force_start_status", self.on_force_start_status, namespace="/game")
@@ -384,6 +385,21 @@ class TenStepsClient(QMainWindow):
         self.game_id = data.get("game_id")
         self.update_ui_signal.emit({"action": "show_lobby"})
 
+    def on_login_redirect(self, data):
+        # 多进程服务器：该账号归属另一个工作进程，断开后改连，凭服务器签发的一次性令牌登录。
+        # 不能在事件回调线程里直接断开连接，交给后台任务
+        self.sio.start_background_task(self.follow_redirect, data["url"], data["token"])
+
+    def follow_redirect(self, url, token):
+        try:
+            self.sio.disconnect()
+            self.sio.connect(url, namespaces=["/game"])
+            self.sio.emit("login", {"username": self.username, "token": token}, namespace="/game")
+        except Exception as e:
+            self.is_connecting = False
+            logging.error(f"重定向连接失败: {e}")
+            self.show_message_signal.emit("错误", f"连接错误: {e}")
+
     def on_login_failed(self, data):
         self.is_connecting = False
         self.show_message_signal.emit("错误", data["message"])
@@ -420,6 +436,10 @@ class TenStepsClient(QMainWindow):
         logging.debug(f"收到 game_state 数据: {data}")
         self.update_ui_signal.emit({"action": "update_game_state", "data": data})
 
+    def on_game_state_delta(self, data):
+        logging.debug(f"收到 game_state_delta 数据: {data}")
+        self.update_ui_signal.emit({"action": "apply_state_delta", "data": data})
+
     def on_game_over(self, data):
         winner = data["winner"]
         tasks = data.get("tasks", {})
@@ -447,6 +467,10 @@ class TenStepsClient(QMainWindow):
         if self.current_chat_display:
             self.current_chat_display.append(f"[{timestamp}] {username}: {message}")
 
+    def on_chat_history(self, data):
+        for entry in data.get("messages", []):
+            self.on_receive_chat(entry)
+
     def on_chat_error(self, data):
         self.show_message_signal.emit("错误", data["message"])
 
@@ -461,7 +485,7 @@ class TenStepsClient(QMainWindow):
 
     def on_vote_mode_status(self, data):
         votes = data["votes"]
-        self.vote_tally_label.setText(f"投票: 普通: {votes['standard']}, Boss: {votes['boss']}, 无限: {votes['infinite']}")
+        self.vote_tally_label.setText(f"排队: 普通: {votes['standard']}, Boss: {votes['boss']}, 无限: {votes['infinite']}")
 
     def on_boss_skill_disabled(self, data):
         self.battle_log.append(f"BOSS技能 {data['skill_index']} 被禁用")
@@ -535,10 +559,8 @@ class TenStepsClient(QMainWindow):
             self.show_message_signal.emit("警告", "无效目标")
             return
         params = {}
-        with open("skills.json", encoding="utf-8") as f:
-            skills = json.load(f)
-            if skills.get(skill, {}).get("use_win"):
-                params["consume_win"] = True
+        if (get_catalog().get_skill(skill) or {}).get("use_win"):
+            params["consume_win"] = True
         self.sio.emit("use_skill", {
             "game_id": self.game_id,
             "player_id": self.player_id,
@@ -575,7 +597,6 @@ class TenStepsClient(QMainWindow):
         if action == "show_lobby":
             self.stack.setCurrentWidget(self.lobby_panel)
             self.current_chat_display = self.lobby_chat_display
-            self.force_start_button.setEnabled(self.player_list.count() >= 2)
             self.player_labels.clear()
         elif action == "show_selection":
             self.stack.setCurrentWidget(self.selection_panel)
@@ -584,6 +605,8 @@ class TenStepsClient(QMainWindow):
                 combo.setVisible(self.mode == "infinite")
         elif action == "update_game_state":
             self.update_game_state(data["data"])
+        elif action == "apply_state_delta":
+            self.apply_state_delta(data["data"])
         elif action == "update_labels":
             self.update_player_labels(data["player_id"], data["username"], data["character"], data["style"])
 
@@ -591,7 +614,6 @@ class TenStepsClient(QMainWindow):
         self.player_list.clear()
         for player in players:
             self.player_list.addItem(f"{player['username']} ({player['player_id']})")
-        self.force_start_button.setEnabled(self.player_list.count() >= 2)
 
     def update_player_labels(self, player_id, username, character, style):
         found = False
@@ -608,13 +630,22 @@ class TenStepsClient(QMainWindow):
             self.player_labels.append(label)
         logging.debug(f"更新标签: {username}: {character} ({style})")
 
+    def apply_state_delta(self, data):
+        game_state = apply_delta(self.game_state, data)
+        if game_state is None:
+            # 漏掉了中间的增量，丢弃并请求完整状态
+            logging.debug(f"状态版本不连续: 本地 {self.game_state.get('version')}, 增量基于 {data['delta']['base_version']}")
+            self.sio.emit("request_resync", {"player_id": self.player_id}, namespace="/game")
+            return
+        self.update_game_state(game_state)
+
     def update_game_state(self, game_state):
         self.stack.setCurrentWidget(self.battle_panel)
         self.current_chat_display = self.battle_chat_display
         player = next((p for p in game_state.get("players", []) if p["player_id"] == self.player_id), {})
         self.hp_label.setText(f"血量: {player.get('hp', 0)}/{player.get('max_hp', 0)}")
         self.wins_label.setText(f"胜局: {player.get('wins', 0)}")
-        buffs = [b["name"] for b in player.get('buffs', [])]
+        buffs = player.get('buffs', [])
         self.buff_label.setText(f"Buff: {', '.join(buffs) or '无'}")
         tasks = game_state.get("tasks", {}).get(self.username, [])
         task_text = ""
@@ -666,17 +697,15 @@ class TenStepsClient(QMainWindow):
             self.expected_damage_label.setText("预计伤害: 0")
             return
         try:
-            with open("skills.json", encoding="utf-8") as f:
-                skills = json.load(f)
-                skill_data = skills.get(skill, {})
-                base_damage = skill_data.get("damage", 0)
-                player = next((p for p in self.game_state.get("players", []) if p["player_id"] == self.player_id), {})
-                style = player.get("style", "")
-                if style == "伤害流" and base_damage > 0:
-                    base_damage += 1
-                elif style == "增益流" and base_damage > 0:
-                    base_damage *= 1.1
-                self.expected_damage_label.setText(f"预计伤害: {base_damage:.1f}")
+            skill_data = get_catalog().get_skill(skill) or {}
+            base_damage = skill_data.get("damage", 0)
+            player = next((p for p in self.game_state.get("players", []) if p["player_id"] == self.player_id), {})
+            style = player.get("style", "")
+            if style == "伤害流" and base_damage > 0:
+                base_damage += 1
+            elif style == "增益流" and base_damage > 0:
+                base_damage *= 1.1
+            self.expected_damage_label.setText(f"预计伤害: {base_damage:.1f}")
         except Exception as e:
             logging.error(f"加载技能数据失败: {e}")
             self.expected_damage_label.setText("预计伤害: 未知")
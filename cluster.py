@@ -0,0 +1,240 @@
+import os
+import hmac
+import time
+import zlib
+import socket
+import hashlib
+import secrets
+import argparse
+import threading
+import socketserver
+from collections import deque
+from typing import Dict, List, Callable, Optional, Tuple
+import socketio
+from eventlog import get_logger
+from metrics import REGISTRY
+
+# 多进程部署：serve.py --workers N 为每个工作进程设置这些环境变量。单进程运行时都为空
+BROKER_ADDRESS = os.environ.get("TEN_STEPS_BROKER", "")
+WORKER_INDEX = int(os.environ.get("TEN_STEPS_WORKER_INDEX", "0"))
+# 各工作进程对客户端公开的地址，按编号排列，逗号分隔
+WORKER_URLS = [url for url in os.environ.get("TEN_STEPS_WORKER_URLS", "").split(",") if url]
+# 登录重定向令牌的签名密钥，由 serve.py 为同一组工作进程生成；单进程运行时随机生成也不会用到
+REDIRECT_SECRET = os.environ.get("TEN_STEPS_REDIRECT_SECRET") or secrets.token_hex(16)
+REDIRECT_TOKEN_TTL = 30.0
+DEFAULT_BROKER_PORT = 5100
+RECONNECT_DELAY = 1.0
+# 与中转断开期间最多缓存的待发消息数，超出时丢弃最早的并计数
+OUTBOX_BACKLOG = 1000
+
+BROKER_DROPPED = REGISTRY.counter("ten_steps_broker_dropped_total", "与中转断开期间因缓存已满丢弃的广播数")
+
+log = get_logger("cluster")
+
+def parse_address(address: str) -> Tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port or DEFAULT_BROKER_PORT)
+
+def home_worker(username: str, worker_count: int) -> int:
+    # 玩家固定归属一个工作进程：只在同一进程的大厅里匹配，对局房间也就只存在于该进程
+    return zlib.crc32(username.encode("utf-8")) % worker_count if worker_count > 1 else 0
+
+def redirect_url(username: str) -> Optional[str]:
+    # 不是本进程负责的玩家返回其归属进程的地址，否则返回 None
+    if len(WORKER_URLS) < 2 or not username:
+        return None
+    index = home_worker(username, len(WORKER_URLS))
+    return WORKER_URLS[index] if index != WORKER_INDEX else None
+
+def _sign(payload: str) -> str:
+    return hmac.new(REDIRECT_SECRET.encode("utf-8"), payload.encode("utf-8"), hashlib.sha256).hexdigest()
+
+def issue_redirect_token(username: str, ttl: float = REDIRECT_TOKEN_TTL) -> str:
+    # 密码已在当前进程验证过：归属进程凭令牌直接登录，客户端不必保存和重发密码
+    payload = f"{int(time.time() + ttl)}:{secrets.token_hex(8)}:{username}"
+    return f"{payload}:{_sign(payload)}"
+
+# 已用过的令牌 -> 过期时间，同一令牌只能登录一次
+_used_tokens: Dict[str, float] = {}
+
+def verify_redirect_token(token: str) -> Optional[str]:
+    # 有效返回用户名，否则返回 None
+    payload, _, signature = str(token).rpartition(":")
+    expires, _, rest = payload.partition(":")
+    _, _, username = rest.partition(":")
+    now = time.time()
+    if not username or not hmac.compare_digest(_sign(payload), signature):
+        return None
+    try:
+        if int(expires) < now:
+            return None
+    except ValueError:
+        return None
+    for used, used_expires in list(_used_tokens.items()):
+        if used_expires < now:
+            del _used_tokens[used]
+    if payload in _used_tokens:
+        return None
+    _used_tokens[payload] = int(expires)
+    return username
+
+class _BrokerHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.send_lock = threading.Lock()
+        self.server.add_client(self)
+
+    def handle(self):
+        for line in self.rfile:
+            if line.strip():
+                self.server.publish(self, line)
+
+    def finish(self):
+        self.server.remove_client(self)
+        super().finish()
+
+    def send(self, line: bytes):
+        with self.send_lock:
+            try:
+                self.wfile.write(line)
+            except OSError:
+                pass
+
+class MessageBroker(socketserver.ThreadingTCPServer):
+    # 本机消息中转：每个连接发来的一行 JSON 原样转发给其他所有连接，不解析内容
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: Tuple[str, int]):
+        super().__init__(address, _BrokerHandler)
+        self.clients: List[_BrokerHandler] = []
+        self.lock = threading.Lock()
+
+    def add_client(self, client: _BrokerHandler):
+        with self.lock:
+            self.clients.append(client)
+        log.info("工作进程接入", peer=client.client_address, clients=len(self.clients))
+
+    def remove_client(self, client: _BrokerHandler):
+        with self.lock:
+            if client in self.clients:
+                self.clients.remove(client)
+        log.info("工作进程断开", peer=client.client_address, clients=len(self.clients))
+
+    def publish(self, sender: _BrokerHandler, line: bytes):
+        with self.lock:
+            targets = [client for client in self.clients if client is not sender]
+        for client in targets:
+            client.send(line)
+
+def start_broker(address: str) -> MessageBroker:
+    # 在后台线程运行，返回的 broker 调用 shutdown() 停止
+    broker = MessageBroker(parse_address(address))
+    threading.Thread(target=broker.serve_forever, name="broker", daemon=True).start()
+    return broker
+
+class LocalBrokerManager(socketio.PubSubManager):
+    # 通过 MessageBroker 在工作进程之间转发 emit。对局房间和单个玩家只存在于其归属进程，
+    # 指定了 to/room 的消息直接在本进程投递；只有面向所有人的广播（如大厅聊天）经过中转
+    name = "localbroker"
+
+    def __init__(self, address: str, channel: str = "ten_steps", write_only: bool = False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.address = parse_address(address)
+        self.sock: Optional[socket.socket] = None
+        self.outbox = None
+        # 未连上中转时待发的消息，重连后先发出
+        self.backlog: "deque[bytes]" = deque()
+        # 其他进程广播的事件到达时回调，如把别的进程的聊天消息追加到本地历史：event -> fn(*data)
+        self.remote_handlers: Dict[str, Callable] = {}
+
+    def initialize(self):
+        self.outbox = self.server.eio.create_queue()
+        super().initialize()
+        self.server.start_background_task(self._writer)
+
+    def on_remote(self, event: str, handler: Callable):
+        self.remote_handlers[event] = handler
+
+    def notify_peers(self, event: str, *data):
+        # 只交给其他进程的 on_remote 回调，不投递给任何客户端，如各进程同步自己的大厅玩家列表
+        self._publish({"method": "emit", "event": event, "data": list(data), "peers_only": True, "host_id": self.host_id})
+
+    def emit(self, event, data, namespace=None, room=None, skip_sid=None, callback=None, to=None, **kwargs):
+        if (to or room) is not None:
+            kwargs["ignore_queue"] = True
+        return super().emit(event, data, namespace=namespace, room=room, skip_sid=skip_sid,
+                            callback=callback, to=to, **kwargs)
+
+    def _handle_emit(self, message):
+        if message.get("host_id") != self.host_id:
+            handler = self.remote_handlers.get(message.get("event"))
+            if handler:
+                try:
+                    handler(*message["data"])
+                except Exception as e:
+                    log.error("处理远程事件失败", event=message.get("event"), error=e)
+        if not message.get("peers_only"):
+            super()._handle_emit(message)
+
+    def _publish(self, data):
+        if self.outbox is not None:
+            self.outbox.put(self.json.dumps(data).encode("utf-8") + b"\n")
+
+    def _writer(self):
+        # 由单独的后台任务写出，发送方不会因为中转进程阻塞。未连上中转时消息先缓存，
+        # 最多 OUTBOX_BACKLOG 条；重连后 _listen 放入 None 唤醒这里把缓存发出
+        while True:
+            line = self.outbox.get()
+            if line is not None:
+                if len(self.backlog) >= OUTBOX_BACKLOG:
+                    self.backlog.popleft()
+                    BROKER_DROPPED.inc()
+                self.backlog.append(line)
+            sock = self.sock
+            while sock is not None and self.backlog:
+                try:
+                    sock.sendall(self.backlog[0])
+                except OSError as e:
+                    log.warning("发送到中转失败", error=e)
+                    break
+                self.backlog.popleft()
+
+    def _listen(self):
+        while True:
+            try:
+                sock = socket.create_connection(self.address)
+            except OSError as e:
+                log.warning("连接中转失败", address=self.address, error=e)
+                self.server.sleep(RECONNECT_DELAY)
+                continue
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.sock = sock
+            log.info("已连接中转", address=self.address, backlog=len(self.backlog))
+            if self.backlog:
+                self.outbox.put(None)
+            try:
+                for line in sock.makefile("rb"):
+                    yield line.decode("utf-8")
+            except OSError as e:
+                log.warning("中转连接中断", error=e)
+            finally:
+                self.sock = None
+                sock.close()
+            self.server.sleep(RECONNECT_DELAY)
+
+def main():
+    parser = argparse.ArgumentParser(description="十步拳多进程消息中转（serve.py --workers 会自动启动）")
+    parser.add_argument("--address", default=f"127.0.0.1:{DEFAULT_BROKER_PORT}")
+    args = parser.parse_args()
+    from eventlog import configure_logging
+    configure_logging()
+    broker = MessageBroker(parse_address(args.address))
+    log.info("消息中转启动", address=args.address)
+    try:
+        broker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
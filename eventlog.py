@@ -0,0 +1,126 @@
+import os
+import json
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from typing import Dict, Any, Optional
+
+# 默认级别；各模块可单独设置，如 "game_logic=WARNING,server=DEBUG"
+LOG_LEVEL = os.environ.get("TEN_STEPS_LOG_LEVEL", "INFO")
+LOG_LEVELS = os.environ.get("TEN_STEPS_LOG_LEVELS", "")
+# 按事件采样，如 "回合结算完成=0.01" 表示该事件只记录 1%
+LOG_SAMPLE = os.environ.get("TEN_STEPS_LOG_SAMPLE", "")
+LOG_JSON = os.environ.get("TEN_STEPS_LOG_JSON", "") not in ("", "0")
+
+_sample_rates: Dict[str, float] = {}
+# 采样用独立的随机数发生器，不影响全局 random 和对局的种子
+_sampler = random.Random()
+_handler: Optional[logging.Handler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+class EventLogger:
+    # 结构化日志：事件名 + 字段。级别未开启或被采样丢弃时不做任何格式化；
+    # 字段原样交给处理线程格式化，调用方不要在记录后修改传入的对象
+    __slots__ = ("logger",)
+
+    def __init__(self, name: str):
+        self.logger = logging.getLogger(name)
+
+    def _log(self, level: int, event: str, fields: Dict[str, Any]):
+        if not self.logger.isEnabledFor(level):
+            return
+        rate = _sample_rates.get(event)
+        if rate is not None and _sampler.random() >= rate:
+            return
+        self.logger.log(level, event, extra={"fields": fields}, stacklevel=3)
+
+    def is_enabled(self, level: int = logging.DEBUG) -> bool:
+        return self.logger.isEnabledFor(level)
+
+    def debug(self, event: str, /, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, /, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event: str, /, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event: str, /, **fields):
+        self._log(logging.ERROR, event, fields)
+
+def get_logger(name: str) -> EventLogger:
+    return EventLogger(name)
+
+class StructuredFormatter(logging.Formatter):
+    # 文本格式: 时间 级别 模块 事件 key=value ...；json_lines 时每条一行 JSON
+    def __init__(self, json_lines: bool = False):
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = getattr(record, "fields", None) or {}
+        if self.json_lines:
+            data = {"time": self.formatTime(record), "level": record.levelname, "logger": record.name,
+                    "event": record.getMessage(), **fields}
+            if record.exc_info:
+                data["exc"] = self.formatException(record.exc_info)
+            return json.dumps(data, ensure_ascii=False, default=str)
+        text = f"{self.formatTime(record)} {record.levelname} {record.name} {record.getMessage()}"
+        if fields:
+            text += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    # 默认的 prepare 会在调用线程里格式化消息；这里原样入队，格式化交给后台线程
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+def _parse_pairs(spec: str) -> Dict[str, str]:
+    pairs = {}
+    for item in spec.split(","):
+        if "=" in item:
+            key, value = item.split("=", 1)
+            pairs[key.strip()] = value.strip()
+    return pairs
+
+def configure_logging(level: Optional[str] = None, levels: Optional[str] = None, sample: Optional[str] = None,
+                      json_lines: Optional[bool] = None, use_queue: bool = True):
+    # 服务器入口调用一次；参数为空时读取环境变量。重复调用会替换之前的处理器
+    global _handler, _listener
+    root = logging.getLogger()
+    root.setLevel((level or LOG_LEVEL).upper())
+    for name, module_level in _parse_pairs(LOG_LEVELS if levels is None else levels).items():
+        logging.getLogger(name).setLevel(module_level.upper())
+    _sample_rates.clear()
+    _sample_rates.update({event: float(rate) for event, rate in _parse_pairs(LOG_SAMPLE if sample is None else sample).items()})
+
+    if _listener:
+        _listener.stop()
+        _listener = None
+    if _handler:
+        root.removeHandler(_handler)
+    stream = logging.StreamHandler()
+    stream.setFormatter(StructuredFormatter(LOG_JSON if json_lines is None else json_lines))
+    if use_queue:
+        # 调用线程只负责入队，格式化和写出在后台线程进行
+        log_queue = queue.SimpleQueue()
+        _handler = _QueueHandler(log_queue)
+        _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+        _listener.start()
+    else:
+        _handler = stream
+    root.addHandler(_handler)
+
+def shutdown_logging():
+    # 退出前把队列中剩余的日志写完
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
+
+atexit.register(shutdown_logging)
\ No newline at end of file
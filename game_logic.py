@@ -1,134 +1,150 @@
-import json
 import random
-import logging
 from typing import Dict, List, Optional
-from copy import deepcopy
+from dataclasses import asdict
 from skills import SkillSystem
 from characters import CharacterSystem
-
-logging.basicConfig(level=logging.DEBUG)
+from catalog import get_catalog
+from player_state import PlayerState, Style, Move, MOVE_LABELS, intern_name
+from eventlog import get_logger
+
+log = get_logger("game_logic")
+
+# 录制的输入类型 -> 引擎方法，回放时按顺序重新调用
+INPUT_METHODS = {
+    "select": "select_character",
+    "move": "submit_move",
+    "skill": "use_skill",
+    "round": "process_round",
+    "skill_phase": "process_skill_phase",
+    "settle": "settle_damage",
+    "leave": "remove_player",
+    "rename": "rename_player",
+    "grant_win": "grant_win",
+    "adjust_hp": "adjust_hp",
+    "unlock_skill": "unlock_temp_skill",
+    "grant_block": "grant_block",
+}
 
 class GameEngine:
-    def __init__(self, player_ids: List[str], mode: str = "standard"):
-        self.players = {
-            pid: {
-                "socket_id": None,
-                "username": f"Player {pid}",
-                "hp": 0,
-                "max_hp": 0,
-                "wins": 0,
-                "character": None,
-                "style": None,
-                "available_skills": [],
-                "skill_cooldowns": {},
-                "buffs": [],
-                "debuffs": [],
-                "states": {},
-                "pending_moves": None,
-                "pending_skills": [],
-                "is_alive": True,
-                "ghost_hits": 0,
-                "revive_timer": 0,
-                "recorded_skills": [],
-                "mimic_character": None,
-                "proficiency": {},
-                "tasks": [],
-                "revive_count": 0,
-                "puppet_master": None,
-            } for pid in player_ids
+    def __init__(self, player_ids: List[str], mode: str = "standard", seed: Optional[int] = None):
+        # 每局独立的随机数发生器；同一种子加同一输入序列可完全复现对局
+        self.seed = seed if seed is not None else random.randrange(2 ** 63)
+        self.rng = random.Random(self.seed)
+        # 开局时的玩家 id，重连改名后也不变，录像回放从这里开始
+        self.player_ids = list(player_ids)
+        self.inputs: List[List] = []
+        # 从快照恢复时快照之前的输入条数；不为 0 时 inputs 只有快照之后的部分，不能导出完整录像
+        self.input_base = 0
+        # 可选的持久化日志（journal.GameJournal），每条输入同时追加写入
+        self.journal = None
+        self.players: Dict[str, PlayerState] = {
+            pid: PlayerState(player_id=pid, username=f"Player {pid}") for pid in player_ids
         }
         self.current_round = 0
         self.moves = {}
         self.ready_players = set()
+        # 上次回合结算以来各玩家造成的伤害、规避的次数，由技能效果累计，process_round 结果中带出后清零
+        self.round_stats: Dict[str, Dict[str, float]] = {"damage_dealt": {}, "evasions": {}}
         self.game_over = False
         self.winner = None
-        self.characters = CharacterSystem()
-        self.skills = SkillSystem()
-        self.common_skills = list(self.skills.get_all_skills().keys())
+        self.catalog = get_catalog()
+        self.characters = CharacterSystem(catalog=self.catalog)
+        self.skills = SkillSystem(catalog=self.catalog)
+        self.common_skills = self.catalog.skill_names
         self.mode = mode
         self.boss_id = None
         self.MAX_WINS = 3
-        self.MOVE_OPTIONS = ["石头", "剪刀", "布"]
+        self.MOVE_OPTIONS = list(Move)
+        # 状态版本：每次修改对局状态后递增，公开状态投影按版本缓存
+        self.state_version = 0
+        self._projection_version = -1
+        self._projections = {}
 
     def select_character(self, player_id: str, character_name: str, style: str, username: str, selected_skills: List[str] = []) -> Dict:
+        self._record(["select", player_id, character_name, style, username, list(selected_skills)])
         if player_id not in self.players:
             return {"success": False, "message": "玩家不存在"}
         if character_name not in self.characters.get_all_characters():
             return {"success": False, "message": "角色不存在"}
-        if style not in ["伤害流", "控制流", "回复流", "增益流", "防御流"]:
+        if style not in Style._value2member_map_:
             return {"success": False, "message": "无效流派"}
         if self.mode == "infinite" and len(selected_skills) != 5:
             return {"success": False, "message": "无限乱斗需选择5个技能"}
 
         player = self.players[player_id]
         character = self.characters.get_character(character_name)
-        player["character"] = character_name
-        player["style"] = style
-        player["username"] = username
-        player["max_hp"] = character.get("max_hp", 15)
-        player["hp"] = player["max_hp"]
+        player.character = intern_name(character_name)
+        player.style = Style(style)
+        player.username = username
+        player.max_hp = character.get("max_hp", 15)
+        player.hp = player.max_hp
         if character_name in ["幽灵", "超限者"] and "breakthrough_hp" in character:
-            player["max_hp"] = character["breakthrough_hp"]
-            player["hp"] = player["max_hp"]
+            player.max_hp = character["breakthrough_hp"]
+            player.hp = player.max_hp
         if self.mode == "infinite":
-            player["max_hp"] = 12
-            player["hp"] = 12
+            player.max_hp = 12
+            player.hp = 12
 
         # 流派效果
         if style == "伤害流":
-            player["buffs"].append({"name": "伤害流", "duration": -1, "effect_data": {"damage_bonus": 1}})
+            player.buffs.append({"name": "伤害流", "duration": -1, "effect_data": {"damage_bonus": 1}})
         elif style == "控制流":
-            player["buffs"].append({"name": "控制流", "duration": -1, "effect_data": {"control_bonus": 1}})
+            player.buffs.append({"name": "控制流", "duration": -1, "effect_data": {"control_bonus": 1}})
         elif style == "回复流":
-            player["buffs"].append({"name": "回复流", "duration": -1, "effect_data": {"heal_bonus": 1}})
+            player.buffs.append({"name": "回复流", "duration": -1, "effect_data": {"heal_bonus": 1}})
         elif style == "增益流":
-            player["buffs"].append({"name": "增益流", "duration": -1, "effect_data": {"buff_multiplier": 1.1}})
+            player.buffs.append({"name": "增益流", "duration": -1, "effect_data": {"buff_multiplier": 1.1}})
         elif style == "防御流":
-            player["buffs"].append({"name": "防御流", "duration": -1, "effect_data": {"damage_reduction": 1}})
+            player.buffs.append({"name": "防御流", "duration": -1, "effect_data": {"damage_reduction": 1}})
 
         # 初始化技能
-        player["available_skills"] = selected_skills if self.mode == "infinite" else self.characters.get_character_skills(character_name)
+        player.available_skills = [intern_name(s) for s in selected_skills] if self.mode == "infinite" else self.characters.get_character_skills(character_name)
         if self.mode == "infinite":
-            player["available_skills"].append("鸿运当头")
+            player.available_skills.append("鸿运当头")
 
         # 熟练度
-        player["proficiency"][character_name] = player["proficiency"].get(character_name, 0) + 1
+        player.proficiency[character_name] = player.proficiency.get(character_name, 0) + 1
 
         # 初始化被动
         self.characters.apply_passive_effects(character_name, player)
         self.ready_players.add(player_id)
-        logging.debug(f"玩家 {player_id} ({username}) 选择角色 {character_name} ({style})，技能: {player['available_skills']}")
+        log.debug("选择角色", player_id=player_id, username=username, character=character_name, style=style, skills=list(player.available_skills))
 
         # BOSS战初始化
         if self.mode == "boss" and not self.boss_id and len(self.ready_players) == len(self.players):
-            self.boss_id = random.choice(list(self.players.keys()))
-            self.players[self.boss_id]["max_hp"] = 50 + 10 * len(self.players)
-            self.players[self.boss_id]["hp"] = self.players[self.boss_id]["max_hp"]
-            self.players[self.boss_id]["available_skills"] += ["横扫", "要害锁定", "震天撼地", "能屈能伸", "复刻"]
+            self.boss_id = self.rng.choice(list(self.players.keys()))
+            self.players[self.boss_id].max_hp = 50 + 10 * len(self.players)
+            self.players[self.boss_id].hp = self.players[self.boss_id].max_hp
+            self.players[self.boss_id].available_skills += ["横扫", "要害锁定", "震天撼地", "能屈能伸", "复刻"]
 
+        self.mark_dirty()
         return {"success": True}
 
     def submit_move(self, player_id: str, move: str) -> Dict:
+        self._record(["move", player_id, move])
         if player_id not in self.players:
             return {"success": False, "message": "玩家不存在"}
-        if move not in self.MOVE_OPTIONS:
+        parsed_move = Move.parse(move)
+        if parsed_move is None:
             return {"success": False, "message": "无效出拳"}
-        if not self.players[player_id]["is_alive"]:
+        if not self.players[player_id].is_alive:
             return {"success": False, "message": "玩家已死亡"}
         if self.mode == "boss" and player_id == self.boss_id:
             return {"success": False, "message": "BOSS不参与猜拳"}
 
-        self.moves[player_id] = move
+        self.moves[player_id] = parsed_move
+        self.mark_dirty()
         return {"success": True}
 
     def use_skill(self, player_id: str, skill_name: str, targets: List[str], params: Dict = {}, consume_win: bool = False) -> Dict:
+        self._record(["skill", player_id, skill_name, list(targets), dict(params), consume_win])
         if player_id not in self.players:
             return {"success": False, "message": "玩家不存在"}
-        if not self.players[player_id]["is_alive"]:
+        if not self.players[player_id].is_alive:
             return {"success": False, "message": "玩家已死亡"}
-        if skill_name not in self.players[player_id]["available_skills"]:
+        if skill_name not in self.players[player_id].available_skills:
             return {"success": False, "message": "技能不可用"}
-        if consume_win and self.players[player_id]["wins"] <= 0:
+        if consume_win and self.players[player_id].wins <= 0:
             return {"success": False, "message": "没有胜局可消耗"}
 
         player = self.players[player_id]
@@ -138,18 +154,19 @@ class GameEngine:
         if not skill_data:
             return {"success": False, "message": "技能数据不存在"}
 
-        if skill_name in player["skill_cooldowns"] and player["skill_cooldowns"][skill_name] > 0:
+        if skill_name in player.skill_cooldowns and player.skill_cooldowns[skill_name] > 0:
             return {"success": False, "message": "技能在冷却中"}
-        if "usage_limit" in skill_data and sum(1 for s in player["pending_skills"] if s["skill_name"] == skill_name) >= skill_data["usage_limit"]:
+        if "usage_limit" in skill_data and sum(1 for s in player.pending_skills if s["skill_name"] == skill_name) >= skill_data["usage_limit"]:
             return {"success": False, "message": "技能使用次数已达上限"}
 
         if not self.validate_targets(skill_data, targets, player_id):
             return {"success": False, "message": "无效目标"}
 
         if consume_win:
-            player["wins"] -= 1
+            player.wins -= 1
 
-        player["pending_skills"].append({"skill_name": skill_name, "targets": targets, "params": params})
+        player.pending_skills.append({"skill_name": skill_name, "targets": targets, "params": params})
+        self.mark_dirty()
         return {"success": True}
 
     def get_boss_skill(self, skill_name: str) -> Optional[Dict]:
@@ -204,7 +221,7 @@ class GameEngine:
 
     def validate_targets(self, skill_data: Dict, targets: List[str], player_id: str) -> bool:
         target_type = skill_data["target_type"]
-        alive_players = [pid for pid in self.players if self.players[pid]["is_alive"]]
+        alive_players = [pid for pid in self.players if self.players[pid].is_alive]
         if target_type == "self" and targets != [player_id]:
             return False
         if target_type in ["single_enemy", "single_any"] and (len(targets) != 1 or targets[0] not in alive_players or (target_type == "single_enemy" and targets[0] == player_id)):
@@ -216,44 +233,45 @@ class GameEngine:
         return True
 
     def process_round(self) -> Dict:
+        self._record(["round"])
+        self.mark_dirty()
         self.current_round += 1
         results = {
             "moves": {},
             "effects": [],
             "damages": [],
             "wins": {},
-            "tasks": [],
-            "players": [
-                {"player_id": pid, **player_data}
-                for pid, player_data in self.players.items()
-            ]
+            "tasks": []
         }
-        logging.debug(f"处理第 {self.current_round} 回合")
+        log.debug("处理回合", round=self.current_round)
 
         # 更新状态
         self.update_states_and_cooldowns(results)
         self.apply_round_passives()
         self.process_tasks(results)
 
+        # 蓄力技能每回合倒数一次，到期时对开始蓄力时选定的目标发动
+        results["effects"].extend(self.skills.process_charge_skills(self.get_skill_state()))
+
         # 处理出拳
         for pid in self.players:
-            if pid not in self.moves and self.players[pid]["is_alive"] and (self.mode != "boss" or pid != self.boss_id):
-                self.moves[pid] = random.choice(self.MOVE_OPTIONS)
+            if pid not in self.moves and self.players[pid].is_alive and (self.mode != "boss" or pid != self.boss_id):
+                self.moves[pid] = self.rng.choice(self.MOVE_OPTIONS)
             if pid in self.moves:
-                results["moves"][pid] = self.moves[pid]
+                results["moves"][pid] = MOVE_LABELS[self.moves[pid]]
 
         # 判定出拳
         wins = self.judge_moves()
         for pid, win in wins.items():
-            if win and self.players[pid]["is_alive"]:
-                self.players[pid]["wins"] += 1
+            if win and self.players[pid].is_alive:
+                self.players[pid].wins += 1
                 results["wins"][pid] = True
-                results["effects"].append(f"玩家 {self.players[pid]['username']} 猜拳获胜，获得1胜局")
+                results["effects"].append(f"玩家 {self.players[pid].username} 猜拳获胜，获得1胜局")
 
         # BOSS战：胜局同步
         if self.mode == "boss" and self.boss_id:
-            max_wins = max(p["wins"] for pid, p in self.players.items() if pid != self.boss_id)
-            self.players[self.boss_id]["wins"] = max_wins
+            max_wins = max(p.wins for pid, p in self.players.items() if pid != self.boss_id)
+            self.players[self.boss_id].wins = max_wins
 
         # 随机事件
         if self.current_round % 3 == 0:
@@ -266,18 +284,20 @@ class GameEngine:
             results["winner"] = self.winner
 
         self.moves = {}
+        results["damage_dealt"] = self.round_stats["damage_dealt"]
+        results["evasions"] = self.round_stats["evasions"]
+        self.round_stats = {"damage_dealt": {}, "evasions": {}}
+        results["players"] = self.get_public_players()
         return results
 
     def process_skill_phase(self) -> Dict:
         results = {
             "effects": [],
-            "damages": [],
-            "players": [
-                {"player_id": pid, **player_data}
-                for pid, player_data in self.players.items()
-            ]
+            "damages": []
         }
-        logging.debug(f"处理技能阶段")
+        log.debug("处理技能阶段", round=self.current_round)
+        self._record(["skill_phase"])
+        self.mark_dirty()
 
         # 更新状态
         self.update_states_and_cooldowns(results)
@@ -289,25 +309,24 @@ class GameEngine:
             results["game_over"] = True
             results["winner"] = self.winner
 
+        results["players"] = self.get_public_players()
         return results
 
     def settle_damage(self) -> Dict:
         results = {
             "effects": [],
-            "damages": [],
-            "players": [
-                {"player_id": pid, **player_data}
-                for pid, player_data in self.players.items()
-            ]
+            "damages": []
         }
-        logging.debug(f"处理伤害结算")
+        log.debug("处理伤害结算", round=self.current_round)
+        self._record(["settle"])
+        self.mark_dirty()
 
         # 处理技能
-        game_state = self.get_public_state()
+        game_state = self.get_skill_state()
         for pid in self.players:
-            if not self.players[pid]["is_alive"]:
+            if not self.players[pid].is_alive:
                 continue
-            for skill in self.players[pid]["pending_skills"]:
+            for skill in self.players[pid].pending_skills:
                 skill_result = self.skills.execute_skill(
                     skill["skill_name"],
                     pid,
@@ -318,8 +337,8 @@ class GameEngine:
                 if skill_result["success"]:
                     results["effects"].extend(skill_result.get("effects", []))
                 else:
-                    results["effects"].append(f"{self.players[pid]['username']} 使用 {skill['skill_name']} 失败: {skill_result['message']}")
-            self.players[pid]["pending_skills"] = []
+                    results["effects"].append(f"{self.players[pid].username} 使用 {skill['skill_name']} 失败: {skill_result['message']}")
+            self.players[pid].pending_skills = []
 
         # 更新冷却和buff
         self.skills.update_cooldowns(game_state)
@@ -331,195 +350,354 @@ class GameEngine:
             results["game_over"] = True
             results["winner"] = self.winner
 
+        results["players"] = self.get_public_players()
         return results
 
     def judge_moves(self) -> Dict[str, bool]:
         wins = {pid: False for pid in self.players}
-        move_counts = {"石头": 0, "剪刀": 0, "布": 0}
+        move_counts = [0, 0, 0]
         for pid, move in self.moves.items():
-            if self.players[pid]["is_alive"]:
+            if self.players[pid].is_alive:
                 move_counts[move] += 1
 
         if len(set(self.moves.values())) == 1:
             return wins
 
         for pid in self.players:
-            if not self.players[pid]["is_alive"] or (self.mode == "boss" and pid == self.boss_id):
+            if not self.players[pid].is_alive or (self.mode == "boss" and pid == self.boss_id):
                 continue
             move = self.moves[pid]
-            if move == "石头" and move_counts["剪刀"] > 0 and move_counts["布"] == 0:
+            if move == Move.ROCK and move_counts[Move.SCISSORS] > 0 and move_counts[Move.PAPER] == 0:
                 wins[pid] = True
-            elif move == "布" and move_counts["石头"] > 0 and move_counts["剪刀"] == 0:
+            elif move == Move.PAPER and move_counts[Move.ROCK] > 0 and move_counts[Move.SCISSORS] == 0:
                 wins[pid] = True
-            elif move == "剪刀" and move_counts["布"] > 0 and move_counts["石头"] == 0:
+            elif move == Move.SCISSORS and move_counts[Move.PAPER] > 0 and move_counts[Move.ROCK] == 0:
                 wins[pid] = True
         return wins
 
     def apply_damage(self, player_id: str, damage: float, results: Dict, ignore_defense: bool = False, source: str = None):
         player = self.players[player_id]
-        if not player["is_alive"] or player.get("states", {}).get("invincible", 0) > 0:
+        if not player.is_alive or player.states.get("invincible", 0) > 0:
             return
 
         reduction = 0 if ignore_defense else self.get_player_buff(player_id, "damage_reduction")
         final_damage = max(0, damage - reduction)
-        player["hp"] = max(0, player["hp"] - final_damage)
-        results["damages"].append(f"{player['username']} 受到 {final_damage} 伤害，剩余 {player['hp']} 血")
+        player.hp = max(0, player.hp - final_damage)
+        results["damages"].append(f"{player.username} 受到 {final_damage} 伤害，剩余 {player.hp} 血")
 
-        if player["hp"] <= 0 and player["is_alive"]:
+        if player.hp <= 0 and player.is_alive:
             self.handle_death(player_id, results, source)
 
     def apply_heal(self, player_id: str, heal: float, results: Dict):
         player = self.players[player_id]
-        if not player["is_alive"]:
+        if not player.is_alive:
             return
         heal_amount = heal * self.get_player_buff(player_id, "heal_multiplier")
-        player["hp"] = min(player["hp"] + heal_amount, player["max_hp"])
-        results["effects"].append(f"{player['username']} 恢复 {heal_amount} 血，当前 {player['hp']}")
+        player.hp = min(player.hp + heal_amount, player.max_hp)
+        results["effects"].append(f"{player.username} 恢复 {heal_amount} 血，当前 {player.hp}")
 
     def handle_death(self, player_id: str, results: Dict, source: str = None):
         player = self.players[player_id]
         if self.mode == "boss" and source is not None and source == self.boss_id:
-            player["hp"] = 15
-            player["puppet_master"] = self.boss_id
-            results["effects"].append(f"{player['username']} 成为BOSS傀儡")
-        elif player["character"] == "幽灵" and not player["states"].get("ghost_mode"):
-            player["states"]["ghost_mode"] = True
-            player["ghost_hits"] = player["states"].get("ghost_hits", 3)
-            player["revive_timer"] = player["states"].get("revive_time", 3)
-            results["effects"].append(f"{player['username']} 进入幽灵状态")
-        elif self.mode == "infinite" and player["revive_count"] < 3:
-            player["revive_count"] += 1
-            player["revive_timer"] = 2
-            results["effects"].append(f"{player['username']} 将在2回合后复活")
+            player.hp = 15
+            player.puppet_master = self.boss_id
+            results["effects"].append(f"{player.username} 成为BOSS傀儡")
+        elif player.character == "幽灵" and not player.states.get("ghost_mode"):
+            player.states["ghost_mode"] = True
+            player.ghost_hits = player.states.get("ghost_hits", 3)
+            player.revive_timer = player.states.get("revive_time", 3)
+            results["effects"].append(f"{player.username} 进入幽灵状态")
+        elif self.mode == "infinite" and player.revive_count < 3:
+            player.revive_count += 1
+            player.revive_timer = 2
+            results["effects"].append(f"{player.username} 将在2回合后复活")
         else:
-            player["is_alive"] = False
-            results["effects"].append(f"{player['username']} 已死亡")
+            player.is_alive = False
+            results["effects"].append(f"{player.username} 已死亡")
 
     def update_states_and_cooldowns(self, results: Dict):
         for pid, player in self.players.items():
-            if not player["is_alive"]:
+            if not player.is_alive:
                 continue
-            for skill, cd in list(player["skill_cooldowns"].items()):
-                player["skill_cooldowns"][skill] = max(0, cd - 1)
-                if player["skill_cooldowns"][skill] == 0:
-                    del player["skill_cooldowns"][skill]
-            for buff in player["buffs"][:]:
+            for skill, cd in list(player.skill_cooldowns.items()):
+                player.skill_cooldowns[skill] = max(0, cd - 1)
+                if player.skill_cooldowns[skill] == 0:
+                    del player.skill_cooldowns[skill]
+            for buff in player.buffs[:]:
                 buff["duration"] -= 1 if buff["duration"] > 0 else 0
                 if buff["duration"] == 0:
-                    player["buffs"].remove(buff)
-            for debuff in player["debuffs"][:]:
+                    player.buffs.remove(buff)
+            for debuff in player.debuffs[:]:
                 debuff["duration"] -= 1 if debuff["duration"] > 0 else 0
                 if debuff["duration"] == 0:
-                    player["debuffs"].remove(debuff)
-            if player["states"].get("invincible", 0) > 0:
-                player["states"]["invincible"] -= 1
-            if player["states"].get("stealth", 0) > 0:
-                player["states"]["stealth"] -= 1
-            if player["states"].get("ghost_mode"):
-                player["revive_timer"] -= 1
-                if player["revive_timer"] <= 0:
-                    player["hp"] = player["states"].get("revive_hp", player["max_hp"] // 2)
-                    player["is_alive"] = True
-                    player["states"]["ghost_mode"] = False
-                    player["available_skills"].append(player["states"].get("revive_skill", "复仇"))
-                    results["effects"].append(f"{player['username']} 复活")
-            if player["revive_timer"] > 0:
-                player["revive_timer"] -= 1
-                if player["revive_timer"] == 0 and player["revive_count"] < 3:
-                    player["hp"] = player["max_hp"]
-                    player["is_alive"] = True
-                    player["character"] = None
-                    player["style"] = None
-                    player["available_skills"] = []
-                    results["effects"].append(f"{player['username']} 复活，需重新选择角色")
+                    player.debuffs.remove(debuff)
+            if player.states.get("invincible", 0) > 0:
+                player.states["invincible"] -= 1
+            if player.states.get("stealth", 0) > 0:
+                player.states["stealth"] -= 1
+            if player.states.get("ghost_mode"):
+                player.revive_timer -= 1
+                if player.revive_timer <= 0:
+                    player.hp = player.states.get("revive_hp", player.max_hp // 2)
+                    player.is_alive = True
+                    player.states["ghost_mode"] = False
+                    player.available_skills.append(player.states.get("revive_skill", "复仇"))
+                    results["effects"].append(f"{player.username} 复活")
+            if player.revive_timer > 0:
+                player.revive_timer -= 1
+                if player.revive_timer == 0 and player.revive_count < 3:
+                    player.hp = player.max_hp
+                    player.is_alive = True
+                    player.character = None
+                    player.style = None
+                    player.available_skills = []
+                    results["effects"].append(f"{player.username} 复活，需重新选择角色")
 
     def apply_round_passives(self):
         for pid, player in self.players.items():
-            if not player["is_alive"]:
+            if not player.is_alive:
                 continue
-            if player["character"] == "幸运儿" and self.current_round % player["states"].get("win_interval", 3) == 0:
-                player["wins"] += 1
-            elif player["character"] == "记录员" and self.current_round % player["states"].get("auto_save_cd", 3) == 0:
-                player["pending_skills"].append({"skill_name": "将军饮马", "targets": [pid], "params": {}})
+            if player.character == "幸运儿" and self.current_round % player.states.get("win_interval", 3) == 0:
+                player.wins += 1
+            elif player.character == "记录员" and self.current_round % player.states.get("auto_save_cd", 3) == 0:
+                player.pending_skills.append({"skill_name": "将军饮马", "targets": [pid], "params": {}})
 
     def process_tasks(self, results: Dict):
         for pid, player in self.players.items():
-            for task in player["tasks"]:
+            for task in player.tasks:
                 if task["name"] == "输出流" and task["progress"] >= 15:
-                    player["wins"] += 1
-                    results["tasks"].append(f"{player['username']} 完成输出流任务，获1胜局")
-                    player["tasks"].remove(task)
+                    player.wins += 1
+                    results["tasks"].append(f"{player.username} 完成输出流任务，获1胜局")
+                    player.tasks.remove(task)
 
     def trigger_random_event(self, results: Dict):
-        event = random.choice(["全场血量+2", "禁用控制技能1回合"])
+        event = self.rng.choice(["全场血量+2", "禁用控制技能1回合"])
         if event == "全场血量+2":
             for pid, player in self.players.items():
-                if player["is_alive"]:
+                if player.is_alive:
                     self.apply_heal(pid, 2, results)
         elif event == "禁用控制技能1回合":
             for pid, player in self.players.items():
-                for skill in player["available_skills"]:
-                    if self.skills.get_skill(skill).get("effect_type") == "control":
-                        player["skill_cooldowns"][skill] = 1
+                for skill in player.available_skills:
+                    if self.catalog.is_control_skill(skill):
+                        player.skill_cooldowns[skill] = 1
         results["effects"].append(f"随机事件: {event}")
 
     def get_player_buff(self, player_id: str, buff_type: str) -> float:
+        # 总和由 BuffList 在增删时维护
         player = self.players[player_id]
-        value = 0
-        for buff in player["buffs"]:
-            if buff_type in buff["effect_data"]:
-                value += buff["effect_data"][buff_type]
-        for debuff in player["debuffs"]:
-            if buff_type in debuff["effect_data"]:
-                value -= debuff["effect_data"][buff_type]
-        return value
+        return player.buffs.total(buff_type) - player.debuffs.total(buff_type)
+
+    def is_control_skill(self, skill_name: str) -> bool:
+        return self.catalog.is_control_skill(skill_name)
 
     def has_wins(self) -> bool:
-        return any(p["wins"] > 0 for p in self.players.values())
+        return any(p.wins > 0 for p in self.players.values())
 
     def all_players_ready(self) -> bool:
         return len(self.ready_players) == len(self.players)
 
     def all_moves_submitted(self) -> bool:
-        return all(pid in self.moves or not self.players[pid]["is_alive"] or (self.mode == "boss" and pid == self.boss_id) for pid in self.players)
+        return all(pid in self.moves or not self.players[pid].is_alive or (self.mode == "boss" and pid == self.boss_id) for pid in self.players)
 
     def all_skills_submitted(self) -> bool:
-        return all(p["wins"] == 0 or not p["is_alive"] for p in self.players.values())
+        return all(p.wins == 0 or not p.is_alive for p in self.players.values())
 
     def check_game_over(self):
-        alive_players = [pid for pid in self.players if self.players[pid]["is_alive"]]
+        alive_players = [pid for pid in self.players if self.players[pid].is_alive]
         if len(alive_players) <= 1:
             self.game_over = True
-            self.winner = self.players[alive_players[0]]["username"] if alive_players else None
+            self.winner = self.players[alive_players[0]].username if alive_players else None
             return
         for pid, player in self.players.items():
-            if player["wins"] >= self.MAX_WINS:
+            if player.wins >= self.MAX_WINS:
                 self.game_over = True
-                self.winner = player["username"]
+                self.winner = player.username
                 break
 
     def get_game_result(self) -> Dict:
         return {"winner": self.winner or "无"}
 
-    def get_public_state(self) -> Dict:
+    def get_skill_state(self) -> Dict:
+        # 交给 SkillSystem 的可变状态：直接引用引擎内的 PlayerState，player_index 即 self.players，始终与引擎同步
         return {
             "round": self.current_round,
             "mode": self.mode,
+            "players": list(self.players.values()),
+            "player_index": self.players,
+            "rng": self.rng,
+            "stats": self.round_stats,
+        }
+
+    def remove_player(self, player_id: str):
+        # 玩家中途离开：视为死亡
+        self._record(["leave", player_id])
+        if player_id in self.players:
+            self.players[player_id].is_alive = False
+            self.mark_dirty()
+
+    def rename_player(self, old_id: str, new_id: str):
+        # 断线重连后玩家换了 socket id：把对局内所有对该玩家的引用改为新 id
+        self._record(["rename", old_id, new_id])
+        if old_id not in self.players or new_id in self.players:
+            return
+        rename = lambda pid: new_id if pid == old_id else pid
+        self.players = {rename(pid): p for pid, p in self.players.items()}
+        self.moves = {rename(pid): m for pid, m in self.moves.items()}
+        self.ready_players = {rename(pid) for pid in self.ready_players}
+        self.boss_id = rename(self.boss_id)
+        for key, stats in self.round_stats.items():
+            self.round_stats[key] = {rename(pid): value for pid, value in stats.items()}
+        for player in self.players.values():
+            player.player_id = rename(player.player_id)
+            player.puppet_master = rename(player.puppet_master)
+            for skill in player.pending_skills:
+                skill["targets"] = [rename(t) for t in skill["targets"]]
+            for charge in player.charge_skills.values():
+                charge["target_ids"] = [rename(t) for t in charge.get("target_ids", [])]
+        self.players[new_id].socket_id = new_id
+        self.mark_dirty()
+
+    def bind_player(self, player_id: str, socket_id: str, username: str):
+        # 开局时绑定连接和用户名。只影响显示，不作为输入录制
+        player = self.players.get(player_id)
+        if player:
+            player.socket_id = socket_id
+            player.username = username
+            self.mark_dirty()
+
+    # 任务奖励：对局结束时由服务器发放，同样作为输入录制
+    def grant_win(self, player_id: str, count: int = 1):
+        self._record(["grant_win", player_id, count])
+        if player_id in self.players:
+            self.players[player_id].wins += count
+            self.mark_dirty()
+
+    def adjust_hp(self, player_id: str, amount: float):
+        self._record(["adjust_hp", player_id, amount])
+        player = self.players.get(player_id)
+        if player and player.is_alive:
+            player.hp = max(0, min(player.max_hp, player.hp + amount))
+            self.mark_dirty()
+
+    def unlock_temp_skill(self, player_id: str, skill_name: str):
+        self._record(["unlock_skill", player_id, skill_name])
+        player = self.players.get(player_id)
+        if player and skill_name not in player.available_skills:
+            player.available_skills.append(intern_name(skill_name))
+            self.mark_dirty()
+
+    def grant_block(self, player_id: str, count: int = 1):
+        # 格挡即一次规避，下一次非真实伤害被抵消
+        self._record(["grant_block", player_id, count])
+        if player_id in self.players:
+            self.players[player_id].evasion += count
+            self.mark_dirty()
+
+    def has_pending_skills(self) -> bool:
+        return any(p.pending_skills for p in self.players.values())
+
+    def _record(self, entry: List):
+        self.inputs.append(entry)
+        if self.journal is not None:
+            self.journal.append(entry)
+
+    def snapshot(self) -> Dict:
+        # 引擎完整状态（含随机数发生器状态），可 JSON 序列化，用于崩溃恢复。
+        # 不含输入历史，只记录已处理的输入条数，恢复时从日志中接着重放
+        version, internal, gauss = self.rng.getstate()
+        return {
+            "seed": self.seed,
+            "mode": self.mode,
+            "player_ids": list(self.player_ids),
+            "input_count": self.input_base + len(self.inputs),
+            "rng": [version, list(internal), gauss],
+            "current_round": self.current_round,
+            "moves": dict(self.moves),
+            "ready_players": list(self.ready_players),
+            "game_over": self.game_over,
+            "winner": self.winner,
             "boss_id": self.boss_id,
-            "players": [
-                {
-                    "player_id": pid,
-                    "socket_id": p["socket_id"],
-                    "username": p["username"],
-                    "hp": p["hp"],
-                    "max_hp": p["max_hp"],
-                    "wins": p["wins"],
-                    "character": p["character"],
-                    "style": p["style"],
-                    "available_skills": p["available_skills"],
-                    "is_alive": p["is_alive"],
-                    "puppet_master": p["puppet_master"],
-                    "buffs": [b["name"] for b in p["buffs"]]
-                } for pid, p in self.players.items()
-            ]
-        }
\ No newline at end of file
+            "players": [asdict(p) for p in self.players.values()],
+            "round_stats": self.round_stats,
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict) -> "GameEngine":
+        engine = cls(snapshot["player_ids"], mode=snapshot["mode"], seed=snapshot["seed"])
+        engine.input_base = snapshot["input_count"]
+        version, internal, gauss = snapshot["rng"]
+        engine.rng.setstate((version, tuple(internal), gauss))
+        engine.current_round = snapshot["current_round"]
+        engine.moves = {pid: Move(move) for pid, move in snapshot["moves"].items()}
+        engine.ready_players = set(snapshot["ready_players"])
+        engine.game_over = snapshot["game_over"]
+        engine.winner = snapshot["winner"]
+        engine.boss_id = snapshot["boss_id"]
+        engine.players = {p["player_id"]: PlayerState(**p) for p in snapshot["players"]}
+        engine.round_stats = snapshot.get("round_stats") or {"damage_dealt": {}, "evasions": {}}
+        return engine
+
+    def export_record(self) -> Dict:
+        # 可 JSON 序列化的对局录像：种子、初始玩家和全部输入
+        if self.input_base:
+            raise ValueError("从快照恢复的对局缺少快照之前的输入，无法导出录像")
+        return {"seed": self.seed, "mode": self.mode, "players": list(self.player_ids), "inputs": [list(i) for i in self.inputs]}
+
+    @classmethod
+    def from_record(cls, record: Dict) -> "GameEngine":
+        engine = cls(record["players"], mode=record["mode"], seed=record["seed"])
+        for entry in record["inputs"]:
+            engine.apply_input(entry)
+        return engine
+
+    def apply_input(self, entry: List):
+        return getattr(self, INPUT_METHODS[entry[0]])(*entry[1:])
+
+    def mark_dirty(self):
+        # 每个修改状态的引擎方法都会调用；引擎外应通过这些方法修改 PlayerState，而不是直接赋值后手动调用
+        self.state_version += 1
+
+    def _projection_cache(self) -> Dict:
+        if self._projection_version != self.state_version:
+            self._projections = {}
+            self._projection_version = self.state_version
+        return self._projections
+
+    def get_public_players(self) -> List[Dict]:
+        # 返回的投影在同一版本内共享，调用方不得修改
+        cache = self._projection_cache()
+        players = cache.get("players")
+        if players is None:
+            players = cache["players"] = [p.to_public() for p in self.players.values()]
+        return players
+
+    def get_public_state(self, viewer_id: Optional[str] = None) -> Dict:
+        # viewer_id 为空时是全员可见的状态；指定玩家时额外包含该玩家自己的出拳和待结算技能
+        if viewer_id not in self.players:
+            viewer_id = None
+        cache = self._projection_cache()
+        key = ("state", viewer_id)
+        state = cache.get(key)
+        if state is not None:
+            return state
+
+        if viewer_id is None:
+            state = {
+                "round": self.current_round,
+                "mode": self.mode,
+                "boss_id": self.boss_id,
+                "players": self.get_public_players()
+            }
+        else:
+            base = self.get_public_state()
+            viewer = self.players[viewer_id]
+            move = self.moves.get(viewer_id)
+            private = {
+                "pending_move": MOVE_LABELS[move] if move is not None else None,
+                "pending_skills": [s["skill_name"] for s in viewer.pending_skills]
+            }
+            players = [{**p, **private} if p["player_id"] == viewer_id else p for p in base["players"]]
+            state = {**base, "players": players}
+        cache[key] = state
+        return state
\ No newline at end of file
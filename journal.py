@@ -0,0 +1,246 @@
+import os
+import glob
+import json
+import time
+import threading
+from typing import Callable, Dict, List, Any, Optional, Tuple
+from game_logic import GameEngine
+from eventlog import get_logger
+
+log = get_logger("journal")
+
+JOURNAL_DIR = os.environ.get("TEN_STEPS_JOURNAL_DIR", "journal")
+SYNC_EVERY = 32
+SYNC_INTERVAL = 0.2
+SNAPSHOT_EVERY_ROUNDS = 10
+
+class GameJournal:
+    # 每局一个只追加日志：首行为对局元数据，之后每行一条输入（in）或回合结果（out）。
+    # 每次写入都 flush 到操作系统，进程崩溃不丢数据；fsync 按条数/时间批量进行，
+    # 安静的对局由服务器的后台任务定期调用 sync_due() 补上。配置了 executor 时输入先排队，
+    # 最多晚 SYNC_INTERVAL 写出，与 fsync 的时间窗口相同。
+    # 写快照后日志换成只含元数据的新文件，元数据的 base 记录此前已处理的输入条数
+    def __init__(self, directory: str, game_id: str, sync_every: int = SYNC_EVERY, sync_interval: float = SYNC_INTERVAL,
+                 meta: Optional[Dict] = None, executor: Optional[Callable[..., Any]] = None):
+        os.makedirs(directory, exist_ok=True)
+        self.game_id = game_id
+        self.log_path = os.path.join(directory, f"{game_id}.log")
+        self.snapshot_path = os.path.join(directory, f"{game_id}.snap")
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.meta = meta
+        # executor(fn, *args)：与数据库共用同一个（见 serve.py），写文件和 fsync 不占用事件循环；为 None 时直接执行
+        self.executor = executor
+        self._file = open(self.log_path, "ab")
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._closed = False
+        # 待执行的文件操作 (fn, args)，fn 为 None 表示追加一行
+        self._ops: List[Tuple[Optional[Callable[..., Any]], Tuple]] = []
+        self._draining = False
+        self._lock = threading.Lock()
+
+    def _submit(self, fn: Optional[Callable[..., Any]], *args):
+        # close() 之后的写入直接丢弃：关闭操作排在队尾，对局已经结束
+        with self._lock:
+            if self._closed:
+                return
+            self._ops.append((fn, args))
+        self._drain()
+
+    def _drain(self):
+        # 同一局的文件操作按提交顺序串行执行：正在等 executor 的协程顺带执行期间排进来的操作，
+        # 其他协程排好队就返回，日志不会乱序，也不会有两个线程同时写同一个文件
+        with self._lock:
+            if self._draining or not self._ops:
+                return
+            self._draining = True
+        try:
+            while True:
+                with self._lock:
+                    ops, self._ops = self._ops, []
+                    if not ops:
+                        self._draining = False
+                        return
+                if self.executor is None:
+                    self._apply(ops)
+                else:
+                    self.executor(self._apply, ops)
+        except BaseException:
+            with self._lock:
+                self._draining = False
+            raise
+
+    def _apply(self, ops: List[Tuple[Optional[Callable[..., Any]], Tuple]]):
+        # 连续的追加合并成一次 write
+        lines = []
+        for fn, args in ops:
+            if fn is None:
+                lines.append(args[0])
+                continue
+            self._write_lines(lines)
+            lines = []
+            fn(*args)
+        self._write_lines(lines)
+
+    def _write_lines(self, lines: List[bytes]):
+        if not lines:
+            return
+        self._file.write(b"".join(lines))
+        self._file.flush()
+        self._pending += len(lines)
+        if self._pending >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+            self._sync()
+
+    def _sync(self):
+        if self._pending and not self._file.closed:
+            os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def _write(self, record: Dict):
+        self._submit(None, _encode(record))
+
+    def _enqueue(self, record: Dict):
+        with self._lock:
+            if self._closed:
+                return
+            self._ops.append((None, (_encode(record),)))
+        if self.executor is None:
+            self._drain()
+
+    def sync(self):
+        self._submit(self._sync)
+
+    def sync_due(self) -> bool:
+        # 写出排队中的输入；有未 fsync 的记录且距上次 fsync 已超过 sync_interval 时补做一次
+        if self._ops:
+            self._drain()
+            return True
+        if self._pending and time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+            return True
+        return False
+
+    def write_meta(self, meta: Dict):
+        self.meta = meta
+        self._write({"meta": meta})
+        self.sync()
+
+    def append(self, entry: List):
+        # 引擎在修改状态的中途调用，这里不能让出事件循环：配置了 executor 时只排队，
+        # 由随后的回合结果、快照或 sync_due() 一起写出
+        self._enqueue({"in": entry})
+
+    def record_result(self, result: Dict):
+        self._write({"out": result})
+
+    def write_snapshot(self, engine: GameEngine):
+        # 快照在事件循环里生成，与已排队的输入一致；落盘和轮换交给 executor
+        snapshot = engine.snapshot()
+        data = json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self._submit(self._write_snapshot, data, snapshot["input_count"])
+
+    def _write_snapshot(self, data: bytes, input_count: int):
+        # 先写临时文件再原子替换，崩溃时旧快照仍然完整。快照落盘后再轮换日志；
+        # 两步之间崩溃时旧日志里的输入都已包含在快照中，恢复时按条数跳过
+        self._sync()
+        _write_atomic(self.snapshot_path, data)
+        if self.meta is not None:
+            self._file.close()
+            _write_atomic(self.log_path, _encode({"meta": dict(self.meta, base=input_count)}))
+            self._file = open(self.log_path, "ab")
+            self._last_sync = time.monotonic()
+
+    def close(self, finished: bool = True):
+        # 正常结束的对局不再需要恢复，删除日志和快照
+        with self._lock:
+            if self._closed:
+                return
+            self._ops.append((self._close, (finished,)))
+            self._closed = True
+        self._drain()
+
+    def _close(self, finished: bool):
+        self._sync()
+        self._file.close()
+        if finished:
+            for path in (self.log_path, self.snapshot_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+def _encode(record: Dict) -> bytes:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+def _write_atomic(path: str, data: bytes):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def _read_log(path: str) -> Tuple[Optional[Dict], List[List], List[Dict]]:
+    with open(path, "rb") as f:
+        data = f.read()
+    # 崩溃时最后一行可能只写了一半：截掉，之后的追加从完整行开始
+    end = data.rfind(b"\n") + 1
+    if end < len(data):
+        with open(path, "r+b") as f:
+            f.truncate(end)
+    meta, inputs, results = None, [], []
+    for line in data[:end].splitlines():
+        record = json.loads(line)
+        if "meta" in record:
+            meta = record["meta"]
+        elif "in" in record:
+            inputs.append(record["in"])
+        elif "out" in record:
+            results.append(record["out"])
+    return meta, inputs, results
+
+def _load_snapshot(path: str) -> Optional[Dict]:
+    try:
+        with open(path, "rb") as f:
+            return json.loads(f.read())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log.error("读取快照失败", path=path, error=e)
+        return None
+
+def recover_games(directory: str = JOURNAL_DIR,
+                  executor: Optional[Callable[..., Any]] = None) -> List[Tuple[Dict, GameEngine, GameJournal]]:
+    # 从快照加日志尾部重建所有未结束的对局
+    recovered = []
+    for log_path in sorted(glob.glob(os.path.join(directory, "*.log"))):
+        game_id = os.path.basename(log_path)[:-len(".log")]
+        try:
+            meta, inputs, results = _read_log(log_path)
+            if meta is None:
+                continue
+            # 日志中第一条输入在整局中的序号；快照覆盖了前 input_count 条
+            base = meta.get("base", 0)
+            snapshot = _load_snapshot(os.path.join(directory, f"{game_id}.snap"))
+            if snapshot is not None and base <= snapshot["input_count"] <= base + len(inputs):
+                engine = GameEngine.from_snapshot(snapshot)
+                tail = inputs[snapshot["input_count"] - base:]
+            elif base == 0:
+                engine = GameEngine(meta["players"], mode=meta["mode"], seed=meta["seed"])
+                tail = inputs
+            else:
+                log.error("日志已轮换但快照缺失或不匹配，无法恢复", game_id=game_id, base=base)
+                continue
+            for entry in tail:
+                engine.apply_input(entry)
+            if results and results[-1].get("round", 0) != engine.current_round:
+                log.warning("恢复后回合与日志记录不一致", game_id=game_id, round=engine.current_round, logged=results[-1].get("round"))
+            journal = GameJournal(directory, game_id, meta=meta, executor=executor)
+            engine.journal = journal
+            recovered.append((meta, engine, journal))
+            log.debug("恢复对局", game_id=game_id, round=engine.current_round, replayed=len(tail))
+        except Exception as e:
+            log.error("恢复对局失败", game_id=game_id, error=e)
+    return recovered
\ No newline at end of file
@@ -0,0 +1,417 @@
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import socket
+import asyncio
+import logging
+import argparse
+import tempfile
+import subprocess
+from collections import Counter, defaultdict
+from typing import Dict, List, Any, Optional, Set
+import socketio
+from catalog import get_catalog
+from player_state import MOVE_LABELS
+from simulator import MODES, STYLE_NAMES, percentile
+
+NAMESPACE = "/game"
+
+class LoadStats:
+    # 按操作汇总往返延迟、失败和超时；服务器主动推送的事件只计数
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self.timeouts: Counter = Counter()
+        self.events: Counter = Counter()
+        self.counters: Counter = Counter()
+
+    def ok(self, name: str, seconds: float):
+        self.latencies[name].append(seconds)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        operations = {}
+        for name in sorted(set(self.latencies) | set(self.errors) | set(self.timeouts)):
+            values = sorted(self.latencies[name])
+            total = len(values) + self.errors[name] + self.timeouts[name]
+            operations[name] = {
+                "count": total,
+                "ok": len(values),
+                "errors": self.errors[name],
+                "timeouts": self.timeouts[name],
+                "error_rate": (total - len(values)) / total if total else 0.0,
+                "p50_ms": percentile(values, 0.50) * 1000,
+                "p90_ms": percentile(values, 0.90) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+                "max_ms": values[-1] * 1000 if values else 0.0,
+            }
+        return {
+            "elapsed": elapsed,
+            "operations": operations,
+            "events": dict(self.events),
+            "counters": dict(self.counters),
+        }
+
+class VirtualUser:
+    # 一个模拟玩家：注册、登录、聊天、开局、选角色、出拳/放技能，直到打完指定局数
+    def __init__(self, index: int, run_id: str, args, stats: LoadStats, stop: asyncio.Event):
+        self.args = args
+        self.stats = stats
+        self.stop = stop
+        self.rng = random.Random(f"{args.seed}:{index}")
+        self.username = f"load_{run_id}_{index}"
+        self.password = "load"
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.sio.on("*", self.on_event, namespace=NAMESPACE)
+        self.player_id: Optional[str] = None
+        self.waiters: List[Dict[str, Any]] = []
+        self.players: Dict[str, Dict] = {}
+        self.version: Optional[int] = None
+        self.boss_id: Optional[str] = None
+        self.game_over = False
+        self.chat_seq = 0
+
+    async def on_event(self, event, data=None):
+        self.stats.events[event] += 1
+        if event == "game_state":
+            self.players = {p["player_id"]: dict(p) for p in data["players"]}
+            self.version = data.get("version")
+            self.boss_id = data.get("boss_id")
+        elif event == "game_state_delta":
+            self.apply_delta(data)
+        elif event == "game_over":
+            self.game_over = True
+        elif event == "use_skill_failed":
+            # 技能成功时服务器不单独回复，只能统计失败
+            self.stats.errors["use_skill"] += 1
+        for waiter in list(self.waiters):
+            if event in waiter["events"] and waiter["match"](event, data or {}) and not waiter["future"].done():
+                waiter["future"].set_result((event, data or {}))
+
+    def apply_delta(self, data: Dict):
+        # 没有字段变化的回合不带增量，版本号不变
+        delta = data.get("delta") or {}
+        if self.version is not None and delta and delta.get("base_version") != self.version:
+            # 增量不连续：与客户端一样请求完整状态
+            self.stats.counters["resync"] += 1
+            self.version = None
+            asyncio.ensure_future(self.sio.emit("request_resync", {}, namespace=NAMESPACE))
+            return
+        for pid, fields in delta.get("players", {}).items():
+            self.players.setdefault(pid, {}).update(fields)
+        self.version = delta.get("version", self.version)
+        if data.get("game_over"):
+            self.game_over = True
+
+    def wait_for(self, events: Set[str], match=None) -> Dict[str, Any]:
+        waiter = {"events": events, "match": match or (lambda event, data: True),
+                  "future": asyncio.get_running_loop().create_future()}
+        self.waiters.append(waiter)
+        return waiter
+
+    async def finish(self, waiter: Dict[str, Any], timeout: float):
+        try:
+            return await asyncio.wait_for(waiter["future"], timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.discard(waiter)
+
+    def discard(self, waiter: Dict[str, Any]):
+        if waiter in self.waiters:
+            self.waiters.remove(waiter)
+
+    async def request(self, name: str, event: str, data: Dict, ok: Set[str], fail: Set[str] = frozenset(),
+                      match=None, timeout: Optional[float] = None) -> Optional[Dict]:
+        # 发送一个事件并等待对应的回复事件，记录往返延迟；先登记等待再发送，避免回复先到
+        waiter = self.wait_for(set(ok) | set(fail), match)
+        start = time.perf_counter()
+        await self.sio.emit(event, data, namespace=NAMESPACE)
+        reply = await self.finish(waiter, timeout or self.args.timeout)
+        if reply is None:
+            self.stats.timeouts[name] += 1
+            return None
+        if reply[0] in fail:
+            self.stats.errors[name] += 1
+            logging.debug(f"{self.username} {name} 失败: {reply[1].get('message')}")
+            return None
+        self.stats.ok(name, time.perf_counter() - start)
+        return reply[1]
+
+    async def connect(self, url: str) -> bool:
+        start = time.perf_counter()
+        try:
+            await self.sio.connect(url, namespaces=[NAMESPACE], transports=self.args.transports,
+                                   wait_timeout=self.args.timeout)
+        except Exception as e:
+            self.stats.errors["connect"] += 1
+            logging.debug(f"{self.username} 连接失败: {str(e)}")
+            return False
+        self.stats.ok("connect", time.perf_counter() - start)
+        return True
+
+    async def login(self, credentials: Dict) -> Optional[Dict]:
+        reply = await self.request("login", "login", credentials, {"login_success", "login_redirect"}, {"login_failed"})
+        if reply is None or "url" not in reply:
+            return reply
+        # 多进程部署：改连玩家归属的工作进程后凭令牌登录
+        self.stats.counters["redirects"] += 1
+        await self.sio.disconnect()
+        if not await self.connect(reply["url"]):
+            return None
+        return await self.request("login", "login", {"username": self.username, "token": reply["token"]},
+                                  {"login_success"}, {"login_failed"})
+
+    async def run(self):
+        if not await self.connect(self.args.url):
+            return
+        chat_task = None
+        try:
+            credentials = {"username": self.username, "password": self.password}
+            if await self.request("register", "register", credentials, {"register_success"}, {"register_failed"}) is None:
+                return
+            # 登录成功和开局可能紧挨着到达，先登记开局等待
+            game_start = self.wait_for({"game_start"})
+            reply = await self.login(credentials)
+            if reply is None:
+                self.discard(game_start)
+                return
+            self.player_id = reply["player_id"]
+            if self.args.chat_interval > 0:
+                chat_task = asyncio.ensure_future(self.chat_loop())
+            games = 0
+            while games < self.args.games and not self.stop.is_set():
+                # 登录时已进入普通模式队列；换模式或打完一局后重新排队。凑满一桌时回复的是 game_start
+                lobby_since = time.perf_counter()
+                if games or self.args.mode != "standard":
+                    await self.request("join_queue", "join_queue", {"mode": self.args.mode},
+                                       {"queue_status", "game_start"}, {"join_queue_failed"})
+                started = await self.finish(game_start, self.args.match_timeout)
+                if started is None:
+                    self.stats.timeouts["matchmaking"] += 1
+                    break
+                self.stats.ok("matchmaking", time.perf_counter() - lobby_since)
+                self.stats.counters["games_started"] += 1
+                await self.play_game(started[1])
+                games += 1
+                game_start = self.wait_for({"game_start"})
+            self.discard(game_start)
+        except Exception as e:
+            self.stats.errors["session"] += 1
+            logging.debug(f"{self.username} 会话异常: {str(e)}")
+        finally:
+            if chat_task:
+                chat_task.cancel()
+            await self.sio.disconnect()
+
+    async def chat_loop(self):
+        while not self.stop.is_set():
+            await asyncio.sleep(self.rng.expovariate(1.0 / self.args.chat_interval))
+            self.chat_seq += 1
+            message = f"{self.username}#{self.chat_seq}"
+            try:
+                await self.request("send_chat", "send_chat", {"username": self.username, "message": message},
+                                   {"receive_chat"}, {"chat_error"}, match=lambda event, data: event != "receive_chat" or data.get("message") == message)
+            except socketio.exceptions.SocketIOError:
+                # 连接已被服务器断开，由会话主流程统计
+                return
+
+    async def play_game(self, start_data: Dict):
+        self.game_over = False
+        self.version = None
+        self.players = {p["player_id"]: dict(p) for p in start_data.get("players", [])}
+        game_id = start_data["game_id"]
+        catalog = get_catalog()
+        selected = []
+        if start_data.get("mode") == "infinite":
+            selected = self.rng.sample([name for name in catalog.skill_names if not name.startswith("BOSS_")], 5)
+        # 全员选完角色后服务器下发完整状态；先登记等待
+        ready = self.wait_for({"game_state", "game_over"})
+        reply = await self.request("select_character", "select_character", {
+            "player_id": self.player_id,
+            "game_id": game_id,
+            "username": self.username,
+            "character_name": self.rng.choice(catalog.character_names),
+            "style": self.rng.choice(STYLE_NAMES),
+            "selected_skills": selected,
+        }, {"character_selected"}, {"select_character_failed"},
+            match=lambda event, data: event != "character_selected" or data.get("player_id") == self.player_id)
+        if reply is None or await self.finish(ready, self.args.round_timeout) is None:
+            self.stats.counters["games_abandoned"] += 1
+            return
+
+        while not self.game_over and not self.stop.is_set():
+            me = self.players.get(self.player_id, {})
+            if not me.get("is_alive", True) or self.player_id == self.boss_id:
+                # 出局或 BOSS：只等待回合结算
+                waiter = self.wait_for({"game_state_delta", "game_over"})
+                if await self.finish(waiter, self.args.round_timeout) is None:
+                    self.stats.timeouts["spectate"] += 1
+                    break
+                continue
+            if me.get("wins", 0) > 0 and self.rng.random() < self.args.skill_chance:
+                await self.use_skill(me)
+            await asyncio.sleep(self.rng.uniform(0, self.args.think_time))
+            if self.rng.random() < self.args.idle_chance:
+                # 挂机：本回合不出拳，等服务器在回合时限到达后代为结算
+                self.stats.counters["idle_rounds"] += 1
+                waiter = self.wait_for({"game_state_delta", "game_over"})
+                start = time.perf_counter()
+                if await self.finish(waiter, self.args.round_timeout) is None:
+                    self.stats.timeouts["idle_round"] += 1
+                    break
+                self.stats.ok("idle_round", time.perf_counter() - start)
+                continue
+            reply = await self.request("submit_move", "submit_move", {"player_id": self.player_id, "move": self.rng.choice(MOVE_LABELS)},
+                                       {"game_state_delta", "game_over"}, {"submit_move_failed"}, timeout=self.args.round_timeout)
+            if reply is None:
+                break
+        if self.game_over:
+            self.stats.counters["games_finished"] += 1
+        else:
+            self.stats.counters["games_abandoned"] += 1
+
+    async def use_skill(self, me: Dict):
+        catalog = get_catalog()
+        usable = [name for name in me.get("available_skills", [])
+                  if catalog.get_skill(name) and "target_type" in catalog.get_skill(name)
+                  and me.get("skill_cooldowns", {}).get(name, 0) <= 0]
+        if not usable:
+            return
+        name = self.rng.choice(usable)
+        alive = [pid for pid, p in self.players.items() if p.get("is_alive", True)]
+        enemies = [pid for pid in alive if pid != self.player_id]
+        target_type = catalog.get_skill(name)["target_type"]
+        if target_type == "self" or not enemies:
+            targets = [self.player_id]
+        elif target_type in ("all_others", "all_players_except_self"):
+            targets = enemies
+        else:
+            targets = [self.rng.choice(enemies)]
+        self.stats.counters["skills_sent"] += 1
+        await self.sio.emit("use_skill", {"player_id": self.player_id, "skill_name": name, "targets": targets, "params": {}},
+                            namespace=NAMESPACE)
+
+def start_local_server(port: int, workdir: str, async_mode: str, workers: int = 1) -> subprocess.Popen:
+    # 用 serve.py 启动，数据库和对局日志放到临时目录，只输出警告以上的日志。
+    # 多进程时工作进程监听 port 到 port+workers-1，消息中转用 port+workers
+    env = dict(os.environ, TEN_STEPS_DB=os.path.join(workdir, "load.db"),
+               TEN_STEPS_JOURNAL_DIR=os.path.join(workdir, "journal"), TEN_STEPS_LOG_LEVEL="WARNING")
+    command = [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port), "--async-mode", async_mode,
+               "--workers", str(workers), "--broker", f"127.0.0.1:{port + workers}"]
+    process = subprocess.Popen(command, env=env,
+                               cwd=os.path.dirname(os.path.abspath(__file__)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    pending = [port + i for i in range(workers)]
+    deadline = time.monotonic() + 15 + 5 * workers
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"服务器启动失败，退出码 {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", pending[0]), timeout=0.2):
+                pending.pop(0)
+            if not pending:
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("等待服务器启动超时")
+
+async def run_load(args) -> Dict[str, Any]:
+    stats = LoadStats()
+    stop = asyncio.Event()
+    run_id = uuid.uuid4().hex[:8]
+    slots = asyncio.Semaphore(args.concurrency)
+    # 前 concurrency 个用户在 ramp 秒内均匀上线，之后每有用户离开就补上一个
+    interval = args.ramp / args.concurrency if args.concurrency else 0.0
+
+    async def session(index: int):
+        async with slots:
+            if stop.is_set():
+                return
+            await VirtualUser(index, run_id, args, stats, stop).run()
+
+    async def launch():
+        tasks = []
+        for index in range(args.users):
+            tasks.append(asyncio.ensure_future(session(index)))
+            if index < args.concurrency and interval:
+                await asyncio.sleep(interval)
+        await asyncio.gather(*tasks)
+
+    start = time.perf_counter()
+    runner = asyncio.ensure_future(launch())
+    try:
+        await asyncio.wait_for(asyncio.shield(runner), args.duration or None)
+    except asyncio.TimeoutError:
+        # 到达时长上限：通知所有用户收尾，给在途请求留出超时时间
+        stop.set()
+        try:
+            await asyncio.wait_for(runner, args.timeout + args.round_timeout)
+        except asyncio.TimeoutError:
+            stats.counters["killed_sessions"] += 1
+    return stats.report(time.perf_counter() - start)
+
+def print_report(report: Dict[str, Any]):
+    counters = report["counters"]
+    print(f"耗时 {report['elapsed']:.1f}s, 开局 {counters.get('games_started', 0)}, 完成 {counters.get('games_finished', 0)}, "
+          f"中断 {counters.get('games_abandoned', 0)}, 重新同步 {counters.get('resync', 0)}, "
+          f"登录重定向 {counters.get('redirects', 0)}")
+    print(f"  {'操作':<18}{'次数':>8}{'错误率':>9}{'超时':>7}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}")
+    for name, row in report["operations"].items():
+        print(f"  {name:<20}{row['count']:>8}{row['error_rate']:>10.2%}{row['timeouts']:>8}"
+              f"{row['p50_ms']:>8.1f}ms{row['p90_ms']:>8.1f}ms{row['p99_ms']:>8.1f}ms{row['max_ms']:>8.1f}ms")
+    events = ", ".join(f"{name} {count}" for name, count in sorted(report["events"].items(), key=lambda kv: -kv[1]))
+    print(f"  收到事件: {events}")
+
+def main():
+    parser = argparse.ArgumentParser(description="十步拳服务器压力测试（socketio.AsyncClient）")
+    parser.add_argument("--url", default=None, help="服务器地址，默认本地启动一个服务器")
+    parser.add_argument("--port", type=int, default=5055, help="本地启动服务器时使用的端口")
+    parser.add_argument("--server-mode", choices=("eventlet", "gevent", "threading"), default="eventlet",
+                        help="本地启动服务器时的异步模式")
+    parser.add_argument("--server-workers", type=int, default=1, help="本地启动服务器时的工作进程数")
+    parser.add_argument("--users", type=int, default=200, help="模拟用户总数")
+    parser.add_argument("--concurrency", type=int, default=100, help="同时在线的用户数")
+    parser.add_argument("--ramp", type=float, default=5.0, help="首批用户上线所用秒数")
+    parser.add_argument("--games", type=int, default=1, help="每个用户打的局数")
+    parser.add_argument("--mode", choices=MODES, default="standard", help="排队的游戏模式")
+    parser.add_argument("--duration", type=float, default=0, help="总时长上限（秒），0 为不限")
+    parser.add_argument("--chat-interval", type=float, default=5.0, help="平均聊天间隔（秒），0 为不聊天")
+    parser.add_argument("--skill-chance", type=float, default=0.3, help="有胜局时使用技能的概率")
+    parser.add_argument("--idle-chance", type=float, default=0.0,
+                        help="每回合挂机不出拳的概率，用于检验服务器的回合时限（TEN_STEPS_ROUND_TIMEOUT）")
+    parser.add_argument("--think-time", type=float, default=0.2, help="每回合出拳前的最大随机等待（秒）")
+    parser.add_argument("--match-timeout", type=float, default=60.0, help="排队等待开局的超时（秒）")
+    parser.add_argument("--timeout", type=float, default=10.0, help="单个请求的超时（秒）")
+    parser.add_argument("--round-timeout", type=float, default=30.0, help="等待回合结算的超时（秒）")
+    parser.add_argument("--transport", choices=("websocket", "polling", "auto"), default="websocket")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="同时把报告写入该文件")
+    args = parser.parse_args()
+    args.transports = None if args.transport == "auto" else [args.transport]
+
+    logging.getLogger().setLevel(logging.WARNING)
+    server = None
+    workdir = None
+    if not args.url:
+        workdir = tempfile.TemporaryDirectory(prefix="ten_steps_load_")
+        server = start_local_server(args.port, workdir.name, args.server_mode, args.server_workers)
+        args.url = f"http://127.0.0.1:{args.port}"
+    try:
+        report = asyncio.run(run_load(args))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+            workdir.cleanup()
+    report.update({"url": args.url, "users": args.users, "concurrency": args.concurrency})
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,146 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+MODES = ("standard", "boss", "infinite")
+ROOM_SIZE = 4
+# 凑不满一桌时各模式最少的开局人数。BOSS 战至少要两名挑战者猜拳，否则永远分不出胜负
+MIN_PLAYERS = {"standard": 2, "boss": 3, "infinite": 2}
+# 排队超过 WIDEN_AFTER 秒后，每过 WIDEN_STEP 秒把可匹配的熟练度范围放宽一档
+WIDEN_AFTER = 5.0
+WIDEN_STEP = 5.0
+# 排队超过该时间仍凑不满一桌时，达到 MIN_PLAYERS 人就开局
+FILL_AFTER = 20.0
+
+def proficiency_tier(total: int) -> int:
+    # 熟练度总和按 2 的幂分档：0 / 1 / 2-3 / 4-7 / ...，档数随熟练度对数增长
+    return max(0, int(total)).bit_length()
+
+@dataclass(slots=True, eq=False)
+class Ticket:
+    player_id: str
+    mode: str
+    tier: int
+    enqueued_at: float
+
+class ModeQueue:
+    # 一个模式的队列：每个熟练度档一个按入队先后排列的 OrderedDict，入队、取消、取最早的票都是 O(1)
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.tiers: Dict[int, "OrderedDict[str, Ticket]"] = {}
+        self.size = 0
+
+    def push(self, ticket: Ticket):
+        bucket = self.tiers.get(ticket.tier)
+        if bucket is None:
+            bucket = self.tiers[ticket.tier] = OrderedDict()
+        bucket[ticket.player_id] = ticket
+        self.size += 1
+
+    def remove(self, ticket: Ticket):
+        bucket = self.tiers.get(ticket.tier)
+        if bucket is not None and bucket.pop(ticket.player_id, None) is not None:
+            self.size -= 1
+            if not bucket:
+                del self.tiers[ticket.tier]
+
+    def head(self, tier: int) -> Optional[Ticket]:
+        bucket = self.tiers.get(tier)
+        return next(iter(bucket.values())) if bucket else None
+
+    def oldest(self, tier: int, count: int) -> List[Ticket]:
+        bucket = self.tiers.get(tier)
+        if not bucket:
+            return []
+        tickets = []
+        for ticket in bucket.values():
+            tickets.append(ticket)
+            if len(tickets) == count:
+                break
+        return tickets
+
+class Matchmaker:
+    # 按模式排队匹配。poll() 返回可以开局的 [(mode, [Ticket, ...])]，这些票已出队；由服务器负责建房
+    def __init__(self, group_by_tier: bool = True, room_size: int = ROOM_SIZE, min_players: Optional[Dict[str, int]] = None,
+                 widen_after: float = WIDEN_AFTER, widen_step: float = WIDEN_STEP, fill_after: float = FILL_AFTER):
+        self.group_by_tier = group_by_tier
+        self.room_size = room_size
+        self.min_players = dict(MIN_PLAYERS, **(min_players or {}))
+        self.widen_after = widen_after
+        self.widen_step = widen_step
+        self.fill_after = fill_after
+        self.queues: Dict[str, ModeQueue] = {mode: ModeQueue(mode) for mode in MODES}
+        self.tickets: Dict[str, Ticket] = {}
+
+    def enqueue(self, player_id: str, mode: str, proficiency: int = 0, now: Optional[float] = None) -> Ticket:
+        # 已在同一模式排队时保留原来的位置；换模式则重新排到队尾
+        if mode not in self.queues:
+            raise ValueError(f"无效的游戏模式: {mode}")
+        ticket = self.tickets.get(player_id)
+        if ticket is not None:
+            if ticket.mode == mode:
+                return ticket
+            self.cancel(player_id)
+        tier = proficiency_tier(proficiency) if self.group_by_tier else 0
+        ticket = Ticket(player_id, mode, tier, time.time() if now is None else now)
+        self.tickets[player_id] = ticket
+        self.queues[mode].push(ticket)
+        return ticket
+
+    def cancel(self, player_id: str) -> Optional[Ticket]:
+        ticket = self.tickets.pop(player_id, None)
+        if ticket is not None:
+            self.queues[ticket.mode].remove(ticket)
+        return ticket
+
+    def is_queued(self, player_id: str) -> bool:
+        return player_id in self.tickets
+
+    def queue_sizes(self) -> Dict[str, int]:
+        return {mode: queue.size for mode, queue in self.queues.items()}
+
+    def queued(self) -> int:
+        return len(self.tickets)
+
+    def poll(self, now: Optional[float] = None, mode: Optional[str] = None) -> List[Tuple[str, List[Ticket]]]:
+        now = time.time() if now is None else now
+        queues = [self.queues[mode]] if mode else self.queues.values()
+        matches = []
+        for queue in queues:
+            for group in self._match(queue, now):
+                for ticket in group:
+                    self.tickets.pop(ticket.player_id, None)
+                matches.append((queue.mode, group))
+        return matches
+
+    def _match(self, queue: ModeQueue, now: float) -> List[List[Ticket]]:
+        groups = []
+        # 同一档内先到先得，凑满一桌就开；每桌只看各档最前面的几张票，与排队人数无关
+        for tier, bucket in list(queue.tiers.items()):
+            while len(bucket) >= self.room_size:
+                group = queue.oldest(tier, self.room_size)
+                for ticket in group:
+                    queue.remove(ticket)
+                groups.append(group)
+        # 剩下的各档都不足一桌：从等得最久的档开始，按等待时间放宽到相邻档
+        heads = sorted((queue.head(tier) for tier in queue.tiers), key=lambda ticket: ticket.enqueued_at)
+        taken = set()
+        for head in heads:
+            if head.player_id in taken:
+                continue
+            waited = now - head.enqueued_at
+            if waited < self.widen_after:
+                break
+            radius = 1 + int((waited - self.widen_after) // self.widen_step)
+            candidates = [ticket for tier in range(head.tier - radius, head.tier + radius + 1) if tier != head.tier
+                          for ticket in queue.oldest(tier, self.room_size) if ticket.player_id not in taken]
+            candidates.sort(key=lambda ticket: (abs(ticket.tier - head.tier), ticket.enqueued_at))
+            own = [ticket for ticket in queue.oldest(head.tier, self.room_size) if ticket.player_id not in taken]
+            group = (own + candidates)[:self.room_size]
+            if len(group) == self.room_size or (waited >= self.fill_after and len(group) >= self.min_players[queue.mode]):
+                for ticket in group:
+                    taken.add(ticket.player_id)
+                    queue.remove(ticket)
+                groups.append(group)
+        return groups
\ No newline at end of file
@@ -0,0 +1,180 @@
+import sys
+from enum import Enum, IntEnum
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Iterable, Optional
+
+class Style(str, Enum):
+    DAMAGE = "伤害流"
+    CONTROL = "控制流"
+    REGEN = "回复流"
+    BUFF = "增益流"
+    DEFENSE = "防御流"
+
+    # 格式化时输出中文名而不是 "Style.DAMAGE"
+    __str__ = str.__str__
+    __format__ = str.__format__
+
+class Move(IntEnum):
+    ROCK = 0
+    SCISSORS = 1
+    PAPER = 2
+
+    @property
+    def label(self) -> str:
+        return MOVE_LABELS[self]
+
+    @classmethod
+    def parse(cls, label: str) -> Optional["Move"]:
+        return MOVE_BY_LABEL.get(label)
+
+MOVE_LABELS = ("石头", "剪刀", "布")
+MOVE_BY_LABEL = {label: Move(i) for i, label in enumerate(MOVE_LABELS)}
+
+def intern_name(name: Optional[str]) -> Optional[str]:
+    # 角色名、技能名在所有对局间共享同一个字符串对象
+    return sys.intern(name) if name else name
+
+class BuffList(list):
+    # buff / debuff 列表：条目增删时同步维护 effect_data 中各数值属性的总和，
+    # 伤害、回复结算直接读 total()，不再每次扫描整个列表（无限乱斗里 buff 会叠得很长）。
+    # 条目加入后不要原地修改其 effect_data，要改就先移除再加入；duration 可以随意修改
+    __slots__ = ("totals",)
+
+    def __init__(self, items: Iterable[Dict[str, Any]] = ()):
+        super().__init__(items)
+        self.totals: Dict[str, float] = {}
+        for entry in self:
+            self._add(entry)
+
+    def __reduce__(self):
+        # pickle / deepcopy 时按普通列表重建，总和在 __init__ 中重新计算
+        return (BuffList, (list(self),))
+
+    def _add(self, entry: Dict[str, Any]):
+        totals = self.totals
+        for key, value in entry.get("effect_data", {}).items():
+            if isinstance(value, (int, float)):
+                totals[key] = totals.get(key, 0) + value
+
+    def _discard(self, entry: Dict[str, Any]):
+        if not self:
+            # 列表清空时直接归零，避免浮点加减的残差
+            self.totals.clear()
+            return
+        totals = self.totals
+        for key, value in entry.get("effect_data", {}).items():
+            if isinstance(value, (int, float)):
+                totals[key] = totals.get(key, 0) - value
+
+    def total(self, key: str) -> float:
+        return self.totals.get(key, 0)
+
+    def append(self, entry: Dict[str, Any]):
+        super().append(entry)
+        self._add(entry)
+
+    def insert(self, index: int, entry: Dict[str, Any]):
+        super().insert(index, entry)
+        self._add(entry)
+
+    def extend(self, entries: Iterable[Dict[str, Any]]):
+        for entry in entries:
+            self.append(entry)
+
+    def __iadd__(self, entries: Iterable[Dict[str, Any]]):
+        self.extend(entries)
+        return self
+
+    def __imul__(self, count: int):
+        entries = list(self)
+        if count <= 0:
+            self.clear()
+        for _ in range(count - 1):
+            self.extend(entries)
+        return self
+
+    def remove(self, entry: Dict[str, Any]):
+        super().remove(entry)
+        self._discard(entry)
+
+    def pop(self, index: int = -1) -> Dict[str, Any]:
+        entry = super().pop(index)
+        self._discard(entry)
+        return entry
+
+    def clear(self):
+        super().clear()
+        self.totals.clear()
+
+    def __delitem__(self, index):
+        removed = self[index] if isinstance(index, slice) else [self[index]]
+        super().__delitem__(index)
+        for entry in removed:
+            self._discard(entry)
+
+    def __setitem__(self, index, value):
+        # 按位置替换很少见，直接整体重算
+        super().__setitem__(index, value)
+        self._rebuild()
+
+    def _rebuild(self):
+        self.totals.clear()
+        for entry in self:
+            self._add(entry)
+
+@dataclass(slots=True, eq=False)
+class PlayerState:
+    player_id: str
+    socket_id: Optional[str] = None
+    username: str = ""
+    hp: float = 0
+    max_hp: float = 0
+    wins: int = 0
+    character: Optional[str] = None
+    style: Optional[Style] = None
+    available_skills: List[str] = field(default_factory=list)
+    skill_cooldowns: Dict[str, int] = field(default_factory=dict)
+    buffs: BuffList = field(default_factory=BuffList)
+    debuffs: BuffList = field(default_factory=BuffList)
+    states: Dict[str, Any] = field(default_factory=dict)
+    pending_skills: List[Dict[str, Any]] = field(default_factory=list)
+    is_alive: bool = True
+    ghost_hits: int = 0
+    revive_timer: int = 0
+    recorded_skills: List[str] = field(default_factory=list)
+    mimic_character: Optional[str] = None
+    proficiency: Dict[str, int] = field(default_factory=dict)
+    tasks: List[Dict[str, Any]] = field(default_factory=list)
+    revive_count: int = 0
+    puppet_master: Optional[str] = None
+    evasion: int = 0
+    charge_skills: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    death_round: int = 0
+
+    def __post_init__(self):
+        # 从快照或普通列表构造时换成 BuffList；之后整体替换 buffs 也要传 BuffList
+        if type(self.buffs) is not BuffList:
+            self.buffs = BuffList(self.buffs)
+        if type(self.debuffs) is not BuffList:
+            self.debuffs = BuffList(self.debuffs)
+        # JSON 快照里流派是中文名字符串
+        if self.style is not None and type(self.style) is not Style:
+            self.style = Style(self.style)
+
+    def to_public(self) -> Dict[str, Any]:
+        # 广播给客户端的字段；不包含待结算技能、熟练度等私有数据
+        return {
+            "player_id": self.player_id,
+            "socket_id": self.socket_id,
+            "username": self.username,
+            "hp": self.hp,
+            "max_hp": self.max_hp,
+            "wins": self.wins,
+            "character": self.character,
+            "style": self.style,
+            "available_skills": list(self.available_skills),
+            "skill_cooldowns": dict(self.skill_cooldowns),
+            "is_alive": self.is_alive,
+            "puppet_master": self.puppet_master,
+            "buffs": [b["name"] for b in self.buffs],
+        }
\ No newline at end of file
@@ -0,0 +1,88 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import argparse
+import cProfile
+import pstats
+from dataclasses import asdict
+from typing import Dict, List, Any, Optional
+from game_logic import GameEngine
+
+# 开局时由服务器绑定（bind_player，不录制为输入）的显示字段，不参与摘要
+UNRECORDED_FIELDS = ("socket_id", "username")
+
+def state_digest(engine: GameEngine) -> str:
+    # 对局完整状态（含私有字段）的摘要，用于确认回放与原局逐位一致
+    players = []
+    for p in engine.players.values():
+        data = asdict(p)
+        for key in UNRECORDED_FIELDS:
+            data.pop(key)
+        players.append(data)
+    state = {
+        "round": engine.current_round,
+        "game_over": engine.game_over,
+        "winner": engine.winner,
+        "boss_id": engine.boss_id,
+        "players": players,
+    }
+    return hashlib.sha256(json.dumps(state, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def save_record(engine: GameEngine, directory: str, name: Optional[str] = None) -> str:
+    os.makedirs(directory, exist_ok=True)
+    record = engine.export_record()
+    record["digest"] = state_digest(engine)
+    path = os.path.join(directory, f"{name or engine.seed}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(record, f, ensure_ascii=False)
+    return path
+
+def load_record(path: str) -> Dict[str, Any]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def replay(record: Dict[str, Any]) -> Dict[str, Any]:
+    # 逐条重放输入，记录每条输入的耗时，便于定位慢的回合
+    engine = GameEngine(record["players"], mode=record["mode"], seed=record["seed"])
+    timings: List[float] = []
+    start = time.perf_counter()
+    for entry in record["inputs"]:
+        t = time.perf_counter()
+        engine.apply_input(entry)
+        timings.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    digest = state_digest(engine)
+    slowest = sorted(range(len(timings)), key=timings.__getitem__, reverse=True)[:5]
+    return {
+        "engine": engine,
+        "elapsed": elapsed,
+        "digest": digest,
+        "matches": record.get("digest") in (None, digest),
+        "slowest": [(i, record["inputs"][i][0], timings[i]) for i in slowest],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="十步拳对局回放")
+    parser.add_argument("record", help="对局录像 JSON 文件")
+    parser.add_argument("--profile", action="store_true", help="用 cProfile 分析回放")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    record = load_record(args.record)
+    if args.profile:
+        profiler = cProfile.Profile()
+        result = profiler.runcall(replay, record)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(args.top)
+    else:
+        result = replay(record)
+    engine = result["engine"]
+    print(f"{len(record['inputs'])} 条输入, {engine.current_round} 回合, 耗时 {result['elapsed'] * 1000:.2f}ms, 胜者 {engine.winner}")
+    print(f"状态摘要 {result['digest']} {'一致' if result['matches'] else '与录像不一致'}")
+    for index, kind, seconds in result["slowest"]:
+        print(f"  #{index:<5} {kind:<12} {seconds * 1000:.3f}ms")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,114 @@
+import time
+import itertools
+from typing import Dict, List, Optional
+from game_logic import GameEngine
+from state_sync import StateDeltaTracker
+
+class GameRoom:
+    def __init__(self, game_id: str, players: Dict[str, Dict], mode: str = "standard", engine: Optional[GameEngine] = None):
+        self.game_id = game_id
+        self.mode = mode
+        # sid -> 大厅中的玩家信息（username 等）
+        self.players = dict(players)
+        self.game_engine = engine or GameEngine(list(self.players.keys()), mode=mode)
+        self.game_started = True
+        self.state_sync = StateDeltaTracker()
+        # 开局时由服务器创建 TaskTracker
+        self.tasks = None
+        self.journal = None
+        # 崩溃恢复后尚未重新连接的玩家：username -> 旧 sid
+        self.orphans: Dict[str, str] = {}
+
+    def has_player(self, player_id: str) -> bool:
+        return player_id in self.players
+
+    def remove_player(self, player_id: str) -> Optional[Dict]:
+        info = self.players.pop(player_id, None)
+        if info is not None:
+            self.game_engine.remove_player(player_id)
+        return info
+
+    def player_count(self) -> int:
+        return len(self.players)
+
+    def rebind_player(self, old_id: str, new_id: str, info: Dict):
+        # 重连的玩家沿用原来的对局位置，换成新的 sid
+        self.players.pop(old_id, None)
+        self.players[new_id] = info
+        self.orphans.pop(info["username"], None)
+        self.game_engine.rename_player(old_id, new_id)
+
+class RoomManager:
+    def __init__(self, shard: Optional[int] = None):
+        self.rooms: Dict[str, GameRoom] = {}
+        self.player_rooms: Dict[str, str] = {}
+        self._seq = itertools.count(1)
+        # 多进程部署时的工作进程编号，写进对局 id 保证各进程之间不重复
+        self.prefix = f"game_w{shard}" if shard is not None else "game"
+
+    def new_game_id(self) -> str:
+        return f"{self.prefix}_{int(time.time() * 1000)}_{next(self._seq)}"
+
+    def create_room(self, players: Dict[str, Dict], mode: str = "standard") -> GameRoom:
+        room = GameRoom(self.new_game_id(), players, mode)
+        self.rooms[room.game_id] = room
+        for pid in room.players:
+            self.player_rooms[pid] = room.game_id
+        return room
+
+    def restore_room(self, game_id: str, players: Dict[str, Dict], engine: GameEngine) -> GameRoom:
+        # 崩溃恢复：玩家的旧 sid 已失效，等待其重新登录后认领
+        room = GameRoom(game_id, players, engine.mode, engine=engine)
+        room.orphans = {info["username"]: pid for pid, info in room.players.items()}
+        self.rooms[game_id] = room
+        for pid in room.players:
+            self.player_rooms[pid] = game_id
+        return room
+
+    def find_orphan(self, username: str) -> Optional[GameRoom]:
+        for room in self.rooms.values():
+            if username in room.orphans:
+                return room
+        return None
+
+    def rebind_player(self, room: GameRoom, username: str, new_id: str, info: Dict) -> Optional[str]:
+        old_id = room.orphans.get(username)
+        if old_id is None:
+            return None
+        room.rebind_player(old_id, new_id, info)
+        self.player_rooms.pop(old_id, None)
+        self.player_rooms[new_id] = room.game_id
+        return old_id
+
+    def get_room(self, game_id: str) -> Optional[GameRoom]:
+        return self.rooms.get(game_id)
+
+    def room_of(self, player_id: str) -> Optional[GameRoom]:
+        game_id = self.player_rooms.get(player_id)
+        return self.rooms.get(game_id) if game_id else None
+
+    def is_in_room(self, player_id: str) -> bool:
+        return player_id in self.player_rooms
+
+    def remove_player(self, player_id: str) -> Optional[GameRoom]:
+        game_id = self.player_rooms.pop(player_id, None)
+        room = self.rooms.get(game_id) if game_id else None
+        if room:
+            room.remove_player(player_id)
+        return room
+
+    def close_room(self, game_id: str) -> List[str]:
+        room = self.rooms.pop(game_id, None)
+        if not room:
+            return []
+        player_ids = list(room.players.keys())
+        for pid in player_ids:
+            if self.player_rooms.get(pid) == game_id:
+                del self.player_rooms[pid]
+        return player_ids
+
+    def active_rooms(self) -> int:
+        return len(self.rooms)
+
+    def active_players(self) -> int:
+        return len(self.player_rooms)
\ No newline at end of file
@@ -0,0 +1,111 @@
+import os
+import sys
+import time
+import signal
+import secrets
+import argparse
+import subprocess
+
+ASYNC_MODES = ("eventlet", "gevent", "threading")
+
+def make_io_executor(async_mode: str, workers: int):
+    # 返回 executor(fn, *args)：在真正的系统线程里执行阻塞的查询和日志写入，当前协程让出事件循环等待结果。
+    # threading 模式下每个事件本来就在独立线程中处理，直接执行即可
+    if async_mode == "eventlet":
+        from eventlet import tpool
+        tpool.set_num_threads(workers)
+        return tpool.execute
+    if async_mode == "gevent":
+        from gevent.threadpool import ThreadPool
+        pool = ThreadPool(workers)
+        return lambda fn, *args: pool.apply(fn, args)
+    return None
+
+def run_workers(args):
+    # 主进程只负责消息中转和看管工作进程：每个工作进程是独立的 serve.py，监听 port + i，
+    # 拥有自己的房间、日志目录和数据库连接池；玩家按用户名固定分配到其中一个进程
+    from eventlog import configure_logging, get_logger
+    from cluster import start_broker
+    configure_logging()
+    log = get_logger("serve")
+    broker = start_broker(args.broker)
+    ports = [args.port + i for i in range(args.workers)]
+    urls = [args.public_url.format(port=port) for port in ports]
+    journal_dir = os.environ.get("TEN_STEPS_JOURNAL_DIR", "journal")
+    # 各工作进程共用的登录重定向令牌密钥，重启的工作进程沿用同一个
+    redirect_secret = os.environ.get("TEN_STEPS_REDIRECT_SECRET") or secrets.token_hex(16)
+
+    def spawn(index):
+        env = dict(os.environ,
+                   TEN_STEPS_BROKER=args.broker,
+                   TEN_STEPS_WORKER_INDEX=str(index),
+                   TEN_STEPS_WORKER_URLS=",".join(urls),
+                   TEN_STEPS_REDIRECT_SECRET=redirect_secret,
+                   TEN_STEPS_JOURNAL_DIR=os.path.join(journal_dir, f"worker-{index}"))
+        command = [sys.executable, os.path.abspath(__file__), "--host", args.host, "--port", str(ports[index]),
+                   "--async-mode", args.async_mode, "--db-workers", str(args.db_workers), "--workers", "1"]
+        return subprocess.Popen(command, env=env)
+
+    # SIGTERM 也走 finally，一并停止工作进程
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    workers = [spawn(i) for i in range(args.workers)]
+    log.info("多进程服务器启动", workers=args.workers, ports=ports, broker=args.broker)
+    try:
+        while True:
+            time.sleep(1)
+            for index, proc in enumerate(workers):
+                if proc.poll() is not None:
+                    # 意外退出的工作进程原地重启，未结束的对局从其日志目录恢复
+                    log.error("工作进程退出，重新启动", worker=index, code=proc.returncode)
+                    workers[index] = spawn(index)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for proc in workers:
+            proc.terminate()
+        for proc in workers:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        broker.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description="十步拳服务器（生产入口）")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--async-mode", choices=ASYNC_MODES, default=os.environ.get("TEN_STEPS_ASYNC_MODE", "eventlet"),
+                        help="eventlet/gevent 单进程可承载数千连接；threading 仅用于调试")
+    parser.add_argument("--db-workers", type=int, default=int(os.environ.get("TEN_STEPS_DB_WORKERS", "8")),
+                        help="执行数据库查询的线程数，同时也是连接池大小")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("TEN_STEPS_WORKERS", "1")),
+                        help="工作进程数，大于 1 时监听 port 到 port+workers-1，一般取 CPU 核数")
+    parser.add_argument("--broker", default=os.environ.get("TEN_STEPS_BROKER", "127.0.0.1:5100"),
+                        help="多进程时消息中转监听的地址")
+    parser.add_argument("--public-url", default=os.environ.get("TEN_STEPS_PUBLIC_URL", "http://127.0.0.1:{port}"),
+                        help="客户端访问工作进程的地址模板，登录重定向时下发")
+    args = parser.parse_args()
+    if args.workers > 1:
+        run_workers(args)
+        return
+
+    # 必须在导入 Flask / server 之前打补丁。不替换 threading：连接池和聊天写线程要用真正的线程锁和队列，
+    # 阻塞查询和对局日志写入通过 executor 交给系统线程池
+    if args.async_mode == "eventlet":
+        import eventlet
+        eventlet.monkey_patch(thread=False)
+    elif args.async_mode == "gevent":
+        from gevent import monkey
+        monkey.patch_all(thread=False)
+    os.environ["TEN_STEPS_ASYNC_MODE"] = args.async_mode
+
+    import server
+    server.db.pool_size = args.db_workers
+    # 对局日志在打开时取数据库的 executor，必须在 startup() 恢复对局之前设置
+    server.db.executor = make_io_executor(args.async_mode, args.db_workers)
+    server.startup()
+    server.log.info("服务器启动", host=args.host, port=args.port, async_mode=args.async_mode, db_workers=args.db_workers)
+    server.socketio.run(server.app, host=args.host, port=args.port, allow_unsafe_werkzeug=args.async_mode == "threading")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
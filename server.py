@@ -1,64 +1,94 @@
-import sqlite3
-import logging
-from flask import Flask, request
-from flask_socketio import SocketIO, Namespace, emit
+import os
+import time
+import atexit
+from flask import Flask, Response, request, has_request_context
+from flask_socketio import SocketIO, Namespace, join_room, leave_room
+from flask_socketio import emit as socketio_emit
 from datetime import datetime
-from game_logic import GameEngine
+from rooms import RoomManager
+from storage import Database, DEFAULT_DB_PATH
+from task_tracker import TaskTracker
+from chat import ChatHistory, ChatWriter, HISTORY_LIMIT, LOBBY_CHANNEL
+from replay import save_record
+from journal import GameJournal, recover_games, JOURNAL_DIR, SNAPSHOT_EVERY_ROUNDS, SYNC_INTERVAL
+from metrics import REGISTRY, CONTENT_TYPE
+from eventlog import get_logger, configure_logging
+from matchmaking import Matchmaker, MODES
+from timers import TimerWheel
+from cluster import LocalBrokerManager, BROKER_ADDRESS, WORKER_INDEX, WORKER_URLS, redirect_url, issue_redirect_token, verify_redirect_token
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'secret!'
-socketio = SocketIO(app, cors_allowed_origins="*")
-
-logging.basicConfig(level=logging.DEBUG)
+# 异步模式由 serve.py 在导入本模块前通过环境变量选择：threading / eventlet / gevent
+ASYNC_MODE = os.environ.get("TEN_STEPS_ASYNC_MODE") or None
+# 多进程部署时各工作进程通过本机消息中转互通广播，见 cluster.py
+client_manager = LocalBrokerManager(BROKER_ADDRESS) if BROKER_ADDRESS else None
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE, client_manager=client_manager)
+
+log = get_logger("server")
+
+# 数据库路径可通过环境变量 TEN_STEPS_DB 配置
+db = Database(DEFAULT_DB_PATH)
+# 设置后每局结束时把对局录像写入该目录，可用 replay.py 离线复现
+RECORD_DIR = os.environ.get("TEN_STEPS_RECORD_DIR")
+# 匹配队列检查间隔（秒）：排满一桌的立即开局，这里处理放宽熟练度范围和等待超时
+MATCH_INTERVAL = float(os.environ.get("TEN_STEPS_MATCH_INTERVAL", "1.0"))
+# 设为 0 时不按熟练度分档，同一模式的玩家先到先得
+MATCH_BY_PROFICIENCY = os.environ.get("TEN_STEPS_MATCH_BY_PROFICIENCY", "1") not in ("", "0")
+# 每回合出拳的时限（秒），到时未出拳的玩家由引擎随机补上；0 为不限时
+ROUND_TIMEOUT = float(os.environ.get("TEN_STEPS_ROUND_TIMEOUT", "30"))
+NAMESPACE = "/game"
+
+EVENTS = REGISTRY.counter("ten_steps_events_total", "收到的 Socket.IO 事件数", ["event"])
+EVENT_FAILURES = REGISTRY.counter("ten_steps_event_failures_total", "回复了 *_failed / *_error 的事件数", ["event"])
+EVENT_EXCEPTIONS = REGISTRY.counter("ten_steps_event_exceptions_total", "处理时抛出异常的事件数", ["event"])
+EVENT_SECONDS = REGISTRY.histogram("ten_steps_event_seconds", "Socket.IO 事件处理耗时", ["event"])
+ROUND_SECONDS = REGISTRY.histogram("ten_steps_round_seconds", "回合结算耗时（含广播）", ["mode"])
+ROUND_TIMEOUTS = REGISTRY.counter("ten_steps_round_timeouts_total", "超时自动结算的回合数", ["mode"])
+MATCH_WAIT_SECONDS = REGISTRY.histogram("ten_steps_match_wait_seconds", "匹配排队等待时间", ["mode"],
+                                        buckets=(0.1, 0.5, 1, 2, 5, 10, 15, 20, 30, 60, 120))
+
+def emit(event, *args, **kwargs):
+    if not has_request_context():
+        # 后台任务（定时匹配、回合超时）里没有触发事件的客户端，必须指定 to
+        kwargs.pop("broadcast", None)
+        return socketio.emit(event, *args, namespace=NAMESPACE, **kwargs)
+    # 处理函数回复失败事件时，按触发它的客户端事件计数
+    if event.endswith(("_failed", "_error")):
+        source = getattr(request, "event", None)
+        EVENT_FAILURES.inc(event=source["message"] if source else event)
+    return socketio_emit(event, *args, **kwargs)
+
+@app.route("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
 
 def init_db():
     try:
-        conn = sqlite3.connect("ten_steps.db")
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                username TEXT PRIMARY KEY,
-                password TEXT NOT NULL
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS chat_messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT NOT NULL,
-                message TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS player_proficiency (
-                username TEXT,
-                character_name TEXT,
-                proficiency INTEGER DEFAULT 0,
-                PRIMARY KEY (username, character_name)
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS tasks (
-                username TEXT,
-                task_type TEXT,
-                progress INTEGER DEFAULT 0,
-                completed BOOLEAN DEFAULT FALSE,
-                PRIMARY KEY (username, task_type)
-            )
-        """)
-        conn.commit()
-        conn.close()
-        logging.debug("数据库初始化成功")
+        db.init_schema()
+        log.info("数据库初始化成功", path=db.path)
     except Exception as e:
-        logging.error(f"数据库初始化失败: {str(e)}")
+        log.error("数据库初始化失败", error=e)
 
 class GameNamespace(Namespace):
-    def __init__(self, namespace):
+    def __init__(self, namespace, database=None):
         super().__init__(namespace)
+        self.db = database or db
+        # 已登录玩家（大厅）：sid -> 玩家信息
         self.players = {}
-        self.game_engine = None
-        self.game_started = False
-        self.game_id = None
+        # 多进程时对局 id 带上进程编号，日志目录和房间名在各进程之间不会冲突
+        self.rooms = RoomManager(shard=WORKER_INDEX if len(WORKER_URLS) > 1 else None)
+        # 大厅玩家列表包含所有工作进程的玩家：其他进程的经中转同步过来，worker 编号 -> 玩家列表。
+        # 匹配仍在各进程内进行，玩家只和同一归属进程的玩家开局
+        self.lobby_room = "lobby"
+        self.remote_players = {}
+        self.matchmaker = Matchmaker(group_by_tier=MATCH_BY_PROFICIENCY)
+        # 所有房间的回合截止时间放在同一个时间轮里：game_id -> 到期时间
+        self.deadlines = TimerWheel()
+        self.chat_history = ChatHistory()
+        # 聊天写线程是真正的系统线程，用单独的连接直接执行，不经过事件循环的 executor
+        self.chat_writer = ChatWriter(Database(self.db.path, pool_size=1, busy_timeout=self.db.busy_timeout))
+        self._chat_warmed = False
         self.task_triggers = {
             "output": {"damage_dealt": 0},
             "control": {"control_skills": 0, "wins": 0},
@@ -66,78 +96,99 @@ class GameNamespace(Namespace):
             "defense": {"evasions": 0}
         }
 
+    def trigger_event(self, event, *args):
+        # 所有有处理函数的事件统一计数、计时
+        if not hasattr(self, "on_" + (event or "")):
+            return super().trigger_event(event, *args)
+        EVENTS.inc(event=event)
+        start = time.perf_counter()
+        try:
+            return super().trigger_event(event, *args)
+        except Exception:
+            EVENT_EXCEPTIONS.inc(event=event)
+            raise
+        finally:
+            EVENT_SECONDS.observe(time.perf_counter() - start, event=event)
+
+    def register_metrics(self):
+        REGISTRY.gauge("ten_steps_rooms_active", "进行中的房间数", fn=self.rooms.active_rooms)
+        REGISTRY.gauge("ten_steps_players_in_game", "房间内的玩家数", fn=self.rooms.active_players)
+        REGISTRY.gauge("ten_steps_players_online", "已登录的玩家数", fn=lambda: len(self.players))
+        REGISTRY.gauge("ten_steps_chat_backlog", "等待写入数据库的聊天消息数", fn=self.chat_writer.backlog)
+        REGISTRY.gauge("ten_steps_match_queued", "匹配队列中的玩家数", fn=self.matchmaker.queued)
+        REGISTRY.gauge("ten_steps_round_deadlines", "等待截止的回合数", fn=lambda: len(self.deadlines))
+        if client_manager:
+            REGISTRY.gauge("ten_steps_broker_backlog", "与中转断开期间缓存的待发广播数", fn=lambda: len(client_manager.backlog))
+
     def on_connect(self):
-        logging.debug(f"客户端连接: {request.sid}")
+        log.debug("客户端连接", sid=request.sid)
 
     def on_disconnect(self):
-        player_id = None
-        for pid, info in list(self.players.items()):
-            if pid == request.sid:
-                player_id = pid
-                break
-        if player_id:
-            username = self.players[player_id]["username"]
-            del self.players[player_id]
-            if self.game_engine and player_id in self.game_engine.players:
-                self.game_engine.players[player_id]["is_alive"] = False
-                self.check_game_status()
-            emit("player_left", {"player_id": player_id, "username": username}, broadcast=True)
-            logging.debug(f"玩家离开: {player_id} ({username})")
-            self.broadcast_player_list()
-            if len(self.players) < 2:
-                self.game_started = False
-                self.game_engine = None
-                self.game_id = None
-                emit("game_terminated", {"message": "玩家数量不足，游戏终止"}, broadcast=True)
+        player_id = request.sid
+        if player_id not in self.players:
+            return
+        username = self.players.pop(player_id)["username"]
+        self.matchmaker.cancel(player_id)
+        room = self.rooms.remove_player(player_id)
+        if room:
+            leave_room(room.game_id, sid=player_id)
+            emit("player_left", {"player_id": player_id, "username": username}, to=room.game_id)
+            self.check_game_status(room)
+            if room.game_id in self.rooms.rooms and room.player_count() < 2:
+                emit("game_terminated", {"message": "玩家数量不足，游戏终止"}, to=room.game_id)
+                self.end_room(room)
+        log.debug("玩家离开", player_id=player_id, username=username)
+        self.broadcast_player_list()
 
     def on_register(self, data):
         username = data.get("username")
         password = data.get("password")
         try:
-            conn = sqlite3.connect("ten_steps.db")
-            cursor = conn.cursor()
-            cursor.execute("SELECT username FROM users WHERE username = ?", (username,))
-            if cursor.fetchone():
-                conn.close()
+            if not self.db.create_user(username, password):
                 emit("register_failed", {"message": "用户名已存在"})
                 return
-            cursor.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
-            conn.commit()
-            conn.close()
-            logging.debug(f"用户注册成功: {username}")
+            log.debug("用户注册成功", username=username)
             emit("register_success", {"message": "注册成功"})
         except Exception as e:
-            logging.error(f"注册错误: {str(e)}")
+            log.error("注册错误", error=e)
             emit("register_failed", {"message": str(e)})
 
     def on_login(self, data):
         username = data.get("username")
         password = data.get("password")
+        token = data.get("token")
         try:
-            conn = sqlite3.connect("ten_steps.db")
-            cursor = conn.cursor()
-            cursor.execute("SELECT username FROM users WHERE username = ? AND password = ?", (username, password))
-            user = cursor.fetchone()
-            conn.close()
-            if user:
+            if token:
+                # 其他工作进程重定向过来的登录：凭该进程签发的一次性令牌，不再校验密码
+                authenticated = verify_redirect_token(token) == username
+            else:
+                authenticated = self.db.check_login(username, password)
+            if authenticated:
+                url = redirect_url(username)
+                if url:
+                    # 玩家归属其他工作进程：发一个短时有效的令牌，让客户端改连那里后凭令牌登录
+                    log.debug("登录重定向", username=username, url=url)
+                    emit("login_redirect", {"url": url, "token": issue_redirect_token(username)})
+                    return
                 player_id = request.sid
                 self.players[player_id] = {
                     "username": username,
-                    "force_start": False,
-                    "mode_vote": None
+                    "proficiency": self.load_proficiency(username)
                 }
-                logging.debug(f"用户登录成功: {username}, player_id: {player_id}")
+                log.debug("用户登录成功", username=username, player_id=player_id)
+                join_room(self.lobby_room, sid=player_id)
                 emit("login_success", {"player_id": player_id}, to=player_id)
                 self.send_chat_history(to=player_id)
+                self.rejoin_recovered_game(username, player_id)
                 self.broadcast_player_list()
-                player_count = len(self.players)
-                if player_count == 4 and not self.game_started:
-                    self.start_game("standard")
+                # 登录后默认进入普通模式的匹配队列，可用 join_queue 换模式
+                if not self.rooms.is_in_room(player_id):
+                    self.enqueue_player(player_id, "standard")
             else:
-                logging.debug(f"用户登录失败: {username}")
-                emit("login_failed", {"message": "用户名或密码错误"})
+                log.debug("用户登录失败", username=username, token=bool(token))
+                emit("login_failed", {"message": "登录令牌无效或已过期" if token else "用户名或密码错误"})
         except Exception as e:
-            logging.error(f"登录错误: {str(e)}")
+            log.error("登录错误", error=e)
             emit("login_failed", {"message": str(e)})
 
     def on_send_chat(self, data):
@@ -146,63 +197,128 @@ class GameNamespace(Namespace):
         if not username or not message:
             emit("chat_error", {"message": "用户名或消息不能为空"})
             return
+        # 先广播，落库交给后台写线程；写入队列已满时拒绝消息
+        if not self.chat_writer.submit(username, message):
+            log.warning("聊天写入队列已满，丢弃消息", username=username)
+            emit("chat_error", {"message": "聊天服务繁忙，请稍后再试"})
+            return
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        log.debug("聊天消息入队", username=username, length=len(message))
+        entry = {"username": username, "message": message, "timestamp": timestamp}
+        self.chat_history.append(entry, LOBBY_CHANNEL)
+        emit("receive_chat", entry, broadcast=True)
+
+    def append_remote_chat(self, entry):
+        # 其他工作进程的聊天广播经中转到达，本进程也要记入历史，新登录的玩家才能看到
+        self.chat_history.append(entry, LOBBY_CHANNEL)
+
+    def warm_chat_history(self):
+        # 启动时从数据库加载最近的聊天记录，之后只维护内存缓冲
         try:
-            conn = sqlite3.connect("ten_steps.db")
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO chat_messages (username, message) VALUES (?, ?)", (username, message))
-            conn.commit()
-            conn.close()
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            logging.debug(f"聊天消息保存: {username}: {message}")
-            emit("receive_chat", {"username": username, "message": message, "timestamp": timestamp}, broadcast=True)
+            self.chat_history.warm(self.db.recent_chat(HISTORY_LIMIT), LOBBY_CHANNEL)
+            self._chat_warmed = True
         except Exception as e:
-            logging.error(f"保存聊天消息失败: {str(e)}")
-            emit("chat_error", {"message": str(e)})
+            log.error("加载聊天历史失败", error=e)
+
+    def send_chat_history(self, to):
+        if not self._chat_warmed:
+            self.warm_chat_history()
+        emit("chat_history", {"channel": LOBBY_CHANNEL, "messages": self.chat_history.recent(LOBBY_CHANNEL)}, to=to)
 
-    def send_chat_history(self, to=None):
+    def load_proficiency(self, username):
         try:
-            conn = sqlite3.connect("ten_steps.db")
-            cursor = conn.cursor()
-            cursor.execute("SELECT username, message, timestamp FROM chat_messages ORDER BY timestamp DESC LIMIT 50")
-            messages = cursor.fetchall()
-            conn.close()
-            for username, message, timestamp in reversed(messages):
-                emit("receive_chat", {"username": username, "message": message, "timestamp": timestamp}, to=to or None, broadcast=(not to))
+            return self.db.total_proficiency(username)
         except Exception as e:
-            logging.error(f"获取聊天历史失败: {str(e)}")
+            log.error("读取熟练度失败", username=username, error=e)
+            return 0
+
+    def check_queue_request(self, player_id, mode):
+        # 返回错误信息，可以排队时返回 None
+        if player_id not in self.players:
+            return "玩家未登录"
+        if self.rooms.is_in_room(player_id):
+            return "玩家已在游戏中"
+        if mode not in MODES:
+            return "无效的游戏模式"
+        return None
+
+    def enqueue_player(self, player_id, mode):
+        ticket = self.matchmaker.enqueue(player_id, mode, self.players[player_id]["proficiency"])
+        log.debug("加入匹配队列", player_id=player_id, mode=mode, tier=ticket.tier)
+        # 新入队的玩家可能刚好凑满一桌，只检查这个模式
+        self.run_matchmaking(mode)
+
+    def queue_status(self, player_id):
+        ticket = self.matchmaker.tickets.get(player_id)
+        return {"mode": ticket.mode if ticket else None, "queued": self.matchmaker.queue_sizes()}
+
+    def on_join_queue(self, data):
+        player_id = request.sid
+        mode = data.get("mode", "standard")
+        error = self.check_queue_request(player_id, mode)
+        if error:
+            emit("join_queue_failed", {"message": error})
+            return
+        self.enqueue_player(player_id, mode)
+        if self.matchmaker.is_queued(player_id):
+            emit("queue_status", self.queue_status(player_id), to=player_id)
+
+    def on_leave_queue(self, data):
+        self.matchmaker.cancel(request.sid)
+        emit("queue_status", self.queue_status(request.sid), to=request.sid)
 
     def on_force_start(self, data):
-        player_id = data.get("player_id")
+        # 旧客户端的“强制开始”，语义已改为加入所选模式的匹配队列（已在其他模式排队则换队）：
+        # 不再立即用大厅现有玩家开局，由 matchmaking_loop 凑满一桌，或排队超过 FILL_AFTER 秒后
+        # 达到该模式的 MIN_PLAYERS 人时开局。force_start_status 回复该模式当前的排队人数
+        player_id = request.sid
         mode = data.get("mode", "standard")
-        if player_id not in self.players:
-            emit("force_start_failed", {"message": "玩家未登录"})
+        error = self.check_queue_request(player_id, mode)
+        if error:
+            emit("force_start_failed", {"message": error})
             return
-        player_count = len(self.players)
-        if player_count < 2 or player_count > 4:
-            emit("force_start_failed", {"message": "玩家数量必须为 2 到 4 人"})
+        self.enqueue_player(player_id, mode)
+        if self.matchmaker.is_queued(player_id):
+            queued = self.matchmaker.queue_sizes()[mode]
+            emit("force_start_status", {"message": f"正在匹配，当前模式排队 {queued} 人", "mode": mode}, to=player_id)
+
+    def on_vote_mode(self, data):
+        # 旧客户端的模式投票，语义已改为玩家各自选择排哪个模式的队：不再按票数决定整个大厅的模式，
+        # 只把投票者换到所选模式的队列。vote_mode_status 的 votes 字段现在是各模式的排队人数
+        player_id = request.sid
+        mode = data.get("mode", "standard")
+        if self.check_queue_request(player_id, mode):
             return
-        self.players[player_id]["force_start"] = True
-        self.players[player_id]["mode_vote"] = mode
-        logging.debug(f"玩家 {player_id} 请求强制开始，模式: {mode}")
-        all_ready = all(info["force_start"] for info in self.players.values())
-        mode_votes = [info["mode_vote"] for info in self.players.values() if info["mode_vote"]]
-        selected_mode = max(set(mode_votes), key=mode_votes.count, default="standard") if mode_votes else "standard"
-        if all_ready and not self.game_started:
-            self.start_game(selected_mode)
-        else:
-            emit("force_start_status", {
-                "message": f"等待其他玩家同意 ({sum(1 for p in self.players.values() if p['force_start'])}/{player_count})",
-                "mode": selected_mode
-            }, broadcast=True)
+        self.enqueue_player(player_id, mode)
+        if self.matchmaker.is_queued(player_id):
+            emit("vote_mode_status", {"mode": mode, "votes": self.matchmaker.queue_sizes()}, to=player_id)
+
+    def run_matchmaking(self, mode=None):
+        now = time.time()
+        for match_mode, tickets in self.matchmaker.poll(now, mode):
+            for ticket in tickets:
+                MATCH_WAIT_SECONDS.observe(now - ticket.enqueued_at, mode=match_mode)
+            self.start_game(match_mode, [ticket.player_id for ticket in tickets])
+
+    def matchmaking_loop(self):
+        # 由 startup() 作为后台任务启动，整个进程只有这一个
+        while True:
+            socketio.sleep(MATCH_INTERVAL)
+            try:
+                with app.app_context():
+                    self.run_matchmaking()
+            except Exception as e:
+                log.error("匹配失败", error=e)
 
     def on_select_character(self, data):
         player_id = data.get("player_id")
         if player_id not in self.players:
-            logging.error(f"角色选择失败: 玩家 {player_id} 未登录")
+            log.warning("角色选择失败", player_id=player_id, reason="玩家未登录")
             emit("select_character_failed", {"message": "玩家未登录"}, to=player_id)
             return
-        if not self.game_engine:
-            logging.error(f"角色选择失败: 游戏未初始化")
+        room = self.rooms.room_of(player_id)
+        if not room:
+            log.warning("角色选择失败", player_id=player_id, reason="游戏未初始化")
             emit("select_character_failed", {"message": "游戏未初始化"}, to=player_id)
             return
 
@@ -212,295 +328,395 @@ class GameNamespace(Namespace):
         username = data.get("username")
         selected_skills = data.get("selected_skills", [])
 
-        result = self.game_engine.select_character(player_id, character, style, username, selected_skills)
+        result = room.game_engine.select_character(player_id, character, style, username, selected_skills)
         if not result["success"]:
-            logging.error(f"角色选择失败: {result['message']}")
+            log.warning("角色选择失败", player_id=player_id, reason=result["message"])
             emit("select_character_failed", {"message": result['message']}, to=player_id)
             return
 
         # 更新熟练度
         try:
-            conn = sqlite3.connect("ten_steps.db")
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT OR REPLACE INTO player_proficiency (username, character_name, proficiency)
-                VALUES (?, ?, COALESCE((SELECT proficiency FROM player_proficiency WHERE username = ? AND character_name = ?), 0) + 1)
-            """, (username, character, username, character))
-            conn.commit()
-            conn.close()
+            self.db.add_proficiency(username, character)
         except Exception as e:
-            logging.error(f"更新熟练度失败: {str(e)}")
+            log.error("更新熟练度失败", username=username, error=e)
 
-        logging.debug(f"玩家 {player_id} ({username}) 选择角色: {character}, 流派: {style}, 技能: {selected_skills}")
+        log.debug("选择角色", player_id=player_id, username=username, character=character, style=style, skills=selected_skills)
         emit("character_selected", {
             "player_id": player_id,
             "username": username,
             "character_name": character,
             "style": style,
             "selected_skills": selected_skills
-        }, broadcast=True)
+        }, to=room.game_id)
 
-        if self.game_engine.all_players_ready():
-            self.game_started = True
-            self.initialize_tasks()
-            self.broadcast_game_state()
+        if room.game_engine.all_players_ready():
+            room.game_started = True
+            self.initialize_tasks(room)
+            self.broadcast_game_state(room)
+            self.schedule_round_deadline(room)
 
     def on_submit_move(self, data):
         player_id = data.get("player_id")
         if player_id not in self.players:
             emit("submit_move_failed", {"message": "玩家未登录"}, to=player_id)
             return
-        if not self.game_engine or not self.game_started:
+        room = self.rooms.room_of(player_id)
+        if not room or not room.game_started:
             emit("submit_move_failed", {"message": "游戏未开始"})
             return
 
         move = data.get("move")
-        result = self.game_engine.submit_move(player_id, move)
+        result = room.game_engine.submit_move(player_id, move)
         if not result["success"]:
             emit("submit_move_failed", {"message": result["message"]}, to=player_id)
             return
 
-        logging.debug(f"玩家 {player_id} 提交动作: {move}")
-        if self.game_engine.all_moves_submitted():
-            self.process_round()
+        log.debug("提交动作", player_id=player_id, move=move)
+        if room.game_engine.all_moves_submitted():
+            self.process_round(room)
 
     def on_use_skill(self, data):
         player_id = data.get("player_id")
         if player_id not in self.players:
             emit("use_skill_failed", {"message": "玩家未登录"})
             return
-        if not self.game_engine or not self.game_started:
+        room = self.rooms.room_of(player_id)
+        if not room or not room.game_started:
             emit("use_skill_failed", {"message": "游戏未开始"})
             return
 
         skill_name = data.get("skill_name")
         targets = data.get("targets", [])
         params = data.get("params", {})
-        result = self.game_engine.apply_skill(player_id, skill_name, targets, params)
+        result = room.game_engine.use_skill(player_id, skill_name, targets, params, consume_win=True)
         if not result["success"]:
             emit("use_skill_failed", {"message": result["message"]}, to=player_id)
             return
 
-        logging.debug(f"玩家 {player_id} 使用技能: {skill_name}, 目标: {targets}, 参数: {params}")
-        self.update_task_progress(player_id, skill_name, result)
-        if self.game_engine.all_moves_submitted():
-            self.process_round()
+        log.debug("使用技能", player_id=player_id, skill=skill_name, targets=targets, params=params)
+        self.update_task_progress(room, player_id, skill_name, result)
+        if room.game_engine.all_moves_submitted():
+            self.process_round(room)
 
-    def start_game(self, mode):
-        self.game_started = True
-        self.game_id = f"game_{datetime.now().timestamp()}"
-        player_ids = list(self.players.keys())
-        self.game_engine = GameEngine(player_ids, mode=mode)
+    def start_game(self, mode, players):
+        room = self.rooms.create_room({pid: self.players[pid] for pid in players}, mode=mode)
+        player_ids = list(room.players.keys())
         for pid in player_ids:
-            self.game_engine.players[pid]["socket_id"] = pid
-            self.game_engine.players[pid]["username"] = self.players[pid]["username"]
-            if mode == "boss" and pid == player_ids[0]:  # 第一个玩家为 BOSS
-                self.game_engine.set_boss(pid, base_hp=50, hp_per_player=10)
-        logging.debug(f"游戏开始: game_id={self.game_id}, mode={mode}, players={player_ids}")
-        game_state = self.game_engine.get_public_state()
+            join_room(room.game_id, sid=pid, namespace=self.namespace)
+            room.game_engine.bind_player(pid, pid, room.players[pid]["username"])
+        self.open_journal(room)
+        log.info("游戏开始", game_id=room.game_id, mode=mode, players=player_ids)
+        game_state = room.game_engine.get_public_state()
         emit("game_start", {
-            "game_id": self.game_id,
+            "game_id": room.game_id,
             "mode": mode,
             "players": game_state["players"],
             "boss": game_state.get("boss", None)
-        }, broadcast=True)
-
-    def process_round(self):
-        if not self.game_engine:
-            logging.error("无法处理回合: 游戏引擎未初始化")
-            return
-        round_result = self.game_engine.process_round()
-        logging.debug(f"回合 {self.game_engine.current_round} 处理完成: {round_result}")
+        }, to=room.game_id)
+        return room
+
+    def process_round(self, room):
+        with ROUND_SECONDS.time(mode=room.mode):
+            self._process_round(room)
+
+    def _process_round(self, room):
+        engine = room.game_engine
+        # 本回合放的技能先结算，造成的伤害、规避随回合结果一起带出
+        settle_result = engine.settle_damage() if engine.has_pending_skills() else None
+        round_result = engine.process_round()
+        if settle_result:
+            round_result["effects"][:0] = settle_result["effects"]
+            round_result["damages"][:0] = settle_result["damages"]
+        log.debug("回合结算完成", game_id=room.game_id, round=engine.current_round, wins=len(round_result["wins"]),
+                  effects=len(round_result["effects"]), game_over=engine.game_over)
+        if room.journal:
+            room.journal.record_result({"round": engine.current_round, "game_over": engine.game_over, "winner": engine.winner})
+            if engine.current_round % SNAPSHOT_EVERY_ROUNDS == 0:
+                room.journal.write_snapshot(engine)
 
         # 更新任务进度
-        for player_id in self.players:
-            self.update_task_progress(player_id, None, round_result)
+        for player_id in room.players:
+            self.update_task_progress(room, player_id, None, round_result)
 
         # BOSS 战：血量削弱禁用技能
-        if self.game_engine.mode == "boss" and "boss" in round_result:
+        if engine.mode == "boss" and "boss" in round_result:
             hp_percentage = round_result["boss"]["hp"] / round_result["boss"]["max_hp"]
             if hp_percentage <= 0.8 and not round_result["boss"].get("skill_disabled_1"):
-                self.game_engine.disable_boss_skill(1)
-                emit("boss_skill_disabled", {"skill_index": 1}, broadcast=True)
+                engine.disable_boss_skill(1)
+                emit("boss_skill_disabled", {"skill_index": 1}, to=room.game_id)
             elif hp_percentage <= 0.6 and not round_result["boss"].get("skill_disabled_2"):
-                self.game_engine.disable_boss_skill(2)
-                emit("boss_skill_disabled", {"skill_index": 2}, broadcast=True)
+                engine.disable_boss_skill(2)
+                emit("boss_skill_disabled", {"skill_index": 2}, to=room.game_id)
 
         # 随机事件
-        if self.game_engine.current_round % 3 == 0:
-            self.trigger_random_event()
-
-        emit("game_state", round_result, broadcast=True)
+        self.trigger_random_event(room, round_result)
+        self.flush_tasks(room)
+
+        # 回合结果只携带变化的玩家字段，完整状态仅在开局和重新同步时下发
+        round_result.pop("players", None)
+        round_result["round"] = engine.current_round
+        delta = room.state_sync.delta(engine.get_public_players())
+        if delta:
+            round_result["delta"] = delta
+        emit("game_state_delta", round_result, to=room.game_id)
         if round_result.get("game_over"):
-            self.game_started = False
-            self.distribute_task_rewards()
-            emit("game_over", {"winner": round_result["winner"], "tasks": self.get_task_status()}, broadcast=True)
-            self.game_engine = None
-            self.game_id = None
-            self.reset_force_start()
-
-    def check_game_status(self):
-        if self.game_engine and self.game_engine.check_game_over():
-            self.game_started = False
-            result = self.game_engine.get_game_result()
-            self.distribute_task_rewards()
-            emit("game_over", {"winner": result["winner"], "tasks": self.get_task_status()}, broadcast=True)
-            self.game_engine = None
-            self.game_id = None
-            self.reset_force_start()
-
-    def broadcast_game_state(self):
-        if self.game_engine:
-            state = self.game_engine.get_public_state()
-            emit("game_state", state, broadcast=True)
-            logging.debug(f"广播游戏状态: 回合 {state['round']}")
+            room.game_started = False
+            self.distribute_task_rewards(room)
+            emit("game_over", {"winner": round_result["winner"], "tasks": self.get_task_status(room)}, to=room.game_id)
+            self.end_room(room)
+        else:
+            self.schedule_round_deadline(room)
+
+    def schedule_round_deadline(self, room):
+        # 重新登记即替换上一回合的截止时间
+        if ROUND_TIMEOUT > 0:
+            self.deadlines.schedule(room.game_id, ROUND_TIMEOUT)
+
+    def round_deadline_loop(self):
+        # 由 startup() 作为后台任务启动：每格推进一次时间轮，到期的房间按已有输入结算，缺的出拳由引擎随机补上
+        while True:
+            socketio.sleep(self.deadlines.tick)
+            for game_id in self.deadlines.advance():
+                room = self.rooms.rooms.get(game_id)
+                if not room or not room.game_started:
+                    continue
+                log.info("回合超时，自动结算", game_id=game_id, round=room.game_engine.current_round,
+                         submitted=len(room.game_engine.moves))
+                ROUND_TIMEOUTS.inc(mode=room.mode)
+                try:
+                    with app.app_context():
+                        self.process_round(room)
+                except Exception as e:
+                    log.error("超时结算失败", game_id=game_id, error=e)
+
+    def journal_sync_loop(self):
+        # 由 startup() 作为后台任务启动：日志的 fsync 平时在下一次写入时顺带进行，
+        # 没有新输入的对局在这里按 SYNC_INTERVAL 补上，未落盘的记录不会一直留在页缓存里
+        while True:
+            socketio.sleep(SYNC_INTERVAL)
+            for room in list(self.rooms.rooms.values()):
+                if room.journal:
+                    try:
+                        room.journal.sync_due()
+                    except Exception as e:
+                        log.error("同步对局日志失败", game_id=room.game_id, error=e)
+
+    def check_game_status(self, room):
+        engine = room.game_engine
+        engine.check_game_over()
+        if engine.game_over:
+            room.game_started = False
+            result = engine.get_game_result()
+            self.distribute_task_rewards(room)
+            emit("game_over", {"winner": result["winner"], "tasks": self.get_task_status(room)}, to=room.game_id)
+            self.end_room(room)
+
+    def end_room(self, room):
+        # 从快照恢复的对局缺少快照之前的输入，无法导出录像
+        if RECORD_DIR and not room.game_engine.input_base:
+            try:
+                path = save_record(room.game_engine, RECORD_DIR, room.game_id)
+                log.debug("对局录像已保存", game_id=room.game_id, path=path)
+            except Exception as e:
+                log.error("保存对局录像失败", game_id=room.game_id, error=e)
+        self.deadlines.cancel(room.game_id)
+        for pid in self.rooms.close_room(room.game_id):
+            leave_room(room.game_id, sid=pid, namespace=self.namespace)
+        # 先关房间再关日志：关日志要等 executor，期间收到 game_over 的玩家可能已经重新排队
+        if room.journal:
+            room.game_engine.journal = None
+            room.journal.close(finished=True)
+
+    def open_journal(self, room):
+        try:
+            room.journal = GameJournal(JOURNAL_DIR, room.game_id, executor=self.db.executor)
+            engine = room.game_engine
+            room.journal.write_meta({
+                "game_id": room.game_id,
+                "mode": engine.mode,
+                "seed": engine.seed,
+                "players": engine.player_ids,
+                "room_players": {pid: {"username": info["username"]} for pid, info in room.players.items()}
+            })
+            # 开局前已有的输入（一般为空）也写入日志
+            for entry in engine.inputs:
+                room.journal.append(entry)
+            engine.journal = room.journal
+        except Exception as e:
+            room.journal = None
+            log.error("打开对局日志失败", game_id=room.game_id, error=e)
+
+    def recover_rooms(self):
+        # 服务器重启：从日志和快照重建未结束的对局，等待玩家重新登录
+        for meta, engine, journal in recover_games(JOURNAL_DIR, executor=self.db.executor):
+            players = {}
+            for pid in engine.players:
+                info = meta["room_players"].get(pid) or {"username": engine.players[pid].username}
+                players[pid] = {"username": info["username"], "proficiency": 0}
+            room = self.rooms.restore_room(meta["game_id"], players, engine)
+            room.journal = journal
+            room.game_started = engine.all_players_ready()
+            room.tasks = TaskTracker(info["username"] for info in players.values())
+            try:
+                room.tasks.restore(self.db.task_status(info["username"] for info in players.values()))
+            except Exception as e:
+                log.error("恢复任务进度失败", game_id=room.game_id, error=e)
+            log.info("已恢复对局", game_id=room.game_id, round=engine.current_round, players=list(room.orphans))
+
+    def rejoin_recovered_game(self, username, player_id):
+        room = self.rooms.find_orphan(username)
+        if not room:
+            return
+        old_id = self.rooms.rebind_player(room, username, player_id, self.players[player_id])
+        join_room(room.game_id, sid=player_id)
+        log.info("玩家重新加入对局", username=username, game_id=room.game_id, old_id=old_id, player_id=player_id)
+        state = room.game_engine.get_public_state(viewer_id=player_id)
+        emit("game_start", {"game_id": room.game_id, "mode": room.mode, "players": state["players"], "boss": None}, to=player_id)
+        if room.game_started:
+            # 玩家 id 变了，整个房间重新下发完整状态作为新的增量基准
+            self.broadcast_game_state(room)
+            # 恢复的对局在有玩家回来之后才开始计时
+            if room.game_started and room.game_id not in self.deadlines:
+                self.schedule_round_deadline(room)
+
+    def broadcast_game_state(self, room):
+        state = room.state_sync.reset(room.game_engine.get_public_state())
+        emit("game_state", state, to=room.game_id)
+        log.debug("广播游戏状态", game_id=room.game_id, round=state["round"], version=state["version"])
+
+    def on_request_resync(self, data):
+        # 客户端发现增量版本不连续时请求完整状态，只发给请求者
+        room = self.rooms.room_of(request.sid)
+        if not room:
+            return
+        state = room.state_sync.snapshot(room.game_engine.get_public_state(viewer_id=request.sid))
+        emit("game_state", state, to=request.sid)
+        log.debug("重新同步", player_id=request.sid, game_id=room.game_id, version=state["version"])
 
-    def get_player_list(self):
+    def local_player_list(self):
         return [{"player_id": pid, "username": info["username"]} for pid, info in self.players.items()]
 
-    def broadcast_player_list(self):
-        emit("update_player_list", {"players": self.get_player_list()}, broadcast=True)
-
-    def reset_force_start(self):
-        for player in self.players.values():
-            player["force_start"] = False
-            player["mode_vote"] = None
+    def get_player_list(self):
+        players = self.local_player_list()
+        for worker in sorted(self.remote_players):
+            players.extend(self.remote_players[worker])
+        return players
 
-    def initialize_tasks(self):
+    def broadcast_player_list(self):
+        emit("update_player_list", {"players": self.get_player_list()}, to=self.lobby_room)
+        self.publish_player_list()
+
+    def publish_player_list(self, request_reply=False):
+        # 把本进程的玩家列表同步给其他工作进程；request_reply 时请它们回发各自的列表
+        if client_manager:
+            client_manager.notify_peers("lobby_players", WORKER_INDEX, self.local_player_list(), request_reply)
+
+    def update_remote_players(self, worker, players, request_reply=False):
+        # 其他工作进程的玩家列表经中转到达，合并后发给本进程大厅里的玩家
+        self.remote_players[worker] = players
+        emit("update_player_list", {"players": self.get_player_list()}, to=self.lobby_room)
+        if request_reply:
+            self.publish_player_list()
+
+    def initialize_tasks(self, room):
+        room.tasks = TaskTracker(info["username"] for info in room.players.values())
+        self.flush_tasks(room)
+
+    def flush_tasks(self, room):
+        # 回合结束或游戏结束时把本局变化的任务进度一次性写回
+        if not room.tasks:
+            return
         try:
-            conn = sqlite3.connect("ten_steps.db")
-            cursor = conn.cursor()
-            for player_id, info in self.players.items():
-                username = info["username"]
-                tasks = [
-                    ("output", 0, False),
-                    ("control", 0, False),
-                    ("regen", 0, False),
-                    ("defense", 0, False)
-                ]
-                for task_type, progress, completed in tasks:
-                    cursor.execute("""
-                        INSERT OR REPLACE INTO tasks (username, task_type, progress, completed)
-                        VALUES (?, ?, ?, ?)
-                    """, (username, task_type, progress, completed))
-            conn.commit()
-            conn.close()
+            room.tasks.flush(self.db)
         except Exception as e:
-            logging.error(f"初始化任务失败: {str(e)}")
+            log.error("保存任务进度失败", game_id=room.game_id, error=e)
 
-    def update_task_progress(self, player_id, skill_name, result):
-        if not self.game_engine or player_id not in self.players:
+    def update_task_progress(self, room, player_id, skill_name, result):
+        if player_id not in room.players or not room.tasks:
             return
-        username = self.players[player_id]["username"]
-        player = self.game_engine.players.get(player_id)
+        username = room.players[player_id]["username"]
+        player = room.game_engine.players.get(player_id)
         if not player:
             return
 
+        # 输出流：3回合内造成15点伤害
+        if "damage_dealt" in result:
+            room.tasks.record(username, "output", result["damage_dealt"].get(player_id, 0))
+        # 控制流：使用3次控制技能并胜利
+        if skill_name and room.game_engine.is_control_skill(skill_name) and result.get("win", False):
+            room.tasks.record(username, "control")
+        # 回复流：以回复流角色存活5回合
+        if player.style == "回复流" and player.is_alive:
+            room.tasks.record(username, "regen")
+        # 防御流：3回合内规避2次伤害
+        if "evasions" in result:
+            room.tasks.record(username, "defense", result["evasions"].get(player_id, 0))
+
+    def distribute_task_rewards(self, room):
+        engine = room.game_engine
+        if not room.tasks:
+            return
+        self.flush_tasks(room)
         try:
-            conn = sqlite3.connect("ten_steps.db")
-            cursor = conn.cursor()
-
-            # 输出流：3回合内造成15点伤害
-            if "damage_dealt" in result:
-                cursor.execute("""
-                    UPDATE tasks SET progress = progress + ? WHERE username = ? AND task_type = 'output' AND completed = FALSE
-                """, (result["damage_dealt"].get(player_id, 0), username))
-                cursor.execute("SELECT progress FROM tasks WHERE username = ? AND task_type = 'output'", (username,))
-                progress = cursor.fetchone()[0]
-                if progress >= 15:
-                    cursor.execute("UPDATE tasks SET completed = TRUE WHERE username = ? AND task_type = 'output'", (username,))
-
-            # 控制流：使用3次控制技能并胜利
-            if skill_name and self.game_engine.is_control_skill(skill_name) and result.get("win", False):
-                cursor.execute("""
-                    UPDATE tasks SET progress = progress + 1 WHERE username = ? AND task_type = 'control' AND completed = FALSE
-                """, (username,))
-                cursor.execute("SELECT progress FROM tasks WHERE username = ? AND task_type = 'control'", (username,))
-                progress = cursor.fetchone()[0]
-                if progress >= 3:
-                    cursor.execute("UPDATE tasks SET completed = TRUE WHERE username = ? AND task_type = 'control'", (username,))
-
-            # 回复流：以回复流角色存活5回合
-            if player.get("style") == "回复流" and player["is_alive"]:
-                cursor.execute("""
-                    UPDATE tasks SET progress = progress + 1 WHERE username = ? AND task_type = 'regen' AND completed = FALSE
-                """, (username,))
-                cursor.execute("SELECT progress FROM tasks WHERE username = ? AND task_type = 'regen'", (username,))
-                progress = cursor.fetchone()[0]
-                if progress >= 5:
-                    cursor.execute("UPDATE tasks SET completed = TRUE WHERE username = ? AND task_type = 'regen'", (username,))
-
-            # 防御流：3回合内规避2次伤害
-            if "evasions" in result:
-                cursor.execute("""
-                    UPDATE tasks SET progress = progress + ? WHERE username = ? AND task_type = 'defense' AND completed = FALSE
-                """, (result["evasions"].get(player_id, 0), username))
-                cursor.execute("SELECT progress FROM tasks WHERE username = ? AND task_type = 'defense'", (username,))
-                progress = cursor.fetchone()[0]
-                if progress >= 2:
-                    cursor.execute("UPDATE tasks SET completed = TRUE WHERE username = ? AND task_type = 'defense'", (username,))
-
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            logging.error(f"更新任务进度失败: {str(e)}")
-
-    def distribute_task_rewards(self):
-        try:
-            conn = sqlite3.connect("ten_steps.db")
-            cursor = conn.cursor()
-            for player_id, info in self.players.items():
+            for player_id, info in room.players.items():
                 username = info["username"]
-                cursor.execute("SELECT task_type FROM tasks WHERE username = ? AND completed = TRUE", (username,))
-                completed_tasks = cursor.fetchall()
                 rewards = []
-                for (task_type,) in completed_tasks:
+                for task_type in room.tasks.completed(username):
                     if task_type == "output":
-                        self.game_engine.grant_win(player_id, 1)
+                        engine.grant_win(player_id, 1)
                         rewards.append({"task": "output", "reward": "1胜局"})
                     elif task_type == "control":
-                        self.game_engine.adjust_hp(player_id, 2)
+                        engine.adjust_hp(player_id, 2)
                         rewards.append({"task": "control", "reward": "血量+2"})
                     elif task_type == "regen":
-                        self.game_engine.unlock_temp_skill(player_id, "吃个桃桃")
+                        engine.unlock_temp_skill(player_id, "吃个桃桃")
                         rewards.append({"task": "regen", "reward": "临时解锁‘吃个桃桃’"})
                     elif task_type == "defense":
-                        self.game_engine.grant_block(player_id, 1)
+                        engine.grant_block(player_id, 1)
                         rewards.append({"task": "defense", "reward": "1格挡"})
                 if rewards:
                     emit("task_rewards", {"username": username, "rewards": rewards}, to=player_id)
-            conn.close()
-        except Exception as e:
-            logging.error(f"分发任务奖励失败: {str(e)}")
-
-    def trigger_random_event(self):
-        events = [
-            {"type": "heal_all", "value": 2, "description": "全场血量+2"},
-            {"type": "disable_control", "duration": 1, "description": "禁用控制技能1回合"}
-        ]
-        event = events[self.game_engine.current_round % len(events)]  # 简单轮换
-        self.game_engine.apply_random_event(event)
-        emit("random_event", {"event": event["description"]}, broadcast=True)
-        logging.debug(f"触发随机事件: {event['description']}")
-
-    def get_task_status(self):
-        try:
-            conn = sqlite3.connect("ten_steps.db")
-            cursor = conn.cursor()
-            status = {}
-            for player_id, info in self.players.items():
-                username = info["username"]
-                cursor.execute("SELECT task_type, progress, completed FROM tasks WHERE username = ?", (username,))
-                tasks = cursor.fetchall()
-                status[username] = [{"type": t, "progress": p, "completed": c} for t, p, c in tasks]
-            conn.close()
-            return status
         except Exception as e:
-            logging.error(f"获取任务状态失败: {str(e)}")
+            log.error("分发任务奖励失败", game_id=room.game_id, error=e)
+
+    def trigger_random_event(self, room, round_result):
+        # 随机事件由引擎在回合结算时触发（使用对局种子，可重放），这里只通知客户端
+        for effect in round_result.get("effects", []):
+            if effect.startswith("随机事件: "):
+                description = effect[len("随机事件: "):]
+                emit("random_event", {"event": description}, to=room.game_id)
+                log.debug("触发随机事件", game_id=room.game_id, description=description)
+
+    def get_task_status(self, room):
+        if not room.tasks:
             return {}
-
-socketio.on_namespace(GameNamespace("/game"))
+        return room.tasks.status(info["username"] for info in room.players.values())
+
+game_namespace = GameNamespace("/game")
+socketio.on_namespace(game_namespace)
+game_namespace.register_metrics()
+if client_manager:
+    client_manager.on_remote("receive_chat", game_namespace.append_remote_chat)
+    client_manager.on_remote("lobby_players", game_namespace.update_remote_players)
+# 退出时把尚未落库的聊天消息写完
+atexit.register(game_namespace.chat_writer.close)
+
+def startup():
+    configure_logging()
+    init_db()
+    game_namespace.warm_chat_history()
+    game_namespace.recover_rooms()
+    socketio.start_background_task(game_namespace.matchmaking_loop)
+    socketio.start_background_task(game_namespace.round_deadline_loop)
+    socketio.start_background_task(game_namespace.journal_sync_loop)
+    if client_manager and not socketio.server.manager_initialized:
+        # 默认在第一个客户端连接时才连上中转，这之前其他进程的广播（聊天历史）会丢失
+        socketio.server.manager_initialized = True
+        client_manager.initialize()
+        # 启动时发一份空列表（其他进程据此清掉本进程重启前的玩家），并请它们回发各自的列表
+        game_namespace.publish_player_list(request_reply=True)
 
 if __name__ == "__main__":
-    init_db()
+    # 开发用入口；生产环境用 serve.py
+    startup()
     socketio.run(app, host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,193 @@
+import time
+import random
+import logging
+import argparse
+from typing import Dict, List, Any, Optional, Tuple
+from game_logic import GameEngine
+from player_state import Style, MOVE_LABELS
+from replay import state_digest
+
+MODES = ("standard", "boss", "infinite")
+STYLE_NAMES = tuple(s.value for s in Style)
+
+class RandomPolicy:
+    # 随机玩家：随机选角色/流派/出拳，有胜局时按概率随机放技能
+    def __init__(self, rng: random.Random, skill_chance: float = 0.5):
+        self.rng = rng
+        self.skill_chance = skill_chance
+
+    def choose_character(self, engine: GameEngine, player_id: str) -> Tuple[str, str, List[str]]:
+        character = self.rng.choice(engine.catalog.character_names)
+        style = self.rng.choice(STYLE_NAMES)
+        selected = []
+        if engine.mode == "infinite":
+            pool = [name for name in engine.catalog.skill_names if not name.startswith("BOSS_")]
+            selected = self.rng.sample(pool, 5)
+        return character, style, selected
+
+    def choose_move(self, engine: GameEngine, player_id: str) -> str:
+        return self.rng.choice(MOVE_LABELS)
+
+    def choose_skill(self, engine: GameEngine, player_id: str) -> Optional[Tuple[str, List[str], Dict]]:
+        player = engine.players[player_id]
+        if player.wins <= 0 or self.rng.random() >= self.skill_chance:
+            return None
+        usable = []
+        for name in player.available_skills:
+            skill_data = engine.skills.get_skill(name) or engine.get_boss_skill(name)
+            if skill_data and "target_type" in skill_data and player.skill_cooldowns.get(name, 0) <= 0:
+                usable.append((name, skill_data))
+        if not usable:
+            return None
+        name, skill_data = self.rng.choice(usable)
+        return name, self.choose_targets(engine, player_id, skill_data), {}
+
+    def choose_targets(self, engine: GameEngine, player_id: str, skill_data: Dict) -> List[str]:
+        target_type = skill_data["target_type"]
+        alive = [pid for pid, p in engine.players.items() if p.is_alive]
+        enemies = [pid for pid in alive if pid != player_id]
+        if target_type == "self" or not enemies:
+            return [player_id]
+        if target_type in ("all_others", "all_players_except_self"):
+            return enemies
+        if target_type == "two_enemies":
+            return self.rng.sample(enemies, 2) if len(enemies) >= 2 else enemies[:1]
+        if target_type == "two_any":
+            return self.rng.sample(alive, 2) if len(alive) >= 2 else alive[:1]
+        if target_type == "single_any":
+            return [self.rng.choice(alive)]
+        return [self.rng.choice(enemies)]
+
+def play_game(mode: str, player_count: int, policy: RandomPolicy, max_rounds: int = 200,
+              seed: Optional[int] = None, keep_record: bool = False) -> Dict[str, Any]:
+    player_ids = [f"p{i}" for i in range(player_count)]
+    # 引擎种子默认取自策略的随机数发生器，整批对局由同一个种子决定
+    engine = GameEngine(player_ids, mode=mode, seed=seed if seed is not None else policy.rng.getrandbits(63))
+    picks = {}
+    for pid in player_ids:
+        character, style, selected = policy.choose_character(engine, pid)
+        engine.select_character(pid, character, style, f"玩家{pid}", selected)
+        picks[pid] = (character, style)
+
+    round_times = []
+    skills_used = skills_failed = 0
+    skill_uses: Dict[str, List[str]] = {pid: [] for pid in player_ids}
+    while not engine.game_over and engine.current_round < max_rounds:
+        start = time.perf_counter()
+        # 技能阶段：有胜局的玩家放技能，然后结算
+        pending = False
+        for pid, player in engine.players.items():
+            if not player.is_alive:
+                continue
+            if player.character is None:
+                # 无限乱斗复活后需要重新选择角色
+                character, style, selected = policy.choose_character(engine, pid)
+                engine.select_character(pid, character, style, player.username, selected)
+            choice = policy.choose_skill(engine, pid)
+            if choice:
+                result = engine.use_skill(pid, *choice, consume_win=True)
+                if result["success"]:
+                    skills_used += 1
+                    skill_uses[pid].append(choice[0])
+                    pending = True
+                else:
+                    skills_failed += 1
+        if pending:
+            engine.settle_damage()
+
+        # 猜拳阶段
+        if not engine.game_over:
+            for pid, player in engine.players.items():
+                if player.is_alive and not (mode == "boss" and pid == engine.boss_id):
+                    engine.submit_move(pid, policy.choose_move(engine, pid))
+            engine.process_round()
+        round_times.append(time.perf_counter() - start)
+
+    winner_id = next((pid for pid, p in engine.players.items() if p.username == engine.winner), None)
+    record = None
+    if keep_record:
+        # 与 save_record 一样附上终局摘要，回放时据此校验
+        record = engine.export_record()
+        record["digest"] = state_digest(engine)
+    return {
+        "mode": mode,
+        "rounds": engine.current_round,
+        "round_times": round_times,
+        "game_over": engine.game_over,
+        "winner": engine.winner,
+        "winner_character": engine.players[winner_id].character if winner_id else None,
+        "skills_used": skills_used,
+        "skills_failed": skills_failed,
+        "seed": engine.seed,
+        "record": record,
+        # 开局时的角色/流派（无限乱斗复活后可能更换）
+        "players": [{
+            "player_id": pid,
+            "character": picks[pid][0],
+            "style": picks[pid][1],
+            "is_boss": pid == engine.boss_id,
+            "won": pid == winner_id,
+            "skills": skill_uses[pid],
+        } for pid in player_ids],
+    }
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def simulate(games: int, mode: str = "standard", player_count: int = 4, seed: Optional[int] = None,
+             max_rounds: int = 200, skill_chance: float = 0.5) -> Dict[str, Any]:
+    policy = RandomPolicy(random.Random(seed), skill_chance)
+    round_times = []
+    rounds = unfinished = skills_used = skills_failed = 0
+    start = time.perf_counter()
+    for _ in range(games):
+        result = play_game(mode, player_count, policy, max_rounds)
+        rounds += result["rounds"]
+        round_times.extend(result["round_times"])
+        skills_used += result["skills_used"]
+        skills_failed += result["skills_failed"]
+        if not result["game_over"]:
+            unfinished += 1
+    elapsed = time.perf_counter() - start
+
+    round_times.sort()
+    return {
+        "mode": mode,
+        "players": player_count,
+        "games": games,
+        "unfinished": unfinished,
+        "rounds": rounds,
+        "skills_used": skills_used,
+        "skills_failed": skills_failed,
+        "elapsed": elapsed,
+        "games_per_sec": games / elapsed if elapsed else 0.0,
+        "rounds_per_sec": rounds / elapsed if elapsed else 0.0,
+        "round_p50_ms": percentile(round_times, 0.50) * 1000,
+        "round_p99_ms": percentile(round_times, 0.99) * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="十步拳无界面对局模拟器")
+    parser.add_argument("--games", type=int, default=200, help="每种模式的对局数")
+    parser.add_argument("--mode", choices=MODES + ("all",), default="all")
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--max-rounds", type=int, default=200, help="单局回合上限，超过视为未结束")
+    parser.add_argument("--skill-chance", type=float, default=0.5, help="有胜局时使用技能的概率")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    modes = MODES if args.mode == "all" else (args.mode,)
+    for mode in modes:
+        report = simulate(args.games, mode, args.players, args.seed, args.max_rounds, args.skill_chance)
+        print(f"[{mode}] {report['games']} 局 / {report['rounds']} 回合, 耗时 {report['elapsed']:.2f}s, "
+              f"未结束 {report['unfinished']} 局")
+        print(f"  {report['games_per_sec']:,.1f} 局/秒  {report['rounds_per_sec']:,.0f} 回合/秒  "
+              f"回合耗时 p50 {report['round_p50_ms']:.3f}ms  p99 {report['round_p99_ms']:.3f}ms")
+        print(f"  技能使用 {report['skills_used']} 次, 失败 {report['skills_failed']} 次")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
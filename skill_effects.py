@@ -0,0 +1,377 @@
+import random
+from typing import Dict, List, Any, Optional, Callable, Tuple
+from player_state import PlayerState, Style
+
+STYLES = tuple(Style)
+
+# 效果op签名: op(user, target_ids, game_state, params, effects) -> 失败时返回结果字典，否则返回 None
+EffectOp = Callable[[PlayerState, List[str], Dict, Dict, List[str]], Optional[Dict]]
+
+# buff 属性在玩家 effect_data 中的键名（update_buffs 按 "heal" 结算每回合回复）
+BUFF_STAT_KEYS = {"heal_over_time": "heal"}
+
+def player_index(game_state: Dict) -> Dict[str, PlayerState]:
+    # 引擎传入的 game_state 自带 player_index（即引擎自身的 players 字典）；其他来源的状态在首次查找时补建
+    index = game_state.get("player_index")
+    if index is None:
+        index = game_state["player_index"] = {p.player_id: p for p in game_state["players"]}
+    return index
+
+def _find_player(game_state: Dict, player_id: str) -> Optional[PlayerState]:
+    return player_index(game_state).get(player_id)
+
+def _buff_total(player: PlayerState, key: str) -> float:
+    return player.buffs.total(key)
+
+def _tally(game_state: Dict, key: str, player_id: str, amount: float):
+    # 累计到引擎的 round_stats（任务进度用）；其他来源的 game_state 没有 stats 时忽略
+    stats = game_state.get("stats")
+    if stats is not None and amount:
+        bucket = stats[key]
+        bucket[player_id] = bucket.get(player_id, 0) + amount
+
+def handle_death(player: PlayerState, game_state: Dict):
+    if "不屈不挠" in player.available_skills:
+        player.hp = 1
+        player.buffs.append({
+            "name": "shield",
+            "duration": 3,
+            "effect_data": {"damage_reduction": 2}
+        })
+        player.available_skills.remove("不屈不挠")
+        return
+
+    player.is_alive = False
+    player.death_round = game_state.get("round", 0)
+
+def _resolve_style(effect: Dict[str, Any], style: Optional[str]) -> Dict[str, Any]:
+    bonus = effect.get("style_bonus", {}).get(style) if style else None
+    if not bonus:
+        return effect
+    resolved = dict(effect)
+    absolute = bonus.get("is_absolute", False)
+    for key, value in bonus.items():
+        if key == "is_absolute":
+            continue
+        resolved[key] = value if absolute else resolved.get(key, 0) + value
+    return resolved
+
+def _self_damage(user: PlayerState, amount: float, effects: List[str]):
+    if amount > 0:
+        user.hp = max(0, user.hp - amount)
+        effects.append(f"{user.username} 损失了 {amount} 点生命值")
+
+# ---- 消耗 ----
+
+def _op_cost_hp(value: float) -> EffectOp:
+    def op(user, target_ids, game_state, params, effects):
+        _self_damage(user, value, effects)
+    return op
+
+def _op_cost_max_hp(value: float) -> EffectOp:
+    def op(user, target_ids, game_state, params, effects):
+        user.max_hp = max(1, user.max_hp - value)
+        user.hp = min(user.hp, user.max_hp)
+        effects.append(f"{user.username} 血量上限减少 {value}")
+    return op
+
+# ---- 效果 ----
+
+def _op_direct_damage(effect: Dict, skill: Dict) -> EffectOp:
+    base = effect.get("value", 0)
+    if effect.get("target") == "self":
+        def op(user, target_ids, game_state, params, effects):
+            _self_damage(user, base, effects)
+            if user.hp <= 0:
+                handle_death(user, game_state)
+        return op
+
+    true_damage = effect.get("true_damage", False)
+    ignore_source_buffs = effect.get("ignore_source_buffs", False) or skill.get("ignore_buffs_on_execution", False)
+
+    def op(user, target_ids, game_state, params, effects):
+        damage = base
+        if not ignore_source_buffs:
+            damage = damage + _buff_total(user, "damage_bonus")
+        for target_id in target_ids:
+            target = _find_player(game_state, target_id)
+            if not target or not target.is_alive:
+                continue
+            actual_damage = damage
+
+            # 检查规避
+            if not true_damage and target.evasion > 0:
+                target.evasion -= 1
+                _tally(game_state, "evasions", target.player_id, 1)
+                effects.append(f"{target.username} 规避了攻击")
+                continue
+
+            # 应用减伤
+            if not true_damage:
+                actual_damage = max(1, actual_damage - _buff_total(target, "damage_reduction"))
+
+            target.hp = max(0, target.hp - actual_damage)
+            _tally(game_state, "damage_dealt", user.player_id, actual_damage)
+            effects.append(f"{target.username} 受到 {actual_damage} 点伤害")
+            if target.hp <= 0:
+                handle_death(target, game_state)
+    return op
+
+def _op_heal(effect: Dict, skill: Dict) -> EffectOp:
+    base = effect.get("value", 0)
+
+    def op(user, target_ids, game_state, params, effects):
+        heal = base + _buff_total(user, "heal_bonus")
+        for target_id in target_ids:
+            target = _find_player(game_state, target_id)
+            if not target or not target.is_alive:
+                continue
+            old_hp = target.hp
+            target.hp = min(target.max_hp, target.hp + heal)
+            actual_heal = target.hp - old_hp
+            if actual_heal > 0:
+                effects.append(f"{target.username} 恢复了 {actual_heal} 点生命值")
+    return op
+
+def _op_control(effect: Dict, skill: Dict) -> EffectOp:
+    turns = effect.get("duration", 1)
+
+    def op(user, target_ids, game_state, params, effects):
+        for target_id in target_ids:
+            target = _find_player(game_state, target_id)
+            if not target or not target.is_alive:
+                continue
+            target.debuffs.append({
+                "name": "controlled",
+                "duration": turns,
+                "effect_data": {"controlled": True, "controller": user.player_id}
+            })
+            effects.append(f"{target.username} 被控制 {turns} 回合")
+    return op
+
+def _op_buff(effect: Dict, skill: Dict) -> EffectOp:
+    name = skill["name"]
+    duration = effect.get("duration", 1)
+    effect_data = {}
+    stat = effect.get("stat")
+    if stat:
+        effect_data[BUFF_STAT_KEYS.get(stat, stat)] = effect.get("value", True)
+    for key in ("control_duration", "skill_name"):
+        if key in effect:
+            effect_data[key] = effect[key]
+
+    def op(user, target_ids, game_state, params, effects):
+        for target_id in target_ids:
+            target = _find_player(game_state, target_id)
+            if not target or not target.is_alive:
+                continue
+            target.buffs.append({"name": name, "duration": duration, "effect_data": dict(effect_data)})
+            effects.append(f"{target.username} 获得 {name} 增益")
+    return op
+
+def _op_gain_evasion(effect: Dict, skill: Dict) -> EffectOp:
+    value = effect.get("value", 1)
+
+    def op(user, target_ids, game_state, params, effects):
+        user.evasion += value
+        effects.append(f"{user.username} 获得 {value} 次规避")
+    return op
+
+def _op_delayed_effect(effect: Dict, skill: Dict) -> EffectOp:
+    # 附加在最长的 buff 上，buff 结束时由 update_buffs 结算
+    inner = effect.get("effect", {})
+    duration = max((e.get("duration", 1) for e in skill["effects"] if e.get("type") == "buff"), default=1)
+    name = skill["name"]
+    value = inner.get("value", 0)
+
+    def op(user, target_ids, game_state, params, effects):
+        user.buffs.append({"name": name, "duration": duration, "effect_data": {"delayed_damage": value}})
+    return op
+
+def _debuff_entry(debuff: Dict, skill: Dict) -> Tuple[str, Dict]:
+    debuff_type = debuff.get("type")
+    duration = debuff.get("duration", 1)
+    if debuff_type == "heal_over_time":
+        return "buffs", {"name": skill["name"] + "_regen", "duration": duration, "effect_data": {"heal": debuff.get("value", 1)}}
+    return "debuffs", {"name": debuff_type, "duration": duration, "effect_data": {debuff_type: debuff.get("value", True)}}
+
+def _op_apply_debuff_to_target(effect: Dict, skill: Dict) -> EffectOp:
+    bucket, entry = _debuff_entry(effect.get("debuff", {}), skill)
+
+    def op(user, target_ids, game_state, params, effects):
+        for target_id in target_ids:
+            target = _find_player(game_state, target_id)
+            if not target or not target.is_alive:
+                continue
+            getattr(target, bucket).append({**entry, "effect_data": dict(entry["effect_data"])})
+            effects.append(f"{target.username} 获得 {entry['name']} 效果，持续 {entry['duration']} 回合")
+    return op
+
+def _op_apply_debuff_to_self(effect: Dict, skill: Dict) -> EffectOp:
+    bucket, entry = _debuff_entry(effect.get("debuff", {}), skill)
+
+    def op(user, target_ids, game_state, params, effects):
+        getattr(user, bucket).append({**entry, "effect_data": dict(entry["effect_data"])})
+    return op
+
+def _coin_result(user: PlayerState, params: Dict, game_state: Dict) -> Any:
+    # 返回 True/False 表示正反面；消耗胜局失败时返回结果字典
+    if params and params.get("use_win", False):
+        if user.wins <= 0:
+            return {"success": False, "message": "没有胜局可用"}
+        user.wins -= 1
+        return params.get("coin_choice", True)
+    # 使用引擎的随机数发生器，保证对局可复现
+    return game_state.get("rng", random).choice([True, False])
+
+def _op_coin_flip_damage(effect: Dict, skill: Dict) -> EffectOp:
+    faces = {
+        True: ("硬币结果：正面", effect.get("heads", {})),
+        False: ("硬币结果：反面", effect.get("tails", {})),
+    }
+
+    def op(user, target_ids, game_state, params, effects):
+        coin = _coin_result(user, params, game_state)
+        if isinstance(coin, dict):
+            return coin
+        label, face = faces[coin]
+        effects.append(label)
+        _self_damage(user, face.get("self_damage", 0), effects)
+        target = _find_player(game_state, target_ids[0]) if target_ids else None
+        if target and target.is_alive:
+            enemy_damage = face.get("enemy_damage", 0)
+            target.hp = max(0, target.hp - enemy_damage)
+            _tally(game_state, "damage_dealt", user.player_id, enemy_damage)
+            effects.append(f"{target.username} 受到 {enemy_damage} 点伤害")
+            if target.hp <= 0:
+                handle_death(target, game_state)
+    return op
+
+def _op_coin_flip_effect(effect: Dict, skill: Dict, style: Optional[str]) -> EffectOp:
+    faces = {
+        True: ("硬币结果：正面", _compile_effects(effect.get("heads", []), skill, style)),
+        False: ("硬币结果：反面", _compile_effects(effect.get("tails", []), skill, style)),
+    }
+
+    def op(user, target_ids, game_state, params, effects):
+        coin = _coin_result(user, params, game_state)
+        if isinstance(coin, dict):
+            return coin
+        label, chain = faces[coin]
+        effects.append(label)
+        return run_chain(chain, user, [user.player_id], game_state, params, effects)
+    return op
+
+def _op_duel_initiate(effect: Dict, skill: Dict) -> EffectOp:
+    rounds = skill.get("duel_rounds", 1)
+    rules = effect.get("rules", skill["name"])
+
+    def op(user, target_ids, game_state, params, effects):
+        if not target_ids:
+            return {"success": False, "message": "需要选择单挑对象"}
+        target = _find_player(game_state, target_ids[0])
+        if not target or not target.is_alive:
+            return {"success": False, "message": "目标无效"}
+        game_state["special_state"] = {
+            "type": "duel",
+            "players": [user.player_id, target.player_id],
+            "rounds": rounds,
+            "current_round": 0,
+            "rules": rules,
+        }
+        effects.append(f"{user.username} 向 {target.username} 发起单挑")
+    return op
+
+def _op_gain_wins(effect: Dict, skill: Dict) -> EffectOp:
+    value = effect.get("value", 1)
+
+    def op(user, target_ids, game_state, params, effects):
+        user.wins += value
+        effects.append(f"{user.username} 获得 {value} 胜局")
+    return op
+
+# effects 中的 type -> op 工厂；未列出的类型（被动触发、历史回溯等）由引擎其他部分处理，编译时跳过
+EFFECT_COMPILERS: Dict[str, Callable[[Dict, Dict], EffectOp]] = {
+    "direct_damage": _op_direct_damage,
+    "heal": _op_heal,
+    "control": _op_control,
+    "buff": _op_buff,
+    "gain_evasion": _op_gain_evasion,
+    "delayed_effect": _op_delayed_effect,
+    "apply_debuff_to_target": _op_apply_debuff_to_target,
+    "apply_debuff_to_self": _op_apply_debuff_to_self,
+    "coin_flip_damage": _op_coin_flip_damage,
+    "duel_initiate": _op_duel_initiate,
+    "gain_wins": _op_gain_wins,
+}
+
+COST_COMPILERS: Dict[str, Callable[[float], EffectOp]] = {
+    "hp": _op_cost_hp,
+    "max_hp": _op_cost_max_hp,
+}
+
+def _compile_effects(effect_list: List[Dict], skill: Dict, style: Optional[str]) -> Tuple[EffectOp, ...]:
+    chain = []
+    for effect in effect_list:
+        effect = _resolve_style(effect, style)
+        effect_type = effect.get("type")
+        if effect_type == "coin_flip_effect":
+            chain.append(_op_coin_flip_effect(effect, skill, style))
+        elif effect_type in EFFECT_COMPILERS:
+            chain.append(EFFECT_COMPILERS[effect_type](effect, skill))
+    return tuple(chain)
+
+def run_chain(chain: Tuple[EffectOp, ...], user: PlayerState, target_ids: List[str], game_state: Dict,
+              params: Dict, effects: List[str]) -> Optional[Dict]:
+    for op in chain:
+        failure = op(user, target_ids, game_state, params, effects)
+        if failure:
+            return failure
+    return None
+
+class CompiledSkill:
+    __slots__ = ("name", "cooldown", "charge_time", "costs", "chains")
+
+    def __init__(self, skill_data: Dict[str, Any]):
+        self.name = skill_data["name"]
+        self.cooldown = skill_data.get("cooldown", 0)
+        self.charge_time = skill_data.get("charge_time", 0)
+        self.costs = tuple(COST_COMPILERS[c["type"]](c.get("value", 0))
+                           for c in skill_data.get("costs", []) if c.get("type") in COST_COMPILERS)
+        # 按流派预先结算 style_bonus，None 为无流派
+        effect_list = skill_data.get("effects", [])
+        self.chains = {None: _compile_effects(effect_list, skill_data, None)}
+        for style in STYLES:
+            self.chains[style] = _compile_effects(effect_list, skill_data, style)
+
+    def execute(self, user: PlayerState, target_ids: List[str], game_state: Dict, params: Optional[Dict] = None) -> Dict:
+        effects: List[str] = []
+        params = params or {}
+        failure = run_chain(self.costs, user, target_ids, game_state, params, effects)
+        if failure:
+            return failure
+        if self.charge_time > 0:
+            user.charge_skills[self.name] = {
+                "remaining_time": self.charge_time,
+                "target_ids": list(target_ids),
+            }
+            return {
+                "success": True,
+                "effects": effects + [f"{user.username} 开始蓄力 {self.name}"],
+                "message": f"需要蓄力 {self.charge_time} 回合"
+            }
+        return self._run(user, target_ids, game_state, params, effects)
+
+    def release(self, user: PlayerState, target_ids: List[str], game_state: Dict) -> Dict:
+        # 蓄力完成后发动，消耗已在开始蓄力时结算
+        return self._run(user, target_ids, game_state, {}, [])
+
+    def _run(self, user: PlayerState, target_ids: List[str], game_state: Dict, params: Dict, effects: List[str]) -> Dict:
+        chain = self.chains.get(user.style, self.chains[None])
+        failure = run_chain(chain, user, target_ids, game_state, params, effects)
+        if failure:
+            return failure
+        return {"success": True, "effects": effects}
+
+def compile_skill(skill_data: Dict[str, Any]) -> CompiledSkill:
+    return CompiledSkill(skill_data)
\ No newline at end of file
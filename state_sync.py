@@ -0,0 +1,60 @@
+from typing import Dict, List, Any, Optional
+
+# 回合增量中跟踪的玩家字段，其余字段只在完整快照中下发
+DELTA_FIELDS = ("hp", "max_hp", "wins", "buffs", "skill_cooldowns", "is_alive",
+                "available_skills", "character", "style", "puppet_master")
+
+class StateDeltaTracker:
+    # 每个房间一个：记录上次广播给全房间的玩家状态，只下发变化的字段
+    def __init__(self):
+        self.version = 0
+        self._last: Dict[str, Dict[str, Any]] = {}
+
+    def reset(self, public_state: Dict) -> Dict:
+        # 向全房间广播完整状态时调用，之后的增量以此为基准
+        self.version += 1
+        self._last = {p["player_id"]: {f: p.get(f) for f in DELTA_FIELDS} for p in public_state["players"]}
+        return self.snapshot(public_state)
+
+    def snapshot(self, public_state: Dict) -> Dict:
+        # 单个客户端加入或重新同步：完整状态，不改变基准。
+        # 增量中的字段都是绝对值，快照之后再收到同一版本的增量也能正确合并
+        return {**public_state, "version": self.version}
+
+    def delta(self, players: List[Dict]) -> Optional[Dict]:
+        # 没有字段变化时返回 None，版本号不变，回合结果不带增量
+        changed = {}
+        for p in players:
+            pid = p["player_id"]
+            last = self._last.get(pid)
+            if last is None:
+                last = self._last[pid] = {}
+            fields = {}
+            for f in DELTA_FIELDS:
+                value = p.get(f)
+                if f not in last or last[f] != value:
+                    fields[f] = value
+                    last[f] = value
+            if fields:
+                changed[pid] = fields
+        if not changed:
+            return None
+        self.version += 1
+        return {"version": self.version, "base_version": self.version - 1, "players": changed}
+
+def apply_delta(game_state: Dict, data: Dict) -> Optional[Dict]:
+    # 客户端合并一条 game_state_delta，返回新的完整状态；本地状态缺失或版本不连续时返回 None，
+    # 调用方丢弃这条增量并请求重新同步。不带增量的回合结果只更新回合信息
+    delta = data.get("delta")
+    if delta is not None and (game_state.get("version") is None or delta["base_version"] != game_state["version"]):
+        return None
+    players = [dict(p) for p in game_state.get("players", [])]
+    if delta is not None:
+        for player in players:
+            player.update(delta["players"].get(player["player_id"], {}))
+    merged = {k: v for k, v in game_state.items() if k not in ("effects", "damages")}
+    merged.update({k: v for k, v in data.items() if k != "delta"})
+    merged["players"] = players
+    if delta is not None:
+        merged["version"] = delta["version"]
+    return merged
\ No newline at end of file
@@ -0,0 +1,218 @@
+import os
+import time
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional, Tuple, Iterable, Callable
+from metrics import REGISTRY
+
+DEFAULT_DB_PATH = os.environ.get("TEN_STEPS_DB", "ten_steps.db")
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        username TEXT PRIMARY KEY,
+        password TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chat_messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL,
+        message TEXT NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS player_proficiency (
+        username TEXT,
+        character_name TEXT,
+        proficiency INTEGER DEFAULT 0,
+        PRIMARY KEY (username, character_name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tasks (
+        username TEXT,
+        task_type TEXT,
+        progress INTEGER DEFAULT 0,
+        completed BOOLEAN DEFAULT FALSE,
+        PRIMARY KEY (username, task_type)
+    )
+    """,
+)
+
+# SQL 固定为模块常量，sqlite3 按语句文本在每个连接上缓存预编译结果
+SQL_CREATE_USER = "INSERT OR IGNORE INTO users (username, password) VALUES (?, ?)"
+SQL_CHECK_LOGIN = "SELECT 1 FROM users WHERE username = ? AND password = ?"
+SQL_SAVE_CHAT = "INSERT INTO chat_messages (username, message) VALUES (?, ?)"
+# 按自增主键倒序取最近消息，走 rowid 索引，与表大小无关
+SQL_RECENT_CHAT = "SELECT username, message, timestamp FROM chat_messages ORDER BY id DESC LIMIT ?"
+SQL_ADD_PROFICIENCY = """
+    INSERT INTO player_proficiency (username, character_name, proficiency) VALUES (?, ?, 1)
+    ON CONFLICT (username, character_name) DO UPDATE SET proficiency = proficiency + 1
+"""
+# 主键 (username, character_name) 的前缀即可定位该玩家的所有行
+SQL_TOTAL_PROFICIENCY = "SELECT COALESCE(SUM(proficiency), 0) FROM player_proficiency WHERE username = ?"
+SQL_SAVE_TASK = "INSERT OR REPLACE INTO tasks (username, task_type, progress, completed) VALUES (?, ?, ?, ?)"
+SQL_TASK_STATUS = "SELECT task_type, progress, completed FROM tasks WHERE username = ?"
+
+# 指标中按查询名统计耗时（含等待连接池的时间）
+QUERY_NAMES = {
+    SQL_CREATE_USER: "create_user",
+    SQL_CHECK_LOGIN: "check_login",
+    SQL_SAVE_CHAT: "save_chat",
+    SQL_RECENT_CHAT: "recent_chat",
+    SQL_ADD_PROFICIENCY: "add_proficiency",
+    SQL_TOTAL_PROFICIENCY: "total_proficiency",
+    SQL_SAVE_TASK: "save_task",
+    SQL_TASK_STATUS: "task_status",
+}
+DB_SECONDS = REGISTRY.histogram("ten_steps_db_query_seconds", "数据库查询耗时", ["query"])
+DB_ERRORS = REGISTRY.counter("ten_steps_db_errors_total", "数据库查询失败次数", ["query"])
+
+class Database:
+    # 长连接池：每个连接同一时刻只被一个线程借用，WAL 模式下读写互不阻塞
+    def __init__(self, path: str = DEFAULT_DB_PATH, pool_size: int = 4, busy_timeout: float = 5.0,
+                 executor: Optional[Callable[..., Any]] = None):
+        self.path = path
+        self.pool_size = pool_size
+        self.busy_timeout = busy_timeout
+        # executor(fn, *args)：在事件循环之外执行阻塞的查询并返回结果（见 serve.py）
+        self.executor = executor
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False, cached_statements=128)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.pool_size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        return self._pool.get(timeout=self.busy_timeout)
+
+    @contextmanager
+    def connection(self, query: Optional[str] = None):
+        # 退出时提交，出错时回滚；连接归还到池中。给出 query 时记录耗时指标
+        start = time.perf_counter()
+        conn = self._acquire()
+        try:
+            with conn:
+                yield conn
+        except Exception:
+            if query:
+                DB_ERRORS.inc(query=query)
+            raise
+        finally:
+            self._pool.put(conn)
+            if query:
+                DB_SECONDS.observe(time.perf_counter() - start, query=query)
+
+    def run(self, fn: Callable[..., Any], *args) -> Any:
+        # 配置了 executor 的实例每次查询都交给它，只能在事件循环里使用；
+        # 本来就在系统线程里运行的调用方（聊天写线程）使用自己的、不带 executor 的实例
+        if self.executor is None:
+            return fn(*args)
+        return self.executor(fn, *args)
+
+    def _execute(self, sql: str, params: Tuple) -> int:
+        with self.connection(QUERY_NAMES.get(sql, "other")) as conn:
+            return conn.execute(sql, params).rowcount
+
+    def _executemany(self, sql: str, rows: List[Tuple]) -> int:
+        with self.connection(QUERY_NAMES.get(sql, "other")) as conn:
+            return conn.executemany(sql, rows).rowcount
+
+    def _fetch(self, sql: str, params: Tuple, one: bool):
+        with self.connection(QUERY_NAMES.get(sql, "other")) as conn:
+            cursor = conn.execute(sql, params)
+            return cursor.fetchone() if one else cursor.fetchall()
+
+    def execute(self, sql: str, params: Tuple = ()) -> int:
+        return self.run(self._execute, sql, params)
+
+    def executemany(self, sql: str, rows: Iterable[Tuple]) -> int:
+        return self.run(self._executemany, sql, list(rows))
+
+    def fetchone(self, sql: str, params: Tuple = ()) -> Optional[Tuple]:
+        return self.run(self._fetch, sql, params, True)
+
+    def fetchall(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        return self.run(self._fetch, sql, params, False)
+
+    def _init_schema(self):
+        with self.connection() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+    def init_schema(self):
+        self.run(self._init_schema)
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    self._pool.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._created -= 1
+
+    # 用户
+    def create_user(self, username: str, password: str) -> bool:
+        # 用户名已存在时返回 False
+        return self.execute(SQL_CREATE_USER, (username, password)) == 1
+
+    def check_login(self, username: str, password: str) -> bool:
+        return self.fetchone(SQL_CHECK_LOGIN, (username, password)) is not None
+
+    # 聊天
+    def save_chat(self, username: str, message: str):
+        self.execute(SQL_SAVE_CHAT, (username, message))
+
+    def save_chats(self, rows: Iterable[Tuple[str, str]]):
+        # rows: (username, message)，同一事务内批量写入
+        self.executemany(SQL_SAVE_CHAT, rows)
+
+    def recent_chat(self, limit: int = 50) -> List[Tuple[str, str, str]]:
+        # 按时间正序返回最近 limit 条
+        return list(reversed(self.fetchall(SQL_RECENT_CHAT, (limit,))))
+
+    # 熟练度
+    def add_proficiency(self, username: str, character_name: str):
+        self.execute(SQL_ADD_PROFICIENCY, (username, character_name))
+
+    def total_proficiency(self, username: str) -> int:
+        # 所有角色熟练度之和，匹配时用来分档
+        return self.fetchone(SQL_TOTAL_PROFICIENCY, (username,))[0]
+
+    # 任务
+    def save_tasks(self, rows: Iterable[Tuple[str, str, int, bool]]):
+        # rows: (username, task_type, progress, completed)，同一事务内批量写入
+        self.executemany(SQL_SAVE_TASK, rows)
+
+    def task_status(self, usernames: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+        return self.run(self._task_status, list(usernames))
+
+    def _task_status(self, usernames: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        status = {}
+        with self.connection(QUERY_NAMES[SQL_TASK_STATUS]) as conn:
+            for username in usernames:
+                rows = conn.execute(SQL_TASK_STATUS, (username,)).fetchall()
+                status[username] = [{"type": t, "progress": p, "completed": c} for t, p, c in rows]
+        return status
\ No newline at end of file
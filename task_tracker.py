@@ -0,0 +1,56 @@
+from typing import Dict, List, Any, Iterable, Tuple
+
+# 任务类型 -> 完成所需进度
+TASK_GOALS = {"output": 15, "control": 3, "regen": 5, "defense": 2}
+
+class TaskTracker:
+    # 一局游戏内的任务进度，全部在内存中维护，由 flush 批量写回 tasks 表
+    def __init__(self, usernames: Iterable[str]):
+        self.progress: Dict[str, Dict[str, List]] = {
+            username: {task_type: [0, False] for task_type in TASK_GOALS} for username in usernames
+        }
+        # 开局重置的任务也需要写回
+        self._dirty = {(username, task_type) for username in self.progress for task_type in TASK_GOALS}
+
+    def record(self, username: str, task_type: str, amount: int = 1) -> bool:
+        # 返回本次是否完成任务
+        task = self.progress.get(username, {}).get(task_type)
+        if task is None or task[1] or not amount:
+            return False
+        task[0] += amount
+        task[1] = task[0] >= TASK_GOALS[task_type]
+        self._dirty.add((username, task_type))
+        return task[1]
+
+    def restore(self, status: Dict[str, List[Dict[str, Any]]]):
+        # 崩溃恢复：从 tasks 表读回的进度覆盖内存状态
+        for username, tasks in status.items():
+            for task in tasks:
+                if task["type"] in self.progress.get(username, {}):
+                    self.progress[username][task["type"]] = [task["progress"], bool(task["completed"])]
+        self._dirty.clear()
+
+    def completed(self, username: str) -> List[str]:
+        return [task_type for task_type, (_, done) in self.progress.get(username, {}).items() if done]
+
+    def status(self, usernames: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+        return {
+            username: [{"type": t, "progress": p, "completed": c} for t, (p, c) in self.progress.get(username, {}).items()]
+            for username in usernames
+        }
+
+    def dirty_rows(self) -> List[Tuple[str, str, int, bool]]:
+        rows = [(username, task_type, *self.progress[username][task_type]) for username, task_type in self._dirty]
+        self._dirty.clear()
+        return rows
+
+    def flush(self, db) -> int:
+        rows = self.dirty_rows()
+        if rows:
+            try:
+                db.save_tasks(rows)
+            except Exception:
+                # 写入失败时保留脏标记，下次 flush 重试
+                self._dirty.update((username, task_type) for username, task_type, _, _ in rows)
+                raise
+        return len(rows)
\ No newline at end of file
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# 模块都在仓库根目录，测试从根目录导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 导入 server 时不要碰仓库里的数据库和日志目录
+_scratch = tempfile.mkdtemp(prefix="ten_steps_tests_")
+os.environ.setdefault("TEN_STEPS_DB", os.path.join(_scratch, "ten_steps.db"))
+os.environ.setdefault("TEN_STEPS_JOURNAL_DIR", os.path.join(_scratch, "journal"))
\ No newline at end of file
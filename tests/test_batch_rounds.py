@@ -0,0 +1,52 @@
+import itertools
+import numpy as np
+import pytest
+from batch_rounds import NO_MOVE, encode_engines, judge_batch, judge_engines, resolve_batch
+from game_logic import GameEngine
+from player_state import Move
+
+# 每名玩家的状态：存活并出拳 m，或已死亡（保留出拳 m 或没有出拳）
+SEATS = [(True, m) for m in Move] + [(False, m) for m in Move] + [(False, None)]
+
+def _cases(players):
+    ids = [f"p{i}" for i in range(players)]
+    for boss_seat in [None] + list(range(players)):
+        engine = GameEngine(ids, mode="standard" if boss_seat is None else "boss", seed=0)
+        engine.boss_id = None if boss_seat is None else ids[boss_seat]
+        for seats in itertools.product(SEATS, repeat=players):
+            engine.moves = {pid: move for pid, (alive, move) in zip(ids, seats) if move is not None}
+            for pid, (alive, _) in zip(ids, seats):
+                engine.players[pid].is_alive = alive
+            yield engine
+
+@pytest.mark.parametrize("players", [2, 3, 4])
+def test_batch_judge_matches_engine_for_every_combination(players):
+    expected, batch = [], []
+    for engine in _cases(players):
+        expected.append(engine.judge_moves())
+        batch.append(encode_engines([engine])[1:])
+    assert len(expected) == (players + 1) * len(SEATS) ** players
+    moves, alive, eligible = (np.concatenate(arrays) for arrays in zip(*batch))
+    wins = judge_batch(moves, alive, eligible)
+    ids = [f"p{i}" for i in range(players)]
+    assert [{pid: bool(w) for pid, w in zip(ids, row)} for row in wins] == expected
+
+    # resolve_batch 的本回合获胜与 judge_batch 一致，胜局数在原有基础上累加
+    previous = np.ones(wins.shape, dtype=np.int16)
+    round_wins, new_wins, game_over, winner = resolve_batch(moves, previous, alive, eligible, max_wins=2)
+    assert (round_wins == wins).all()
+    assert (new_wins == previous + wins).all()
+    assert (game_over == ((alive.sum(axis=1) <= 1) | ((new_wins >= 2) & alive).any(axis=1))).all()
+    assert ((winner >= 0) == (game_over & (alive.sum(axis=1) > 0))).all()
+
+def test_judge_engines_pads_mixed_table_sizes():
+    engines = []
+    for players in (2, 4, 3):
+        engine = GameEngine([f"p{i}" for i in range(players)], seed=players)
+        for i, pid in enumerate(engine.players):
+            engine.players[pid].is_alive = True
+            engine.moves[pid] = Move(i % 3)
+        engines.append(engine)
+    assert judge_engines(engines) == [engine.judge_moves() for engine in engines]
+    _, moves, alive, _ = encode_engines(engines)
+    assert moves.shape == (3, 4) and moves[0, 2] == NO_MOVE and not alive[0, 2]
\ No newline at end of file
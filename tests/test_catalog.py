@@ -0,0 +1,36 @@
+from types import MappingProxyType
+import pytest
+from catalog import get_catalog
+from game_logic import GameEngine
+
+CATALOG = get_catalog()
+
+def _walk(value):
+    yield value
+    if isinstance(value, (dict, MappingProxyType)):
+        for item in value.values():
+            yield from _walk(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _walk(item)
+
+def test_nested_data_is_frozen():
+    for value in _walk(CATALOG.characters):
+        assert not isinstance(value, (dict, list))
+    for value in _walk(CATALOG.skills):
+        assert not isinstance(value, (dict, list))
+    skill = CATALOG.skills[CATALOG.skill_names[0]]
+    with pytest.raises(TypeError):
+        skill["cooldown"] = 99
+    with pytest.raises(TypeError):
+        skill["effects"][0]["value"] = 99
+
+def test_player_state_does_not_share_catalog_objects():
+    # 引擎写入玩家状态的数据都是副本：冻结的对象混进状态会在 asdict / 快照时报错
+    for i, name in enumerate(CATALOG.character_names):
+        engine = GameEngine(["p0", "p1"], seed=i)
+        engine.players["p0"].proficiency[name] = 20
+        engine.select_character("p0", name, "增益流", "甲")
+        engine.select_character("p1", "超限者", "防御流", "乙")
+        for value in _walk(engine.snapshot()):
+            assert not isinstance(value, MappingProxyType)
\ No newline at end of file
@@ -0,0 +1,37 @@
+import threading
+import time
+from chat import ChatWriter
+
+class _StalledDb:
+    # save_chats 一直阻塞，模拟数据库被锁住
+    def __init__(self):
+        self.release = threading.Event()
+        self.saved = []
+
+    def save_chats(self, batch):
+        self.release.wait()
+        self.saved.extend(batch)
+
+def test_close_returns_when_writer_is_stalled_and_queue_is_full():
+    db = _StalledDb()
+    writer = ChatWriter(db, maxsize=2, batch_size=1)
+    assert writer.submit("alice", "1")
+    # 写线程取走第一条后卡在 save_chats 里，再提交两条把队列填满
+    while writer.backlog():
+        time.sleep(0.01)
+    assert writer.submit("alice", "2") and writer.submit("alice", "3")
+    assert not writer.submit("alice", "4")
+    start = time.monotonic()
+    writer.close(timeout=0.2)
+    assert time.monotonic() - start < 1.0
+    db.release.set()
+
+def test_close_writes_pending_messages_first():
+    db = _StalledDb()
+    db.release.set()
+    writer = ChatWriter(db)
+    for i in range(5):
+        assert writer.submit("alice", str(i))
+    writer.close()
+    assert db.saved == [("alice", str(i)) for i in range(5)]
+    assert writer.written == 5
\ No newline at end of file
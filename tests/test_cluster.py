@@ -0,0 +1,149 @@
+import queue
+import socket
+import threading
+import time
+import pytest
+import socketio
+import cluster
+from cluster import LocalBrokerManager, home_worker, issue_redirect_token, verify_redirect_token
+
+def test_redirect_token_round_trip_is_single_use():
+    token = issue_redirect_token("alice")
+    assert verify_redirect_token(token) == "alice"
+    assert verify_redirect_token(token) is None
+
+def test_redirect_token_rejects_tampering_and_expiry():
+    token = issue_redirect_token("alice")
+    payload, _, signature = token.rpartition(":")
+    assert verify_redirect_token(payload.replace("alice", "mallory") + ":" + signature) is None
+    assert verify_redirect_token(payload + ":" + "0" * len(signature)) is None
+    assert verify_redirect_token(issue_redirect_token("alice", ttl=-1)) is None
+    assert verify_redirect_token("garbage") is None
+    assert verify_redirect_token(token) == "alice"
+
+def _manager(monkeypatch, backlog_limit):
+    monkeypatch.setattr(cluster, "OUTBOX_BACKLOG", backlog_limit)
+    manager = LocalBrokerManager("127.0.0.1:1")
+    manager.outbox = queue.Queue()
+    threading.Thread(target=manager._writer, daemon=True).start()
+    return manager
+
+def _wait(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_writer_buffers_while_disconnected_and_flushes_on_reconnect(monkeypatch):
+    manager = _manager(monkeypatch, backlog_limit=10)
+    for i in range(3):
+        manager.outbox.put(b"%d\n" % i)
+    _wait(lambda: len(manager.backlog) == 3)
+    ours, broker = socket.socketpair()
+    manager.sock = ours
+    # _listen 重连后放入 None 唤醒写任务
+    manager.outbox.put(None)
+    _wait(lambda: not manager.backlog)
+    manager.outbox.put(b"3\n")
+    received = b""
+    while received.count(b"\n") < 4:
+        received += broker.recv(1024)
+    assert received == b"0\n1\n2\n3\n"
+    ours.close()
+    broker.close()
+
+def test_writer_counts_dropped_lines_when_backlog_is_full(monkeypatch):
+    manager = _manager(monkeypatch, backlog_limit=2)
+    before = cluster.BROKER_DROPPED.value()
+    for i in range(5):
+        manager.outbox.put(b"%d\n" % i)
+    _wait(lambda: manager.outbox.empty() and list(manager.backlog) == [b"3\n", b"4\n"])
+    assert cluster.BROKER_DROPPED.value() - before == 3
+
+@pytest.fixture
+def two_workers(monkeypatch):
+    import server
+    monkeypatch.setattr(cluster, "WORKER_URLS", ["http://w0", "http://w1"])
+    monkeypatch.setattr(cluster, "WORKER_INDEX", 0)
+    server.init_db()
+    return server
+
+def _username(worker):
+    return next(f"user{i}" for i in range(1000) if home_worker(f"user{i}", 2) == worker)
+
+def _events(client, name):
+    return [event["args"][0] for event in client.get_received("/game") if event["name"] == name]
+
+def test_login_redirect_carries_token_instead_of_password(two_workers):
+    server = two_workers
+    username = _username(1)
+    client = server.socketio.test_client(server.app, namespace="/game")
+    client.emit("register", {"username": username, "password": "secret1"}, namespace="/game")
+    client.get_received("/game")
+    # 密码错误不重定向
+    client.emit("login", {"username": username, "password": "wrong"}, namespace="/game")
+    assert _events(client, "login_failed")
+    client.emit("login", {"username": username, "password": "secret1"}, namespace="/game")
+    redirect, = _events(client, "login_redirect")
+    assert redirect["url"] == "http://w1" and "secret1" not in redirect["token"]
+    client.disconnect(namespace="/game")
+
+    # 归属进程凭令牌登录，不需要密码；令牌只能用一次
+    cluster.WORKER_INDEX = 1
+    home = server.socketio.test_client(server.app, namespace="/game")
+    home.emit("login", {"username": username, "token": redirect["token"]}, namespace="/game")
+    assert _events(home, "login_success")
+    other = server.socketio.test_client(server.app, namespace="/game")
+    other.emit("login", {"username": username, "token": redirect["token"]}, namespace="/game")
+    assert _events(other, "login_failed")
+    # 令牌绑定用户名
+    token = issue_redirect_token(username)
+    other.emit("login", {"username": _username(0), "token": token}, namespace="/game")
+    assert _events(other, "login_failed")
+    home.disconnect(namespace="/game")
+    other.disconnect(namespace="/game")
+def test_notify_peers_reaches_remote_handlers_only(monkeypatch):
+    manager = LocalBrokerManager("127.0.0.1:1")
+    manager.outbox = queue.Queue()
+    received = []
+    manager.on_remote("lobby_players", lambda *data: received.append(data))
+    manager.notify_peers("lobby_players", 1, [{"player_id": "s1", "username": "bob"}], False)
+    message = manager.json.loads(manager.outbox.get_nowait())
+    assert message["peers_only"] and message["data"] == [1, [{"player_id": "s1", "username": "bob"}], False]
+    # 其他进程收到后只调用回调，不会当作广播投递给客户端
+    monkeypatch.setattr(socketio.Manager, "emit", lambda *args, **kwargs: pytest.fail("不应投递给客户端"))
+    manager._handle_emit({**message, "host_id": "other"})
+    assert received == [(1, [{"player_id": "s1", "username": "bob"}], False)]
+
+class _Peers:
+    def __init__(self):
+        self.sent = []
+
+    def notify_peers(self, event, *data):
+        self.sent.append((event, *data))
+
+def test_lobby_player_list_merges_other_workers(two_workers, monkeypatch):
+    server = two_workers
+    peers = _Peers()
+    monkeypatch.setattr(server, "client_manager", peers)
+    username = _username(0)
+    client = server.socketio.test_client(server.app, namespace="/game")
+    client.emit("register", {"username": username, "password": "secret1"}, namespace="/game")
+    client.emit("login", {"username": username, "password": "secret1"}, namespace="/game")
+    local = {"player_id": server.game_namespace.local_player_list()[0]["player_id"], "username": username}
+    # 登录时把本进程的列表同步给其他进程
+    assert ("lobby_players", 0, [local], False) in peers.sent
+    client.get_received("/game")
+
+    remote = [{"player_id": "sid-w1", "username": "bob"}]
+    with server.app.app_context():
+        server.game_namespace.update_remote_players(1, remote)
+    assert _events(client, "update_player_list") == [{"players": [local] + remote}]
+    # 其他进程刚启动时请求回发，收到后回发本进程的列表
+    peers.sent.clear()
+    with server.app.app_context():
+        server.game_namespace.update_remote_players(1, [], True)
+    assert _events(client, "update_player_list") == [{"players": [local]}]
+    assert peers.sent == [("lobby_players", 0, [local], False)]
+    client.disconnect(namespace="/game")
+    server.game_namespace.remote_players.clear()
\ No newline at end of file
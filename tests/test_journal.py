@@ -0,0 +1,158 @@
+import json
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from game_logic import GameEngine
+from journal import GameJournal, recover_games, _write_atomic
+from replay import state_digest
+from simulator import RandomPolicy, play_game
+from storage import Database
+
+def _record(seed, mode="standard", players=4):
+    return play_game(mode, players, RandomPolicy(random.Random(seed)), seed=seed, keep_record=True)["record"]
+
+def _journaled(directory, record, game_id="g1"):
+    engine = GameEngine(record["players"], mode=record["mode"], seed=record["seed"])
+    journal = GameJournal(directory, game_id)
+    journal.write_meta({"game_id": game_id, "mode": record["mode"], "seed": record["seed"], "players": record["players"]})
+    engine.journal = journal
+    return engine, journal
+
+@pytest.mark.parametrize("seed", range(8))
+def test_recover_from_snapshot_and_log_tail(tmp_path, seed):
+    record = _record(seed, mode=("standard", "boss", "infinite")[seed % 3])
+    inputs = record["inputs"]
+    crash_at = len(inputs) * 2 // 3
+    engine, journal = _journaled(str(tmp_path), record)
+    snapshots = 0
+    for entry in inputs[:crash_at]:
+        engine.apply_input(entry)
+        if entry[0] == "round" and engine.current_round % 3 == 0:
+            journal.write_snapshot(engine)
+            snapshots += 1
+    journal.close(finished=False)
+    engine.journal = None
+
+    (meta, recovered, recovered_journal), = recover_games(str(tmp_path))
+    assert state_digest(recovered) == state_digest(engine)
+    if snapshots:
+        assert recovered.input_base > 0
+        # 日志只剩快照之后的输入
+        assert len(recovered.inputs) < crash_at
+    for entry in inputs[crash_at:]:
+        engine.apply_input(entry)
+        recovered.apply_input(entry)
+    assert state_digest(recovered) == state_digest(engine)
+    recovered_journal.close()
+
+def test_snapshot_is_json_without_inputs(tmp_path):
+    record = _record(1)
+    engine, journal = _journaled(str(tmp_path), record)
+    for entry in record["inputs"][:len(record["inputs"]) // 2]:
+        engine.apply_input(entry)
+    journal.write_snapshot(engine)
+    with open(journal.snapshot_path, "rb") as f:
+        snapshot = json.loads(f.read())
+    assert "inputs" not in snapshot
+    assert snapshot["input_count"] == len(engine.inputs)
+    with open(journal.log_path, "rb") as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 1
+    assert json.loads(lines[0])["meta"]["base"] == len(engine.inputs)
+    restored = GameEngine.from_snapshot(snapshot)
+    assert restored.rng.getstate() == engine.rng.getstate()
+    assert state_digest(restored) == state_digest(engine)
+    journal.close()
+
+def test_crash_between_snapshot_and_log_rotation(tmp_path):
+    record = _record(2)
+    engine, journal = _journaled(str(tmp_path), record)
+    for entry in record["inputs"][:len(record["inputs"]) // 2]:
+        engine.apply_input(entry)
+    # 快照已落盘，日志还没来得及轮换
+    journal.sync()
+    _write_atomic(journal.snapshot_path, json.dumps(engine.snapshot()).encode("utf-8"))
+    journal.close(finished=False)
+    (_, recovered, recovered_journal), = recover_games(str(tmp_path))
+    assert recovered.inputs == []
+    assert state_digest(recovered) == state_digest(engine)
+    recovered_journal.close()
+
+def test_rotated_log_without_snapshot_is_skipped(tmp_path):
+    record = _record(3)
+    engine, journal = _journaled(str(tmp_path), record)
+    for entry in record["inputs"][:10]:
+        engine.apply_input(entry)
+    journal.write_snapshot(engine)
+    journal.close(finished=False)
+    os.remove(journal.snapshot_path)
+    assert recover_games(str(tmp_path)) == []
+
+def test_sync_due_flushes_quiet_journal(tmp_path, monkeypatch):
+    journal = GameJournal(str(tmp_path), "g1", sync_interval=0.2)
+    synced = []
+    monkeypatch.setattr(os, "fsync", lambda fd: synced.append(fd))
+    journal.append(["move", "p0", "石头"])
+    assert journal._pending == 1
+    assert not journal.sync_due()
+    journal._last_sync -= 1
+    assert journal.sync_due()
+    assert journal._pending == 0 and synced
+    assert not journal.sync_due()
+    journal.close()
+
+def test_writes_queued_while_waiting_on_executor_keep_order(tmp_path):
+    # 模拟协程：等 executor 期间另一个协程继续推进同一局，它的写入排在队列里由当前协程顺带执行
+    record = _record(5)
+    inputs = iter(record["inputs"])
+    pool = ThreadPoolExecutor(2)
+    waiting = []
+
+    def advance():
+        entry = next(inputs, None)
+        if entry is None:
+            return False
+        engine.apply_input(entry)
+        if entry[0] == "round":
+            journal.record_result({"round": engine.current_round})
+            if engine.current_round % 2 == 0:
+                journal.write_snapshot(engine)
+        return True
+
+    def executor(fn, *args):
+        # 引擎修改状态的中途不会调用 executor，同一局同一时刻只有一个协程在等它
+        assert not waiting
+        waiting.append(fn)
+        try:
+            advance()
+            return pool.submit(fn, *args).result()
+        finally:
+            waiting.pop()
+
+    engine = GameEngine(record["players"], mode=record["mode"], seed=record["seed"])
+    journal = GameJournal(str(tmp_path), "g1", executor=executor)
+    journal.write_meta({"game_id": "g1", "mode": record["mode"], "seed": record["seed"], "players": record["players"]})
+    engine.journal = journal
+    while advance():
+        pass
+    journal.close(finished=False)
+    engine.journal = None
+    pool.shutdown()
+
+    (meta, recovered, recovered_journal), = recover_games(str(tmp_path))
+    assert recovered.input_base > 0
+    assert state_digest(recovered) == state_digest(engine)
+    recovered_journal.close()
+
+def test_database_uses_executor_from_any_thread(tmp_path):
+    db = Database(str(tmp_path / "t.db"))
+    used = []
+    db.executor = lambda fn, *args: used.append(fn) or fn(*args)
+    db.init_schema()
+    thread = threading.Thread(target=db.fetchall, args=("SELECT 1",))
+    thread.start()
+    thread.join()
+    assert len(used) == 2
+    db.close()
\ No newline at end of file
@@ -0,0 +1,109 @@
+import pytest
+from matchmaking import Matchmaker, MIN_PLAYERS, proficiency_tier
+
+def _ids(matches):
+    return [(mode, [ticket.player_id for ticket in tickets]) for mode, tickets in matches]
+
+def test_proficiency_tiers():
+    assert [proficiency_tier(n) for n in (0, 1, 2, 3, 4, 7, 8, -5)] == [0, 1, 2, 2, 3, 3, 4, 0]
+
+def test_full_table_in_one_tier_starts_in_queue_order():
+    mm = Matchmaker()
+    for i in range(5):
+        mm.enqueue(f"p{i}", "standard", proficiency=3, now=i)
+    assert _ids(mm.poll(now=5)) == [("standard", ["p0", "p1", "p2", "p3"])]
+    assert mm.queued() == 1 and mm.is_queued("p4")
+
+def test_tiers_are_not_mixed_before_widen_after():
+    mm = Matchmaker(widen_after=5, widen_step=5, fill_after=100)
+    # 档位 1、3、5、7
+    for i, proficiency in enumerate((1, 4, 16, 64)):
+        mm.enqueue(f"p{i}", "standard", proficiency=proficiency, now=0)
+    assert mm.poll(now=4.9) == []
+    # 等满 5 秒放宽到相邻一档；各档相差两档，仍凑不到一起
+    assert mm.poll(now=5) == []
+    assert mm.queued() == 4
+
+def test_widening_reaches_further_tiers_over_time():
+    mm = Matchmaker(widen_after=5, widen_step=5, fill_after=100)
+    mm.enqueue("a", "standard", proficiency=1, now=0)      # 档 1
+    mm.enqueue("b", "standard", proficiency=2, now=1)      # 档 2
+    mm.enqueue("c", "standard", proficiency=4, now=1)      # 档 3
+    mm.enqueue("d", "standard", proficiency=8, now=1)      # 档 4
+    # 半径 1：档 0-2，只有 a、b
+    assert mm.poll(now=5) == []
+    # 半径 2：档 0-3，三人
+    assert mm.poll(now=10) == []
+    # 半径 3：档 0-4，凑满一桌，按档位距离再按入队先后排
+    assert _ids(mm.poll(now=15)) == [("standard", ["a", "b", "c", "d"])]
+    assert mm.queued() == 0
+
+def test_widening_prefers_nearest_tiers():
+    mm = Matchmaker(room_size=2, widen_after=5, widen_step=5, fill_after=100)
+    mm.enqueue("a", "standard", proficiency=4, now=0)      # 档 3
+    mm.enqueue("far", "standard", proficiency=1, now=0)    # 档 1
+    mm.enqueue("near", "standard", proficiency=8, now=3)   # 档 4
+    assert _ids(mm.poll(now=5)) == [("standard", ["a", "near"])]
+
+def test_without_tiers_everyone_shares_one_queue():
+    mm = Matchmaker(group_by_tier=False)
+    for i, proficiency in enumerate((0, 10, 1000, 100000)):
+        mm.enqueue(f"p{i}", "boss", proficiency=proficiency, now=0)
+    assert _ids(mm.poll(now=0)) == [("boss", ["p0", "p1", "p2", "p3"])]
+
+@pytest.mark.parametrize("mode", sorted(MIN_PLAYERS))
+def test_fill_after_starts_short_table_at_min_players(mode):
+    mm = Matchmaker(group_by_tier=False, fill_after=20)
+    need = MIN_PLAYERS[mode]
+    for i in range(need - 1):
+        mm.enqueue(f"p{i}", mode, now=0)
+    # 人数不够，等多久也不开
+    assert mm.poll(now=1000) == []
+    mm.enqueue("last", mode, now=1000)
+    # 最早的票已等满 fill_after，达到最少人数就开局
+    assert _ids(mm.poll(now=1000)) == [(mode, [f"p{i}" for i in range(need - 1)] + ["last"])]
+
+def test_short_table_waits_for_fill_after():
+    mm = Matchmaker(group_by_tier=False, fill_after=20)
+    mm.enqueue("a", "standard", now=0)
+    mm.enqueue("b", "standard", now=10)
+    assert mm.poll(now=19.9) == []
+    assert _ids(mm.poll(now=20)) == [("standard", ["a", "b"])]
+
+def test_cancel_while_queued():
+    mm = Matchmaker(group_by_tier=False, fill_after=20)
+    for name in "abcd":
+        mm.enqueue(name, "standard", now=0)
+    assert mm.cancel("b").player_id == "b"
+    assert mm.cancel("b") is None
+    assert not mm.is_queued("b")
+    assert mm.queue_sizes()["standard"] == 3
+    assert mm.poll(now=1) == []
+    mm.enqueue("e", "standard", now=2)
+    assert _ids(mm.poll(now=2)) == [("standard", ["a", "c", "d", "e"])]
+    assert mm.queue_sizes() == {"standard": 0, "boss": 0, "infinite": 0}
+
+def test_cancel_last_in_tier_drops_empty_tier():
+    mm = Matchmaker()
+    mm.enqueue("a", "standard", proficiency=5, now=0)
+    mm.cancel("a")
+    assert mm.queues["standard"].tiers == {}
+    assert mm.poll(now=1000) == []
+
+def test_requeue_same_mode_keeps_place_and_switching_mode_moves():
+    mm = Matchmaker(group_by_tier=False)
+    first = mm.enqueue("a", "standard", now=0)
+    assert mm.enqueue("a", "standard", now=50) is first
+    moved = mm.enqueue("a", "boss", now=60)
+    assert moved.mode == "boss" and moved.enqueued_at == 60
+    assert mm.queue_sizes() == {"standard": 0, "boss": 1, "infinite": 0}
+    with pytest.raises(ValueError):
+        mm.enqueue("a", "nope")
+
+def test_poll_single_mode():
+    mm = Matchmaker(group_by_tier=False)
+    for i in range(4):
+        mm.enqueue(f"s{i}", "standard", now=0)
+        mm.enqueue(f"b{i}", "boss", now=0)
+    assert _ids(mm.poll(now=0, mode="boss")) == [("boss", ["b0", "b1", "b2", "b3"])]
+    assert mm.queue_sizes()["standard"] == 4
\ No newline at end of file
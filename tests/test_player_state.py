@@ -0,0 +1,117 @@
+import copy
+import pickle
+import random
+from dataclasses import asdict
+import pytest
+from player_state import BuffList, PlayerState, Style
+
+KEYS = ("damage_bonus", "damage_reduction", "damage_multiplier", "heal")
+
+def _entry(rng, i):
+    data = {key: rng.choice((1, 2, 0.5, 1.5)) for key in rng.sample(KEYS, rng.randint(0, 3))}
+    if rng.random() < 0.3:
+        data["controlled"] = "not a number"
+    return {"name": f"b{i}", "duration": rng.randint(-1, 3), "effect_data": data}
+
+def _expected(entries):
+    totals = {}
+    for entry in entries:
+        for key, value in entry.get("effect_data", {}).items():
+            if isinstance(value, (int, float)):
+                totals[key] = totals.get(key, 0) + value
+    return totals
+
+def _check(buffs):
+    totals = _expected(buffs)
+    for key in KEYS:
+        assert buffs.total(key) == pytest.approx(totals.get(key, 0))
+
+def test_totals_after_each_mutator():
+    rng = random.Random(3)
+    buffs = BuffList()
+    entries = [_entry(rng, i) for i in range(12)]
+    buffs.append(entries[0])
+    _check(buffs)
+    buffs.extend(entries[1:4])
+    _check(buffs)
+    buffs += entries[4:6]
+    _check(buffs)
+    buffs.insert(1, entries[6])
+    _check(buffs)
+    buffs.append(entries[7])
+    _check(buffs)
+    buffs.remove(entries[2])
+    _check(buffs)
+    buffs.pop()
+    _check(buffs)
+    buffs.pop(0)
+    _check(buffs)
+    del buffs[0]
+    _check(buffs)
+    del buffs[1:3]
+    _check(buffs)
+    buffs[0] = entries[8]
+    _check(buffs)
+    buffs[1:2] = entries[9:11]
+    _check(buffs)
+    buffs *= 3
+    _check(buffs)
+    buffs.sort(key=lambda entry: entry["name"])
+    buffs.reverse()
+    _check(buffs)
+    buffs *= 0
+    assert buffs == [] and buffs.totals == {}
+    buffs.extend(entries)
+    buffs.clear()
+    assert buffs.totals == {}
+
+def test_random_mutations_match_recount():
+    rng = random.Random(7)
+    buffs = BuffList()
+    for i in range(500):
+        action = rng.random()
+        if action < 0.5 or not buffs:
+            buffs.append(_entry(rng, i))
+        elif action < 0.7:
+            buffs.remove(rng.choice(buffs))
+        elif action < 0.85:
+            buffs.pop(rng.randrange(len(buffs)))
+        else:
+            start = rng.randrange(len(buffs))
+            del buffs[start:start + rng.randint(1, 3)]
+        _check(buffs)
+
+def test_iteration_copy_then_remove():
+    # 引擎按 for buff in player.buffs[:]: ... player.buffs.remove(buff) 的写法清理过期 buff
+    buffs = BuffList([{"name": "a", "duration": 0, "effect_data": {"damage_bonus": 1}},
+                      {"name": "b", "duration": 2, "effect_data": {"damage_bonus": 2}}])
+    for entry in buffs[:]:
+        if entry["duration"] == 0:
+            buffs.remove(entry)
+    assert buffs.total("damage_bonus") == 2
+    assert type(buffs[:]) is list
+
+@pytest.mark.parametrize("clone", [copy.deepcopy, copy.copy, lambda b: pickle.loads(pickle.dumps(b))])
+def test_copies_keep_totals(clone):
+    rng = random.Random(11)
+    buffs = BuffList(_entry(rng, i) for i in range(20))
+    cloned = clone(buffs)
+    assert type(cloned) is BuffList
+    _check(cloned)
+    cloned.pop()
+    _check(cloned)
+    _check(buffs)
+
+def test_player_state_asdict_and_snapshot_round_trip():
+    player = PlayerState(player_id="p0", style=Style.DAMAGE)
+    player.buffs.append({"name": "伤害流", "duration": -1, "effect_data": {"damage_bonus": 1}})
+    player.debuffs.append({"name": "controlled", "duration": 1, "effect_data": {"controlled": True}})
+    data = asdict(player)
+    assert type(data["buffs"]) is BuffList and data["buffs"].total("damage_bonus") == 1
+    restored = PlayerState(**{**data, "buffs": list(data["buffs"]), "debuffs": list(data["debuffs"]), "style": "伤害流"})
+    assert type(restored.buffs) is BuffList and type(restored.debuffs) is BuffList
+    assert restored.buffs.total("damage_bonus") == 1
+    assert restored.style is Style.DAMAGE
+    # asdict 深拷贝了条目，修改副本不影响原对象
+    data["buffs"].clear()
+    assert player.buffs.total("damage_bonus") == 1
\ No newline at end of file
@@ -0,0 +1,60 @@
+import json
+import random
+import pytest
+from game_logic import GameEngine
+from player_state import MOVE_LABELS
+from replay import load_record, replay, save_record, state_digest
+from simulator import MODES, RandomPolicy, play_game
+
+GAMES = 12
+
+def _records():
+    rng = random.Random(2024)
+    return [play_game(MODES[i % len(MODES)], 2 + i % 3, RandomPolicy(random.Random(rng.getrandbits(32))),
+                      seed=rng.getrandbits(63), keep_record=True)["record"] for i in range(GAMES)]
+
+RECORDS = _records()
+
+@pytest.mark.parametrize("index", range(GAMES))
+def test_replay_matches_recorded_digest(index):
+    record = RECORDS[index]
+    result = replay(record)
+    assert result["digest"] == record["digest"]
+    assert result["matches"]
+    # 经过 JSON 往返（元组变列表、枚举值变字符串）后回放结果不变
+    decoded = json.loads(json.dumps(record, ensure_ascii=False))
+    assert replay(decoded)["digest"] == record["digest"]
+
+def test_save_and_load_record_round_trip(tmp_path):
+    engine = replay(RECORDS[0])["engine"]
+    path = save_record(engine, str(tmp_path), "g1")
+    loaded = load_record(path)
+    assert loaded["digest"] == state_digest(engine)
+    assert replay(loaded)["matches"]
+
+def test_tampered_record_does_not_match():
+    record = json.loads(json.dumps(RECORDS[1]))
+    # 去掉最后一个回合
+    last_round = max(i for i, entry in enumerate(record["inputs"]) if entry[0] == "round")
+    del record["inputs"][last_round:]
+    assert not replay(record)["matches"]
+def test_server_bound_players_replay_to_same_digest(tmp_path):
+    # 服务器开局时用 bind_player 绑定连接和用户名，这一步不录制；保存的录像回放后摘要仍然一致
+    ids = ["a", "b", "c"]
+    engine = GameEngine(ids, seed=7)
+    for pid in ids:
+        engine.bind_player(pid, pid, f"用户{pid}")
+    rng = random.Random(7)
+    for pid in ids[:2]:
+        engine.select_character(pid, "超限者", "防御流", f"用户{pid}")
+    # c 没选角色就离开，保留绑定时的用户名
+    engine.remove_player("c")
+    while not engine.game_over and engine.current_round < 100:
+        for pid in ids[:2]:
+            if engine.players[pid].is_alive:
+                engine.submit_move(pid, rng.choice(MOVE_LABELS))
+        engine.process_round()
+    path = save_record(engine, str(tmp_path), "server")
+    result = replay(load_record(path))
+    assert result["matches"]
+    assert result["engine"].players["a"].socket_id is None
\ No newline at end of file
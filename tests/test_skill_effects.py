@@ -0,0 +1,138 @@
+import random
+import pytest
+from catalog import get_catalog
+from player_state import PlayerState, Style
+from skills import SkillSystem
+
+# 固定的对局状态：p0 施放技能；p1 有 1 点减伤，p2 有 1 次规避，p3 残血且带不屈不挠
+def _game_state(style=None):
+    players = []
+    for i in range(4):
+        player = PlayerState(player_id=f"p{i}", username=f"玩家{i}", hp=10, max_hp=15, wins=2, style=style)
+        players.append(player)
+    players[1].buffs.append({"name": "防御流", "duration": -1, "effect_data": {"damage_reduction": 1}})
+    players[2].evasion = 1
+    players[3].hp = 1
+    players[3].available_skills = ["不屈不挠"]
+    return {"round": 3, "mode": "standard", "players": players, "rng": random.Random(11)}
+
+def _snapshot(player):
+    return {
+        "hp": player.hp,
+        "max_hp": player.max_hp,
+        "wins": player.wins,
+        "evasion": player.evasion,
+        "buffs": [(b["name"], b["duration"], dict(b.get("effect_data", {}))) for b in player.buffs],
+        "debuffs": [(b["name"], b["duration"], dict(b.get("effect_data", {}))) for b in player.debuffs],
+        "cooldowns": dict(player.skill_cooldowns),
+        "charge": {name: dict(info) for name, info in player.charge_skills.items()},
+    }
+
+def _cast(skill_name, targets, style=None, params=None):
+    # 返回施放后发生变化的字段，按玩家分组
+    state = _game_state(style)
+    before = {p.player_id: _snapshot(p) for p in state["players"]}
+    result = SkillSystem(catalog=CATALOG).execute_skill(skill_name, "p0", targets, state, params or {})
+    assert result["success"]
+    changed = {}
+    for player in state["players"]:
+        after = _snapshot(player)
+        diff = {k: v for k, v in after.items() if before[player.player_id][k] != v}
+        if diff:
+            changed[player.player_id] = diff
+    if state.get("special_state"):
+        changed["special_state"] = state["special_state"]
+    return changed
+
+CATALOG = get_catalog()
+REDUCTION = ("防御流", -1, {"damage_reduction": 1})
+CONTROLLED = lambda duration: {"debuffs": [("controlled", duration, {"controlled": True, "controller": "p0"})]}
+SHIELD_SAVE = {"buffs": [("shield", 3, {"damage_reduction": 2})]}
+
+CASES = [
+    ("退步切掌", None, ["p1"], {}, {"p0": {"cooldowns": {"退步切掌": 1}}, "p1": {"hp": 8}}),
+    ("退步切掌", Style.DAMAGE, ["p1"], {}, {"p0": {"cooldowns": {"退步切掌": 1}}, "p1": {"hp": 7}}),
+    ("并步亮掌", None, ["p1", "p2"], {}, {"p1": {"hp": 9}, "p2": {"evasion": 0}}),
+    # p3 受到致命伤害，触发不屈不挠保住 1 点血并获得护盾
+    ("并步亮掌", None, ["p1", "p3"], {}, {"p1": {"hp": 9}, "p3": SHIELD_SAVE}),
+    ("虚步亮掌", None, ["p1", "p2"], {}, {"p0": {"hp": 7, "cooldowns": {"虚步亮掌": 2}}, "p1": CONTROLLED(1), "p2": CONTROLLED(1)}),
+    ("虚步亮掌", Style.CONTROL, ["p1", "p2"], {}, {"p0": {"hp": 7, "cooldowns": {"虚步亮掌": 2}}, "p1": CONTROLLED(2), "p2": CONTROLLED(2)}),
+    ("马步架打", None, ["p1"], {}, {"p1": {"hp": 8}}),
+    ("吃个桃桃", None, ["p0"], {}, {"p0": {"hp": 12, "cooldowns": {"吃个桃桃": 1}}}),
+    ("吃个桃桃", Style.REGEN, ["p0"], {}, {"p0": {"hp": 13, "cooldowns": {"吃个桃桃": 1}}}),
+    ("温酒斩将", None, ["p0"], {}, {"p0": {"hp": 8, "buffs": [("温酒斩将", 2, {"damage_bonus": 2})], "cooldowns": {"温酒斩将": 3}}}),
+    ("温酒斩将", Style.BUFF, ["p0"], {}, {"p0": {"hp": 8, "buffs": [("温酒斩将", 2, {"damage_bonus": 2.2})], "cooldowns": {"温酒斩将": 3}}}),
+    ("五龙盘打", None, ["p1", "p2", "p3"], {}, {"p0": {"cooldowns": {"五龙盘打": 4}, "charge": {"五龙盘打": {"remaining_time": 2, "target_ids": ["p1", "p2", "p3"]}}}}),
+    ("献祭", None, ["p0"], {}, {"p0": {"buffs": [("献祭", 3, {"damage_multiplier": 2}), ("献祭", 3, {"control_duration_bonus": 1}), ("献祭", 3, {"delayed_damage": 3})], "cooldowns": {"献祭": 5}}}),
+    ("九锡黄龙", None, ["p0"], {}, {"p0": {"max_hp": 12, "evasion": 2, "buffs": [("九锡黄龙", -1, {"damage_reduction": 1})], "cooldowns": {"九锡黄龙": 4}}}),
+    ("九锡黄龙", Style.DEFENSE, ["p0"], {}, {"p0": {"max_hp": 12, "evasion": 2, "buffs": [("九锡黄龙", -1, {"damage_reduction": 2})], "cooldowns": {"九锡黄龙": 4}}}),
+    ("再来一遍", None, ["p0"], {}, {"p0": {"hp": 8, "cooldowns": {"再来一遍": 3}}}),
+    ("青囊秘要", None, ["p0"], {}, {"p0": {"buffs": [("青囊秘要", 4, {"heal": 1}), ("青囊秘要", 4, {"specific_skill_heal_bonus": 1, "skill_name": "吃个桃桃"})], "cooldowns": {"青囊秘要": 4}}}),
+    ("青囊秘要", Style.REGEN, ["p0"], {}, {"p0": {"buffs": [("青囊秘要", 4, {"heal": 2}), ("青囊秘要", 4, {"specific_skill_heal_bonus": 1, "skill_name": "吃个桃桃"})], "cooldowns": {"青囊秘要": 4}}}),
+    ("先驱突击", None, ["p0"], {}, {"p0": {"buffs": [("先驱突击", 2, {"always_can_attack": True}), ("先驱突击", 2, {"damage_bonus": 2})], "cooldowns": {"先驱突击": 3}}}),
+    ("破釜沉舟", None, ["p1"], {}, {"p0": {"cooldowns": {"破釜沉舟": 3}}, "special_state": {"type": "duel", "players": ["p0", "p1"], "rounds": 1, "current_round": 0, "rules": "破釜沉舟"}}),
+    ("决斗", None, ["p1"], {}, {"p0": {"cooldowns": {"决斗": 5}}, "special_state": {"type": "duel", "players": ["p0", "p1"], "rounds": 3, "current_round": 0, "rules": "决斗"}}),
+    # 消耗胜局选择硬币结果：正面自身 -2、目标 -5；反面自身 -5、目标 -2（均先扣 1 点减伤）
+    ("激昂", None, ["p1"], {"use_win": True, "coin_choice": True}, {"p0": {"hp": 8, "wins": 1, "cooldowns": {"激昂": 2}}, "p1": {"hp": 5}}),
+    ("激昂", None, ["p1"], {"use_win": True, "coin_choice": False}, {"p0": {"hp": 5, "wins": 1, "cooldowns": {"激昂": 2}}, "p1": {"hp": 8}}),
+    ("不屈不挠", None, ["p0"], {}, {"p0": {"buffs": [("不屈不挠", 3, {"shield": 2})]}}),
+    # 不消耗胜局时由固定种子抛出反面
+    ("歇步冲拳", None, ["p0"], {}, {"p0": {"hp": 6, "cooldowns": {"歇步冲拳": 2}}}),
+    ("提膝冲拳", None, ["p1"], {}, {"p0": {"cooldowns": {"提膝冲拳": 4}}, "p1": {"hp": 5, "buffs": [REDUCTION, ("提膝冲拳_regen", 3, {"heal": 1})]}}),
+    ("旁观者", None, ["p0"], {}, {"p0": {"buffs": [("旁观者", 3, {"untargetable": True})], "cooldowns": {"旁观者": 4}}}),
+    ("敬礼", None, ["p1"], {}, {"p0": {"debuffs": [("heal_reduction_on_own_skills", 3, {"heal_reduction_on_own_skills": 1})], "cooldowns": {"敬礼": 3}},
+                               "p1": {"debuffs": [("negate_attack_buffs", 3, {"negate_attack_buffs": True})]}}),
+    ("格挡冲拳", None, ["p1"], {}, {"p0": {"evasion": 1, "cooldowns": {"格挡冲拳": 2}}, "p1": {"hp": 9}}),
+    ("浑水摸鱼", None, ["p0"], {}, {"p0": {"buffs": [("浑水摸鱼", 4, {"attack_applies_control": True, "control_duration": 1}), ("浑水摸鱼", 4, {"damage_modifier_penalty": -0.5})], "cooldowns": {"浑水摸鱼": 4}}}),
+    ("准备", None, ["p0"], {}, {"p0": {"cooldowns": {"准备": 6}, "charge": {"准备": {"remaining_time": 5, "target_ids": ["p0"]}}}}),
+    ("突破", None, ["p0"], {}, {"p0": {"cooldowns": {"突破": 5}, "charge": {"突破": {"remaining_time": 3, "target_ids": ["p0"]}}}}),
+    ("鸿运当头", None, ["p0"], {}, {"p0": {"wins": 3, "cooldowns": {"鸿运当头": 3}}}),
+    ("BOSS_横扫", None, ["p1", "p2", "p3"], {}, {"p0": {"cooldowns": {"BOSS_横扫": 1}}, "p1": {"hp": 9}, "p2": {"evasion": 0}, "p3": SHIELD_SAVE}),
+    ("BOSS_要害锁定", None, ["p0"], {}, {"p0": {"buffs": [("要害锁定", 3, {"true_damage_attacks": True})], "cooldowns": {"BOSS_要害锁定": 3}}}),
+    ("BOSS_震天撼地", None, ["p1", "p2", "p3"], {}, {"p0": {"cooldowns": {"BOSS_震天撼地": 1}}, "p1": CONTROLLED(1), "p2": CONTROLLED(1), "p3": CONTROLLED(1)}),
+    ("BOSS_能屈能伸", None, ["p0"], {}, {"p0": {"hp": 5, "max_hp": 5, "buffs": [("能屈能伸", 1, {"damage_to_heal_conversion": True}), ("能屈能伸", 2, {"cannot_attack": True})], "cooldowns": {"BOSS_能屈能伸": 4}}}),
+    # 效果类型尚未实现的技能只进入冷却
+    ("雷公助我", None, ["p0"], {}, {"p0": {"cooldowns": {"雷公助我": 3}}}),
+    ("将军饮马", None, ["p1"], {}, {"p0": {"cooldowns": {"将军饮马": 5}}}),
+    ("礼毕", None, ["p1"], {}, {"p0": {"cooldowns": {"礼毕": 2}}}),
+    ("礼尚往来", None, ["p1"], {}, {}),
+    ("BOSS_复刻", None, ["p1"], {}, {"p0": {"cooldowns": {"BOSS_复刻": 3}}}),
+]
+
+@pytest.mark.parametrize("skill_name, style, targets, params, expected", CASES,
+                         ids=[f"{c[0]}-{c[1].value if c[1] else 'none'}-{i}" for i, c in enumerate(CASES)])
+def test_skill_changes_state(skill_name, style, targets, params, expected):
+    assert _cast(skill_name, targets, style, params) == expected
+
+def test_every_skill_has_a_case():
+    assert {case[0] for case in CASES} == set(CATALOG.skill_names)
+
+def test_damage_bonus_is_added_and_multiplier_is_not_applied():
+    skill = CATALOG.compiled_skills["马步架打"]
+    state = _game_state()
+    user = state["players"][0]
+    user.buffs.append({"name": "伤害流", "duration": -1, "effect_data": {"damage_bonus": 1}})
+    user.buffs.append({"name": "献祭", "duration": 3, "effect_data": {"damage_multiplier": 2}})
+    skill.execute(user, ["p1"], state)
+    # 3 点基础伤害 + 1 点 damage_bonus - 1 点减伤；damage_multiplier 不参与结算
+    assert state["players"][1].hp == 10 - 3
+
+def test_charge_skill_releases_after_charge_time_rounds():
+    from game_logic import GameEngine
+    engine = GameEngine(["p0", "p1", "p2"], seed=5)
+    for pid in engine.players:
+        engine.select_character(pid, "超限者", "伤害流", pid)
+    engine.unlock_temp_skill("p0", "五龙盘打")
+    engine.grant_win("p0")
+    assert engine.use_skill("p0", "五龙盘打", ["p1", "p2"], consume_win=True)["success"]
+    engine.settle_damage()
+    assert engine.players["p0"].charge_skills["五龙盘打"]["remaining_time"] == 2
+    hp = {pid: p.hp for pid, p in engine.players.items()}
+    # 蓄力 2 回合：第 1 回合只倒数，第 2 回合发动，除自身外每人 -3（不受 p0 的伤害流加成）
+    result = engine.process_round()
+    assert {pid: p.hp for pid, p in engine.players.items()} == hp
+    assert engine.players["p0"].charge_skills["五龙盘打"]["remaining_time"] == 1
+    result = engine.process_round()
+    assert {pid: p.hp for pid, p in engine.players.items()} == {"p0": hp["p0"], "p1": hp["p1"] - 3, "p2": hp["p2"] - 3}
+    assert engine.players["p0"].charge_skills == {}
+    assert result["damage_dealt"] == {"p0": 6}
\ No newline at end of file
@@ -0,0 +1,127 @@
+import random
+import pytest
+from game_logic import GameEngine
+from simulator import RandomPolicy, play_game
+from state_sync import StateDeltaTracker, apply_delta
+
+def _record(seed, mode):
+    return play_game(mode, 4, RandomPolicy(random.Random(seed)), seed=seed, keep_record=True)["record"]
+
+def _replay_rounds(record):
+    # 逐条重放输入，每回合结算后产出一次 (engine, 增量)
+    engine = GameEngine(record["players"], mode=record["mode"], seed=record["seed"])
+    tracker = StateDeltaTracker()
+    inputs = record["inputs"]
+    started = next(i for i, entry in enumerate(inputs) if entry[0] != "select")
+    for entry in inputs[:started]:
+        engine.apply_input(entry)
+    yield engine, tracker, tracker.reset(engine.get_public_state())
+    for entry in inputs[started:]:
+        engine.apply_input(entry)
+        if entry[0] == "round":
+            data = {"round": engine.current_round}
+            delta = tracker.delta(engine.get_public_players())
+            if delta:
+                data["delta"] = delta
+            yield engine, tracker, data
+
+@pytest.mark.parametrize("seed", range(9))
+def test_snapshot_plus_deltas_equals_public_state(seed):
+    record = _record(seed, ("standard", "boss", "infinite")[seed % 3])
+    rounds = _replay_rounds(record)
+    engine, tracker, client_state = next(rounds)
+    for engine, tracker, data in rounds:
+        client_state = apply_delta(client_state, data)
+        assert client_state == {**engine.get_public_state(), "version": tracker.version}
+    assert engine.game_over
+
+def _engine(seed):
+    engine = GameEngine(["p0", "p1"], seed=seed)
+    engine.select_character("p0", "超限者", "防御流", "甲")
+    engine.select_character("p1", "超限者", "防御流", "乙")
+    return engine
+
+def test_unchanged_round_keeps_version():
+    engine = _engine(1)
+    tracker = StateDeltaTracker()
+    tracker.reset(engine.get_public_state())
+    assert tracker.delta(engine.get_public_players()) is None
+    assert tracker.version == 1
+    engine.adjust_hp("p0", -1)
+    delta = tracker.delta(engine.get_public_players())
+    assert delta == {"version": 2, "base_version": 1, "players": {"p0": {"hp": engine.players["p0"].hp}}}
+
+def test_version_gap_requires_resync():
+    record = _record(4, "standard")
+    rounds = list(_replay_rounds(record))
+    deltas = [data for _, _, data in rounds[1:] if "delta" in data]
+    assert len(deltas) >= 2
+    engine, tracker, client_state = rounds[0]
+    # 漏掉第一条增量，第二条基于的版本对不上
+    assert apply_delta(client_state, deltas[1]) is None
+    # 没有本地状态时同样需要完整状态
+    assert apply_delta({}, deltas[0]) is None
+    # 不带增量的回合结果不检查版本
+    assert apply_delta(client_state, {"round": 99})["round"] == 99
+
+def test_resync_snapshot_accepts_following_deltas():
+    engine = _engine(2)
+    tracker = StateDeltaTracker()
+    tracker.reset(engine.get_public_state())
+    engine.grant_win("p0")
+    missed = tracker.delta(engine.get_public_players())
+    # 请求重新同步拿到的快照已包含漏掉的变化，之后的增量接着合并
+    client_state = tracker.snapshot(engine.get_public_state())
+    assert client_state["version"] == missed["version"]
+    engine.adjust_hp("p1", -2)
+    client_state = apply_delta(client_state, {"round": 1, "delta": tracker.delta(engine.get_public_players())})
+    assert client_state["players"] == engine.get_public_state()["players"]
+    assert client_state["version"] == tracker.version
+
+def test_server_round_without_changes_has_no_delta(tmp_path, monkeypatch):
+    import server
+    from storage import Database
+    db = Database(str(tmp_path / "sync.db"))
+    db.init_schema()
+    namespace = server.GameNamespace("/game", database=db)
+    room = namespace.rooms.create_room({"p0": {"username": "甲"}, "p1": {"username": "乙"}})
+    engine = room.game_engine
+    engine.select_character("p0", "超限者", "防御流", "甲")
+    engine.select_character("p1", "超限者", "防御流", "乙")
+    room.state_sync.reset(engine.get_public_state())
+    emitted = []
+    monkeypatch.setattr(server.socketio, "emit", lambda event, data=None, **kwargs: emitted.append((event, data)))
+    monkeypatch.setattr(server, "ROUND_TIMEOUT", 0)
+    engine.submit_move("p0", "石头")
+    engine.submit_move("p1", "石头")
+    with server.app.app_context():
+        namespace.process_round(room)
+    data, = [data for event, data in emitted if event == "game_state_delta"]
+    # 平局：没有字段变化，回合结果照常下发但不带增量
+    assert "delta" not in data and data["round"] == 1
+    assert room.state_sync.version == 1
+    db.close()
+@pytest.mark.parametrize("seed", range(6))
+def test_every_engine_input_invalidates_projection(seed):
+    # 每条输入之后缓存的投影都与直接从 PlayerState 生成的一致，调用方无需手动 mark_dirty
+    record = _record(seed, ("standard", "boss", "infinite")[seed % 3])
+    engine = GameEngine(record["players"], mode=record["mode"], seed=record["seed"])
+    for entry in record["inputs"]:
+        engine.get_public_state()
+        engine.apply_input(entry)
+        assert engine.get_public_players() == [p.to_public() for p in engine.players.values()]
+
+def test_bind_player_invalidates_projection():
+    engine = _engine(3)
+    assert engine.get_public_players()[0]["socket_id"] is None
+    engine.bind_player("p0", "sid0", "丙")
+    player = engine.get_public_players()[0]
+    assert player["socket_id"] == "sid0" and player["username"] == "丙"
+    assert engine.inputs[-1][0] == "select"
+def test_server_side_inputs_invalidate_projection():
+    engine = _engine(4)
+    for entry in (["grant_win", "p0", 1], ["adjust_hp", "p1", -3], ["unlock_skill", "p0", "马步架打"],
+                  ["grant_block", "p1", 1], ["skill_phase"], ["rename", "p1", "p9"], ["leave", "p0"]):
+        engine.get_public_state()
+        engine.apply_input(entry)
+        assert engine.get_public_players() == [p.to_public() for p in engine.players.values()]
\ No newline at end of file
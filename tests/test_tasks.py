@@ -0,0 +1,81 @@
+import pytest
+from game_logic import GameEngine
+from rooms import GameRoom
+from storage import Database
+from task_tracker import TaskTracker, TASK_GOALS
+
+def _engine(mode="standard"):
+    engine = GameEngine(["p0", "p1"], mode=mode, seed=7)
+    engine.select_character("p0", "超限者", "防御流", "甲")
+    engine.select_character("p1", "超限者", "防御流", "乙")
+    for player in engine.players.values():
+        player.available_skills = ["马步架打"]
+        player.max_hp = player.hp = 1000
+    return engine
+
+def _play_round(engine, attacker="p0", target="p1"):
+    assert engine.use_skill(attacker, "马步架打", [target])["success"]
+    engine.settle_damage()
+    engine.submit_move("p0", "石头")
+    engine.submit_move("p1", "石头")
+    return engine.process_round()
+
+def test_round_result_reports_damage_dealt():
+    engine = _engine()
+    result = _play_round(engine)
+    # 马步架打 3 点，目标防御流减伤 1
+    assert result["damage_dealt"] == {"p0": 2}
+    assert result["evasions"] == {}
+    # 下一回合重新计数
+    engine.submit_move("p0", "石头")
+    engine.submit_move("p1", "石头")
+    assert engine.process_round()["damage_dealt"] == {}
+
+def test_round_result_reports_evasions():
+    engine = _engine()
+    engine.grant_block("p1")
+    result = _play_round(engine)
+    assert result["evasions"] == {"p1": 1}
+    assert result["damage_dealt"] == {}
+
+def test_reward_methods_are_recorded_for_replay():
+    engine = _engine()
+    engine.players["p0"].hp = 10
+    engine.grant_win("p0", 1)
+    engine.adjust_hp("p0", 2)
+    engine.unlock_temp_skill("p1", "吃个桃桃")
+    engine.grant_block("p1", 1)
+    assert engine.players["p0"].wins == 1
+    assert engine.players["p0"].hp == 12
+    assert "吃个桃桃" in engine.players["p1"].available_skills
+    assert engine.players["p1"].evasion == 1
+    assert [entry[0] for entry in engine.inputs[-4:]] == ["grant_win", "adjust_hp", "unlock_skill", "grant_block"]
+
+@pytest.fixture
+def namespace(tmp_path):
+    import server
+    db = Database(str(tmp_path / "tasks.db"))
+    db.init_schema()
+    yield server.GameNamespace("/game", database=db)
+    db.close()
+
+def test_output_and_defense_tasks_finish_and_pay_out(namespace):
+    import server
+    engine = _engine()
+    room = GameRoom("g1", {"p0": {"username": "甲"}, "p1": {"username": "乙"}}, engine=engine)
+    room.tasks = TaskTracker(["甲", "乙"])
+    # 猜拳胜局不结束对局，只看任务
+    engine.MAX_WINS = 1000
+    engine.grant_block("p1", TASK_GOALS["defense"])
+    with server.app.app_context():
+        while "output" not in room.tasks.completed("甲"):
+            assert engine.current_round < 20
+            assert engine.use_skill("p0", "马步架打", ["p1"])["success"]
+            namespace._process_round(room)
+        assert "defense" in room.tasks.completed("乙")
+        wins = engine.players["p0"].wins
+        namespace.distribute_task_rewards(room)
+    assert engine.players["p0"].wins == wins + 1
+    assert engine.players["p1"].evasion == 1
+    status = {task["type"]: task for task in namespace.db.task_status(["甲"])["甲"]}
+    assert status["output"]["completed"]
\ No newline at end of file
@@ -0,0 +1,110 @@
+import time
+import pytest
+from timers import TimerWheel
+
+def _fire_times(wheel, until):
+    # 逐格推进，记录每个 key 到期时所在的格数
+    fired = {}
+    for tick in range(wheel.current + 1, until + 1):
+        for key in wheel.advance(now=tick * wheel.tick):
+            assert key not in fired
+            fired[key] = tick
+    return fired
+
+@pytest.mark.parametrize("start", [0, 1, 3, 4, 15, 16, 63, 64, 100])
+def test_every_delay_fires_on_its_tick(start):
+    # 4 格 × 3 层：第 0 层一圈 4 格，第 1 层一圈 16 格，第 2 层一圈 64 格；覆盖所有格、层边界和超出范围的延迟
+    wheel = TimerWheel(tick=1.0, slots=4, levels=3, now=start)
+    delays = list(range(1, 200))
+    for delay in delays:
+        wheel.schedule(delay, delay, now=start)
+    assert len(wheel) == len(delays)
+    fired = _fire_times(wheel, start + max(delays))
+    assert fired == {delay: start + delay for delay in delays}
+    assert len(wheel) == 0
+
+def test_fractional_delays_round_up_to_next_tick():
+    wheel = TimerWheel(tick=0.25, slots=64, levels=4, now=10.0)
+    wheel.schedule("a", 0.1, now=10.0)
+    wheel.schedule("b", 0.25, now=10.0)
+    wheel.schedule("c", 0.26, now=10.0)
+    wheel.schedule("d", 0, now=10.0)
+    assert sorted(wheel.advance(now=10.25)) == ["a", "b", "d"]
+    assert wheel.advance(now=10.49) == []
+    assert wheel.advance(now=10.5) == ["c"]
+
+def test_long_deadline_cascades_down_levels():
+    wheel = TimerWheel(tick=1.0, slots=4, levels=3, now=0)
+    wheel.schedule("far", 55, now=0)
+    assert wheel.timers["far"][0] == 2
+    seen_levels = set()
+    for tick in range(1, 55):
+        assert wheel.advance(now=tick) == []
+        seen_levels.add(wheel.timers["far"][0])
+    assert seen_levels == {0, 1, 2}
+    assert wheel.advance(now=55) == ["far"]
+
+def test_large_jump_fires_everything_due():
+    wheel = TimerWheel(tick=1.0, slots=4, levels=3, now=0)
+    for delay in (1, 5, 17, 65, 300):
+        wheel.schedule(delay, delay, now=0)
+    assert sorted(wheel.advance(now=100)) == [1, 5, 17, 65]
+    assert wheel.advance(now=300) == [300]
+
+def test_cancel_then_reschedule():
+    wheel = TimerWheel(tick=1.0, slots=4, levels=3, now=0)
+    wheel.schedule("room", 20, now=0)
+    assert "room" in wheel
+    assert wheel.cancel("room")
+    assert not wheel.cancel("room")
+    assert "room" not in wheel
+    assert _fire_times(wheel, 30) == {}
+    wheel.schedule("room", 7, now=30)
+    # 重复登记替换原来的到期时间，只触发一次
+    wheel.schedule("room", 3, now=30)
+    assert len(wheel) == 1
+    assert _fire_times(wheel, 60) == {"room": 33}
+
+def test_reschedule_while_on_higher_level():
+    wheel = TimerWheel(tick=1.0, slots=4, levels=3, now=0)
+    wheel.schedule("room", 40, now=0)
+    _fire_times(wheel, 10)
+    wheel.schedule("room", 2, now=10)
+    assert _fire_times(wheel, 60) == {"room": 12}
+
+class _StopLoop(Exception):
+    pass
+
+def test_round_deadline_loop_forces_idle_round(tmp_path, monkeypatch):
+    import server
+    from storage import Database
+    db = Database(str(tmp_path / "timers.db"))
+    db.init_schema()
+    namespace = server.GameNamespace("/game", database=db)
+    namespace.deadlines = TimerWheel(tick=0.01)
+    players = {"p0": {"username": "甲"}, "p1": {"username": "乙"}}
+    room = namespace.rooms.create_room(players)
+    engine = room.game_engine
+    engine.select_character("p0", "超限者", "防御流", "甲")
+    engine.select_character("p1", "超限者", "防御流", "乙")
+    engine.submit_move("p0", "石头")
+    namespace.deadlines.schedule(room.game_id, 0.01)
+    emitted = []
+    monkeypatch.setattr(server.socketio, "emit", lambda event, *args, **kwargs: emitted.append((event, kwargs.get("to"))))
+    sleeps = []
+
+    def fake_sleep(seconds):
+        # 第一次真的等一格让截止时间到期，第二次结束循环
+        if sleeps:
+            raise _StopLoop
+        sleeps.append(seconds)
+        time.sleep(seconds * 3)
+    monkeypatch.setattr(server.socketio, "sleep", fake_sleep)
+    with pytest.raises(_StopLoop):
+        namespace.round_deadline_loop()
+    # 没出拳的乙由引擎随机补上，回合照常结算并登记下一回合的截止时间
+    assert engine.current_round == 1
+    assert ["round"] == engine.inputs[-1]
+    assert ("game_state_delta", room.game_id) in emitted
+    assert room.game_id in namespace.deadlines
+    db.close()
\ No newline at end of file
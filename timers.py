@@ -0,0 +1,79 @@
+import math
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+DEFAULT_TICK = 0.25
+DEFAULT_SLOTS = 64
+DEFAULT_LEVELS = 4
+
+class TimerWheel:
+    # 分层时间轮：第 0 层每格 tick 秒，共 slots 格；第 k 层每格等于第 k-1 层转一圈。
+    # 默认 0.25 秒 × 64 格 × 4 层，可覆盖约 48 天。登记、取消都是 O(1)；advance() 每走一格只处理到期的那一格，
+    # 高层的格子在低层转满一圈时整体下放一层（每个定时器最多下放 levels - 1 次），与定时器总数无关。
+    # 不是线程安全的，由同一个后台任务调用 advance()
+    def __init__(self, tick: float = DEFAULT_TICK, slots: int = DEFAULT_SLOTS, levels: int = DEFAULT_LEVELS,
+                 now: Optional[float] = None):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.spans = [slots ** level for level in range(levels + 1)]
+        # 每格是 key -> 到期的绝对格数
+        self.wheels: List[List[Dict[Hashable, int]]] = [[{} for _ in range(slots)] for _ in range(levels)]
+        # key -> (层, 格)
+        self.timers: Dict[Hashable, Tuple[int, int]] = {}
+        self.current = int((time.monotonic() if now is None else now) / tick)
+
+    def __len__(self) -> int:
+        return len(self.timers)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.timers
+
+    def schedule(self, key: Hashable, delay: float, now: Optional[float] = None):
+        # 同一个 key 重复登记时替换原来的到期时间
+        self.cancel(key)
+        now = time.monotonic() if now is None else now
+        expires = max(self.current + 1, math.ceil((now + delay) / self.tick))
+        self._place(key, expires)
+
+    def cancel(self, key: Hashable) -> bool:
+        location = self.timers.pop(key, None)
+        if location is None:
+            return False
+        level, slot = location
+        del self.wheels[level][slot][key]
+        return True
+
+    def _place(self, key: Hashable, expires: int):
+        delta = expires - self.current
+        level = 0
+        while level < self.levels - 1 and delta >= self.spans[level + 1]:
+            level += 1
+        slot = (expires // self.spans[level]) % self.slots
+        self.wheels[level][slot][key] = expires
+        self.timers[key] = (level, slot)
+
+    def advance(self, now: Optional[float] = None) -> List[Hashable]:
+        # 走到 now 为止，返回到期的 key（已移除）
+        target = int((time.monotonic() if now is None else now) / self.tick)
+        expired = []
+        while self.current < target:
+            self.current += 1
+            # 低层转满一圈：把高层当前格里的定时器按剩余时间重新放到低层
+            for level in range(1, self.levels):
+                if self.current % self.spans[level]:
+                    break
+                slot = (self.current // self.spans[level]) % self.slots
+                bucket = self.wheels[level][slot]
+                if bucket:
+                    self.wheels[level][slot] = {}
+                    for key, expires in bucket.items():
+                        self._place(key, expires)
+            slot = self.current % self.slots
+            bucket = self.wheels[0][slot]
+            if bucket:
+                self.wheels[0][slot] = {}
+                for key in bucket:
+                    del self.timers[key]
+                    expired.append(key)
+        return expired
\ No newline at end of file